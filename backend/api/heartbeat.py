@@ -0,0 +1,201 @@
+"""Timer-wheel heartbeat scheduling for WebSocket connections."""
+import asyncio
+import math
+import random
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+import logging
+
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Seconds covered by one slot of the wheel
+HEARTBEAT_TICK = 1.0
+
+
+class HeartbeatScheduler:
+    """
+    Send heartbeats to every connection from a single task.
+    
+    Connections are kept in a timer wheel: a ring of slots, each holding
+    the connections whose next heartbeat falls in one tick. The scheduler
+    wakes once per tick, takes the due slot and sends all of its
+    heartbeats together, so the number of timers and tasks doesn't grow
+    with the number of connections, and adding or removing a connection
+    is O(1). Every deadline is jittered by ``jitter`` of the interval, so
+    connections opened together don't stay in the same slot.
+    
+    Scheduled objects need ``connection_id``, ``channel`` and
+    ``last_seen`` (a ``time.monotonic()`` value updated on every message
+    received from the client). A connection silent for ``timeout``
+    seconds, or whose channel has closed, is handed to ``reap`` instead
+    of being sent another heartbeat.
+    """
+    
+    def __init__(
+        self,
+        reap: Callable[[Any], Awaitable[None]],
+        interval: Optional[float] = None,
+        timeout: Optional[float] = None,
+        jitter: Optional[float] = None
+    ):
+        """
+        Initialize heartbeat scheduler.
+        
+        Args:
+            reap: Coroutine function closing and unregistering a dead connection
+            interval: Seconds between heartbeats (defaults to WS_HEARTBEAT_INTERVAL)
+            timeout: Seconds of silence before reaping (defaults to WS_HEARTBEAT_TIMEOUT)
+            jitter: Fraction of the interval deadlines vary by (defaults to WS_HEARTBEAT_JITTER)
+        """
+        self.reap = reap
+        self.interval = interval or settings.WS_HEARTBEAT_INTERVAL
+        self.timeout = timeout or settings.WS_HEARTBEAT_TIMEOUT
+        self.jitter = settings.WS_HEARTBEAT_JITTER if jitter is None else jitter
+        
+        # Enough slots that no deadline wraps around the wheel
+        size = math.ceil(self.interval * (1 + self.jitter) / HEARTBEAT_TICK) + 2
+        self._slots: List[Dict[str, Any]] = [{} for _ in range(size)]
+        self._due: Dict[str, int] = {}
+        # IDs in the batch being sent; removing one drops it from here
+        self._beating: Set[str] = set()
+        self._epoch = time.monotonic()
+        self._tick = 0
+        self._task: Optional[asyncio.Task] = None
+        
+        # Metrics
+        self.heartbeats_sent = 0
+        self.connections_reaped = 0
+        self.max_batch = 0
+    
+    def _current_tick(self) -> int:
+        """Tick number of the current time."""
+        return int((time.monotonic() - self._epoch) / HEARTBEAT_TICK)
+    
+    def _schedule(self, connection: Any):
+        """Put a connection in the slot of its next, jittered deadline."""
+        delay = self.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+        due = max(self._tick, self._current_tick()) + max(1, round(delay / HEARTBEAT_TICK))
+        self._slots[due % len(self._slots)][connection.connection_id] = connection
+        self._due[connection.connection_id] = due
+    
+    def add(self, connection: Any):
+        """Start sending heartbeats to a connection."""
+        self.remove(connection.connection_id)
+        self._schedule(connection)
+        
+        if self._task is None or self._task.done():
+            self._tick = self._current_tick()
+            self._task = asyncio.create_task(self._run())
+    
+    def remove(self, connection_id: str):
+        """Stop sending heartbeats to a connection."""
+        self._beating.discard(connection_id)
+        due = self._due.pop(connection_id, None)
+        if due is not None:
+            self._slots[due % len(self._slots)].pop(connection_id, None)
+    
+    def _take_due(self, tick: int) -> List[Any]:
+        """Remove and return the connections due at a tick."""
+        slot = self._slots[tick % len(self._slots)]
+        due = [connection for connection_id, connection in slot.items() if self._due[connection_id] <= tick]
+        for connection in due:
+            del slot[connection.connection_id]
+            del self._due[connection.connection_id]
+        return due
+    
+    async def _beat(self, connections: List[Any]):
+        """Send one batch of heartbeats and reap dead connections."""
+        now = time.monotonic()
+        alive = []
+        dead = []
+        for connection in connections:
+            if connection.channel.closed or now - connection.last_seen > self.timeout:
+                dead.append(connection)
+            else:
+                alive.append(connection)
+        
+        timestamp = datetime.now().isoformat()
+        self._beating = {connection.connection_id for connection in alive}
+        results = await asyncio.gather(
+            *(
+                connection.channel.send_json({
+                    "type": "heartbeat",
+                    "data": {
+                        "timestamp": timestamp,
+                        "connection_id": connection.connection_id
+                    }
+                })
+                for connection in alive
+            ),
+            *(self.reap(connection) for connection in dead),
+            return_exceptions=True
+        )
+        
+        failed = []
+        for connection, result in zip(alive, results):
+            if isinstance(result, Exception):
+                logger.error(f"Heartbeat error for {connection.connection_id}: {result}")
+                failed.append(connection)
+                continue
+            self.heartbeats_sent += 1
+            
+            if connection.connection_id not in self._beating:
+                # Removed (or re-added) while the batch was being sent
+                continue
+            if connection.channel.closed:
+                # Closed meanwhile: reap it now rather than beat it again
+                failed.append(connection)
+                continue
+            self._schedule(connection)
+        self._beating = set()
+        
+        if failed:
+            await asyncio.gather(*(self.reap(connection) for connection in failed), return_exceptions=True)
+            dead.extend(failed)
+        
+        if dead:
+            self.connections_reaped += len(dead)
+            logger.info(f"💔 Reaped {len(dead)} unresponsive WebSocket connections")
+    
+    async def _run(self):
+        """Turn the wheel, one slot per tick, while connections remain."""
+        try:
+            while self._due:
+                next_tick = self._tick + 1
+                await asyncio.sleep(max(0.0, self._epoch + next_tick * HEARTBEAT_TICK - time.monotonic()))
+                
+                # Catch up on ticks missed while the loop was busy
+                due = []
+                for tick in range(next_tick, self._current_tick() + 1):
+                    due.extend(self._take_due(tick))
+                    self._tick = tick
+                
+                if due:
+                    self.max_batch = max(self.max_batch, len(due))
+                    await self._beat(due)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Heartbeat scheduler error: {e}")
+    
+    async def close(self):
+        """Stop the scheduler and forget all connections."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for slot in self._slots:
+            slot.clear()
+        self._due.clear()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get heartbeat metrics."""
+        return {
+            "scheduled": len(self._due),
+            "heartbeats_sent": self.heartbeats_sent,
+            "connections_reaped": self.connections_reaped,
+            "max_batch": self.max_batch
+        }
@@ -0,0 +1,355 @@
+"""Coalescing, non-blocking output channel for WebSocket connections."""
+import asyncio
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+import logging
+from fastapi import WebSocket
+
+from backend.config import settings
+from backend.models.serialization import dumps_text
+
+logger = logging.getLogger(__name__)
+
+# Frame types held back for the flush interval so consecutive ones merge.
+# Merging is lossless: text deltas are concatenated, output lines joined.
+STREAM_FRAME_TYPES = ("ai_message_chunk", "command_output")
+
+# Status frames that only matter until a newer one of the same type
+PROGRESS_FRAME_TYPES = (
+    "heartbeat",
+    "progress_update",
+    "iteration_complete",
+    "workflow_advancing",
+    "workflow_waiting",
+    "advancement_blocked",
+    "advancement_uncertain",
+    "turn_metrics"
+)
+
+OVERFLOW_POLICIES = ("coalesce", "drop")
+
+BATCH_PREFIX = '{"type":"batch","data":{"messages":['
+BATCH_SUFFIX = ']}}'
+
+
+class _Frame:
+    """Queued outgoing frame."""
+    
+    __slots__ = ("type", "data", "text")
+    
+    def __init__(self, frame_type: str, data: Optional[Dict[str, Any]] = None, text: Optional[str] = None):
+        self.type = frame_type
+        self.data = data  # Mergeable stream frames only
+        self.text = text  # Everything else, encoded when queued
+    
+    def encode(self) -> str:
+        """JSON text of the frame."""
+        if self.text is None:
+            return dumps_text({"type": self.type, "data": self.data})
+        return self.text
+    
+    def size(self) -> int:
+        """Approximate payload size."""
+        if self.text is not None:
+            return len(self.text)
+        return len(self.data.get("chunk") or self.data.get("line") or "")
+
+
+class WebSocketOutputChannel:
+    """
+    Ordered, batched, non-blocking output for one WebSocket connection.
+    
+    Exposes ``send_json``/``send_text`` like the WebSocket itself, so it
+    can be handed to the agent and function registry in its place. Sending
+    only queues the frame; a writer task per connection does the network
+    writes, so a slow browser never stalls LLM streaming or command
+    execution, and a failed write never raises into the producer.
+    
+    Streamed frames (text deltas, command output) are held for up to
+    ``flush_interval`` seconds or ``max_batch_bytes`` of payload, and
+    consecutive ones are merged. Any other frame is written right away.
+    Everything pending is written as one ``batch`` frame.
+    
+    The queue is bounded by ``max_queue``. Once it is full, progress
+    frames are coalesced into queued frames of the same kind or dropped
+    (always under the ``drop`` policy), and command output is dropped under
+    the ``drop`` policy. Other frames (text deltas, results, questions,
+    completion) are never dropped or reordered: one that can't be merged
+    into the newest queued frame disconnects the consumer as a slow
+    consumer, as does a write that stays blocked for ``send_timeout``
+    seconds.
+    """
+    
+    def __init__(
+        self,
+        websocket: WebSocket,
+        flush_interval: Optional[float] = None,
+        max_batch_bytes: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        overflow_policy: Optional[str] = None,
+        send_timeout: Optional[float] = None
+    ):
+        """
+        Initialize output channel and start its writer.
+        
+        Args:
+            websocket: Accepted WebSocket connection
+            flush_interval: Seconds streamed frames may wait (defaults to WS_FLUSH_INTERVAL)
+            max_batch_bytes: Pending payload that forces a write (defaults to WS_FLUSH_MAX_BYTES)
+            max_queue: Frames queued before overflow handling (defaults to WS_SEND_QUEUE_SIZE)
+            overflow_policy: coalesce or drop (defaults to WS_OVERFLOW_POLICY)
+            send_timeout: Seconds a write may block before disconnecting (defaults to WS_SEND_TIMEOUT)
+        """
+        self.websocket = websocket
+        self.flush_interval = settings.WS_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        self.max_batch_bytes = max_batch_bytes or settings.WS_FLUSH_MAX_BYTES
+        self.max_queue = max_queue or settings.WS_SEND_QUEUE_SIZE
+        self.overflow_policy = overflow_policy or settings.WS_OVERFLOW_POLICY
+        self.send_timeout = send_timeout or settings.WS_SEND_TIMEOUT
+        
+        if self.overflow_policy not in OVERFLOW_POLICIES:
+            logger.warning(f"Unknown WS_OVERFLOW_POLICY {self.overflow_policy}, using coalesce")
+            self.overflow_policy = "coalesce"
+        
+        self._queue: Deque[_Frame] = deque()
+        self._queued_bytes = 0
+        self._pending = asyncio.Event()  # Anything queued
+        self._urgent = asyncio.Event()   # Something that shouldn't wait
+        self._idle = asyncio.Event()     # Queue drained
+        self._idle.set()
+        self.closed = False
+        self.close_reason: Optional[str] = None
+        self._closer: Optional[asyncio.Task] = None
+        
+        # Metrics
+        self.frames_queued = 0
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.frames_coalesced = 0
+        self.frames_dropped = 0
+        self.frames_discarded = 0
+        self.max_queue_depth = 0
+        
+        self._writer = asyncio.create_task(self._write_loop())
+    
+    @staticmethod
+    def _continues(last: _Frame, frame_type: str, data: Dict[str, Any]) -> bool:
+        """Whether stream data continues a queued stream frame."""
+        if last.data is None or last.type != frame_type:
+            return False
+        if frame_type == "ai_message_chunk":
+            return "seq" in data and last.data.get("seq") == data["seq"] - 1
+        return (last.data.get("step_index") == data.get("step_index") and
+                last.data.get("stream") == data.get("stream"))
+    
+    def _merge_into(self, last: _Frame, data: Dict[str, Any]):
+        """Append stream data to a queued stream frame."""
+        size = len(data.get("chunk") or data.get("line") or "")
+        if last.type == "ai_message_chunk":
+            last.data["chunk"] += data.get("chunk", "")
+            last.data["seq"] = data["seq"]
+        else:
+            last.data["line"] += "\n" + data.get("line", "")
+            last.data["lines"] = last.data.get("lines", 1) + 1
+        self._queued_bytes += size
+    
+    def _find_progress_frame(self, frame_type: str) -> Optional[_Frame]:
+        """
+        Newest queued progress frame of a type, if only progress frames follow it.
+        
+        Replacing it then can't move the newer status ahead of a result.
+        """
+        for frame in reversed(self._queue):
+            if frame.type == frame_type:
+                return frame
+            if frame.type not in PROGRESS_FRAME_TYPES:
+                return None
+        return None
+    
+    def _enqueue(self, frame_type: str, message: Optional[Dict[str, Any]] = None, text: Optional[str] = None) -> bool:
+        """
+        Queue a message, applying merging and the overflow policy.
+        
+        Args:
+            frame_type: Message type
+            message: Message to encode, or None if ``text`` is given
+            text: Already encoded message
+        
+        Returns:
+            False if the queue is full and the message can't be merged or dropped
+        """
+        data = message.get("data", {}) if message is not None else {}
+        stream = message is not None and frame_type in STREAM_FRAME_TYPES
+        
+        # Consecutive stream frames always merge
+        if stream and self._queue and self._continues(self._queue[-1], frame_type, data):
+            self._merge_into(self._queue[-1], data)
+            return True
+        
+        if len(self._queue) >= self.max_queue:
+            if frame_type == "command_output" and self.overflow_policy == "drop":
+                self.frames_dropped += 1
+                return True
+            if message is not None and frame_type in PROGRESS_FRAME_TYPES:
+                target = self._find_progress_frame(frame_type) if self.overflow_policy == "coalesce" else None
+                if target is None:
+                    self.frames_dropped += 1
+                    return True
+                # Newer status supersedes the queued one
+                self._queued_bytes -= target.size()
+                target.text = dumps_text(message)
+                self._queued_bytes += target.size()
+                self.frames_coalesced += 1
+                return True
+            return False
+        
+        if stream:
+            # Copy, since merging mutates the queued frame
+            frame = _Frame(frame_type, data={key: value for key, value in data.items() if key != "accumulated"})
+        else:
+            frame = _Frame(frame_type, text=dumps_text(message) if text is None else text)
+            self._urgent.set()
+        
+        self._queue.append(frame)
+        self._queued_bytes += frame.size()
+        self.max_queue_depth = max(self.max_queue_depth, len(self._queue))
+        return True
+    
+    async def send_json(self, message: Dict[str, Any]):
+        """
+        Queue a message for sending. Never blocks on the network.
+        
+        Args:
+            message: Message with ``type`` and ``data``
+        """
+        if self.closed:
+            self.frames_discarded += 1
+            return
+        
+        self.frames_queued += 1
+        if not self._enqueue(message.get("type", ""), message):
+            self._disconnect_slow_consumer()
+            return
+        self._wake()
+    
+    async def send_text(self, text: str):
+        """Queue an already encoded JSON message."""
+        if self.closed:
+            self.frames_discarded += 1
+            return
+        
+        self.frames_queued += 1
+        if not self._enqueue("", text=text):
+            self._disconnect_slow_consumer()
+            return
+        self._wake()
+    
+    def _wake(self):
+        """Signal the writer that frames are pending."""
+        if self._queued_bytes >= self.max_batch_bytes:
+            self._urgent.set()
+        self._idle.clear()
+        self._pending.set()
+    
+    async def _write_loop(self):
+        """Write queued frames until the channel closes."""
+        try:
+            while True:
+                await self._pending.wait()
+                
+                # Give streamed frames a moment to merge, unless something is urgent
+                if not self._urgent.is_set():
+                    try:
+                        await asyncio.wait_for(self._urgent.wait(), timeout=self.flush_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                
+                frames = [frame.encode() for frame in self._queue]
+                self._queue.clear()
+                self._queued_bytes = 0
+                self._pending.clear()
+                self._urgent.clear()
+                
+                if frames:
+                    payload = frames[0] if len(frames) == 1 else BATCH_PREFIX + ",".join(frames) + BATCH_SUFFIX
+                    try:
+                        await asyncio.wait_for(self.websocket.send_text(payload), timeout=self.send_timeout)
+                    except asyncio.TimeoutError:
+                        logger.warning(f"WebSocket consumer stuck for {self.send_timeout}s, disconnecting")
+                        await self._abort("slow consumer")
+                        return
+                    except Exception as e:
+                        logger.debug(f"WebSocket write failed: {e}")
+                        await self._abort(str(e))
+                        return
+                    
+                    self.frames_sent += 1
+                    self.bytes_sent += len(payload)
+                
+                if not self._queue:
+                    self._idle.set()
+        except asyncio.CancelledError:
+            pass
+    
+    def _disconnect_slow_consumer(self):
+        """Give up on a consumer that let the queue fill with frames that must be delivered."""
+        logger.warning(f"WebSocket send queue full ({self.max_queue} frames), disconnecting slow consumer")
+        self.frames_discarded += 1
+        self._mark_closed("slow consumer")
+        # The writer may be stuck in a send, so stop it and close separately
+        self._writer.cancel()
+        self._closer = asyncio.create_task(self._abort("slow consumer"))
+    
+    async def _abort(self, reason: str):
+        """Stop sending and close the connection."""
+        self._mark_closed(reason)
+        try:
+            await self.websocket.close()
+        except Exception:
+            pass
+    
+    def _mark_closed(self, reason: str):
+        """Discard pending frames and refuse new ones."""
+        if self.closed:
+            return
+        self.closed = True
+        self.close_reason = reason
+        self.frames_discarded += len(self._queue)
+        self._queue.clear()
+        self._queued_bytes = 0
+        self._idle.set()
+    
+    def detach(self):
+        """Stop the writer after the connection went away."""
+        self._mark_closed("disconnected")
+        self._writer.cancel()
+    
+    async def flush(self, timeout: Optional[float] = None):
+        """Wait until everything queued so far has been written."""
+        if self.closed:
+            return
+        self._urgent.set()
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout=timeout or self.send_timeout)
+        except asyncio.TimeoutError:
+            pass
+    
+    async def close(self):
+        """Write what's left (within the send timeout) and close the connection."""
+        await self.flush()
+        self._mark_closed("closed")
+        self._writer.cancel()
+        await self.websocket.close()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get frames queued by producers versus frames actually written."""
+        return {
+            "frames_queued": self.frames_queued,
+            "frames_sent": self.frames_sent,
+            "bytes_sent": self.bytes_sent,
+            "frames_coalesced": self.frames_coalesced,
+            "frames_dropped": self.frames_dropped,
+            "frames_discarded": self.frames_discarded,
+            "queue_depth": len(self._queue),
+            "max_queue_depth": self.max_queue_depth
+        }
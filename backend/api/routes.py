@@ -1,5 +1,5 @@
 """REST API routes."""
-from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks, Request
 from typing import List, Dict, Any, Optional
 import uuid
 from datetime import datetime
@@ -12,8 +12,14 @@ from backend.models.schemas import (
     SessionState,
     ConversationState
 )
-from backend.core.session_manager import SessionManager
+from backend.core.session_manager import SessionManager, session_manager
 from backend.core.agent import ConversationAgent
+from backend.core.fast_path import fast_path
+from backend.core.turn_queue import session_turn_queue
+from backend.api.websockets import run_user_turn
+from backend.api.state_sync import state_sync
+from backend.gemini.scheduler import gemini_request_scheduler
+from backend.gemini.response_cache import gemini_response_cache
 
 logger = logging.getLogger(__name__)
 
@@ -21,7 +27,6 @@ logger = logging.getLogger(__name__)
 api_router = APIRouter()
 
 # Global instances (these would be dependency injected in production)
-session_manager = SessionManager()
 conversation_agent = ConversationAgent()
 
 
@@ -78,16 +83,20 @@ async def create_session(
 
 @api_router.get("/sessions", response_model=APIResponse)
 async def list_sessions(
+    state: Optional[ConversationState] = None,
     session_mgr: SessionManager = Depends(get_session_manager)
 ):
     """
     List all sessions.
     
+    Args:
+        state: Optional conversation state to filter by
+        
     Returns:
         API response with session list
     """
     try:
-        sessions = await session_mgr.list_sessions()
+        sessions = await session_mgr.list_sessions(state.value if state else None)
         
         return APIResponse(
             success=True,
@@ -168,7 +177,6 @@ async def delete_session(
 async def send_message(
     session_id: str,
     request: UserResponseRequest,
-    background_tasks: BackgroundTasks,
     session_mgr: SessionManager = Depends(get_session_manager),
     agent: ConversationAgent = Depends(get_conversation_agent)
 ):
@@ -183,22 +191,16 @@ async def send_message(
         API response with conversation update
     """
     try:
-        # Load session
-        session_state = await session_mgr.load_state(session_id)
+        # Make sure the session exists before queuing the turn
+        await session_mgr.load_state(session_id)
         
-        # Process conversation in background
-        background_tasks.add_task(
-            agent.process_conversation,
-            user_input=request.response,
-            session_state=session_state,
-            websocket=None
-        )
-        
-        # Save session
-        background_tasks.add_task(
-            session_mgr.save_state,
+        # Process conversation in the background, after (or instead of)
+        # the session's earlier turns
+        session_turn_queue.submit(
             session_id,
-            session_state
+            lambda: run_user_turn(None, request.response, session_id, agent, session_mgr),
+            name="rest_message",
+            supersede=True
         )
         
         return APIResponse(
@@ -248,6 +250,79 @@ async def get_conversation_history(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@api_router.get("/sessions/{session_id}/archive/{field}", response_model=APIResponse)
+async def get_archived_entries(
+    session_id: str,
+    field: str,
+    offset: int = 0,
+    limit: Optional[int] = None,
+    session_mgr: SessionManager = Depends(get_session_manager)
+):
+    """
+    Get session entries moved to the archive by the retention policy.
+    
+    Args:
+        session_id: Session identifier
+        field: conversation_history, function_results or state_history
+        offset: Index of the first archived entry
+        limit: Optional limit on number of entries
+        
+    Returns:
+        API response with archived entries
+    """
+    try:
+        archived = await session_mgr.get_archived_entries(session_id, field, offset, limit)
+        
+        return APIResponse(
+            success=True,
+            message=f"Retrieved {len(archived['entries'])} of {archived['total']} archived entries",
+            data={
+                "session_id": session_id,
+                "field": field,
+                "offset": offset,
+                **archived
+            }
+        )
+        
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error getting archive for session {session_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@api_router.get("/sessions/{session_id}/payloads/{digest}", response_model=APIResponse)
+async def get_payload(
+    session_id: str,
+    digest: str,
+    session_mgr: SessionManager = Depends(get_session_manager)
+):
+    """
+    Get the full value of a truncated function result field.
+    
+    Args:
+        session_id: Session identifier
+        digest: Digest from the truncation marker
+        
+    Returns:
+        API response with the original value
+    """
+    try:
+        value = await session_mgr.fetch_payload(session_id, digest)
+    except Exception as e:
+        logger.error(f"Error fetching payload {digest} for session {session_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    if value is None:
+        raise HTTPException(status_code=404, detail="Payload not found")
+    
+    return APIResponse(
+        success=True,
+        message="Payload retrieved",
+        data={"digest": digest, "value": value}
+    )
+
+
 @api_router.post("/sessions/{session_id}/state", response_model=APIResponse)
 async def update_session_state(
     session_id: str,
@@ -388,6 +463,7 @@ async def health_check():
 
 @api_router.get("/stats", response_model=APIResponse)
 async def get_stats(
+    request: Request,
     session_mgr: SessionManager = Depends(get_session_manager)
 ):
     """
@@ -397,18 +473,23 @@ async def get_stats(
         API response with statistics
     """
     try:
-        sessions = await session_mgr.list_sessions()
-        
-        # Calculate stats
-        total_sessions = len(sessions)
-        active_sessions = sum(1 for s in sessions if 'modified' in s)
+        session_stats = await session_mgr.get_session_stats()
+        websocket_manager = getattr(request.app.state, "websocket_manager", None)
         
         return APIResponse(
             success=True,
             message="Statistics retrieved",
             data={
-                "total_sessions": total_sessions,
-                "active_sessions": active_sessions,
+                "total_sessions": session_stats["total_sessions"],
+                "active_sessions": session_stats["active_sessions"],
+                "sessions": session_stats,
+                "gemini_scheduler": gemini_request_scheduler.get_metrics(),
+                "gemini_cache": gemini_response_cache.get_stats(),
+                "fast_path": fast_path.get_stats(),
+                "turn_queue": session_turn_queue.get_stats(),
+                "websocket_output": websocket_manager.get_output_stats() if websocket_manager else None,
+                "websocket_heartbeat": websocket_manager.get_heartbeat_stats() if websocket_manager else None,
+                "state_sync": state_sync.get_stats(),
                 "timestamp": datetime.now().isoformat()
             }
         )
@@ -0,0 +1,157 @@
+"""Versioned session state sync with JSON-patch-style deltas."""
+from typing import Any, Dict, List, Optional
+import logging
+
+from backend.config import settings
+from backend.models.schemas import SessionState
+
+logger = logging.getLogger(__name__)
+
+
+def _pointer(token: Any) -> str:
+    """Escape a key for use in a JSON pointer."""
+    return str(token).replace("~", "~0").replace("/", "~1")
+
+
+def _front_trim(old: List[Any], new: List[Any]) -> int:
+    """Number of items removed from the front of a list, as retention does."""
+    if not old or not new or old[0] == new[0]:
+        return 0
+    try:
+        return old.index(new[0], 1)
+    except ValueError:
+        return 0
+
+
+def _diff(old: Any, new: Any, path: str, ops: List[Dict[str, Any]]):
+    """Append the operations turning ``old`` into ``new`` at ``path``."""
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key in old:
+            if key not in new:
+                ops.append({"op": "remove", "path": f"{path}/{_pointer(key)}"})
+        for key, value in new.items():
+            if key not in old:
+                ops.append({"op": "add", "path": f"{path}/{_pointer(key)}", "value": value})
+            elif old[key] != value:
+                _diff(old[key], value, f"{path}/{_pointer(key)}", ops)
+        return
+    
+    if isinstance(old, list) and isinstance(new, list):
+        trimmed = _front_trim(old, new)
+        ops.extend({"op": "remove", "path": f"{path}/0"} for _ in range(trimmed))
+        old = old[trimmed:]
+        
+        for index in range(min(len(old), len(new))):
+            if old[index] != new[index]:
+                _diff(old[index], new[index], f"{path}/{index}", ops)
+        for index in range(len(old) - 1, len(new) - 1, -1):
+            ops.append({"op": "remove", "path": f"{path}/{index}"})
+        for value in new[len(old):]:
+            ops.append({"op": "add", "path": f"{path}/-", "value": value})
+        return
+    
+    if old != new:
+        ops.append({"op": "replace", "path": path, "value": new})
+
+
+def diff_state(old: Dict[str, Any], new: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    JSON-patch-style operations turning one state dump into another.
+    
+    Lists are compared item by item, after removing whatever retention
+    trimmed off their front, so an appended message or function result is
+    a single ``add`` to ``/field/-`` however long the list has grown.
+    
+    Args:
+        old: State the client holds
+        new: Current state
+    
+    Returns:
+        add/remove/replace operations with JSON pointer paths
+    """
+    ops: List[Dict[str, Any]] = []
+    _diff(old, new, "", ops)
+    return ops
+
+
+class StateSync:
+    """
+    Build ``state_update`` payloads from the state a connection already has.
+    
+    Each connection keeps the dump and ``state_version`` it was last sent
+    (``state_snapshot``/``state_version`` on the connection). The next
+    update for it is a patch against that dump, so its size follows what
+    changed rather than the length of the session. A full snapshot is sent
+    on the first sync of a connection, when the client reports holding a
+    different version than the one it was sent, or when it asks for one
+    after a gap.
+    """
+    
+    def __init__(self, enabled: Optional[bool] = None):
+        """
+        Initialize state sync.
+        
+        Args:
+            enabled: Send deltas (defaults to WS_STATE_DELTAS_ENABLED)
+        """
+        self.enabled = settings.WS_STATE_DELTAS_ENABLED if enabled is None else enabled
+        
+        # Metrics
+        self.snapshots_sent = 0
+        self.deltas_sent = 0
+        self.patch_operations = 0
+    
+    def build_update(
+        self,
+        session_state: SessionState,
+        connection: Any = None,
+        known_version: Optional[int] = None,
+        full: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Build the data of a ``state_update`` message for a connection.
+        
+        Args:
+            session_state: Current session state
+            connection: Registered connection the update goes to (optional)
+            known_version: Version the client reports holding (optional)
+            full: Client asked for a full snapshot
+        
+        Returns:
+            ``session_state`` snapshot or ``patch`` against ``base_version``,
+            with the resulting ``state_version``
+        """
+        snapshot = session_state.model_dump(mode='json')
+        version = session_state.state_version
+        
+        base = None
+        if self.enabled and connection is not None and not full:
+            if known_version is None or known_version == connection.state_version:
+                base = connection.state_snapshot
+        
+        if connection is not None:
+            base_version = connection.state_version
+            connection.state_snapshot = snapshot
+            connection.state_version = version
+        
+        if base is None:
+            self.snapshots_sent += 1
+            return {"session_state": snapshot, "state_version": version}
+        
+        patch = diff_state(base, snapshot)
+        self.deltas_sent += 1
+        self.patch_operations += len(patch)
+        return {"patch": patch, "base_version": base_version, "state_version": version}
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get full snapshots versus deltas sent."""
+        return {
+            "enabled": self.enabled,
+            "snapshots_sent": self.snapshots_sent,
+            "deltas_sent": self.deltas_sent,
+            "patch_operations": self.patch_operations
+        }
+
+
+# Global state sync instance
+state_sync = StateSync()
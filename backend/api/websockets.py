@@ -4,97 +4,191 @@ from typing import Dict, List, Optional
 from datetime import datetime
 import json
 import logging
+import time
+import uuid
 from fastapi import WebSocket, WebSocketDisconnect
 
+from backend.config import settings
+from backend.models.serialization import dumps_text
+from backend.api.output_channel import WebSocketOutputChannel
+from backend.api.heartbeat import HeartbeatScheduler
+from backend.api.state_sync import state_sync
+from backend.core.turn_queue import session_turn_queue
+
 logger = logging.getLogger(__name__)
 
+# Close code for a connection refused at the connection limit ("try again later")
+CLOSE_TRY_AGAIN_LATER = 1013
+
+
+class Connection:
+    """Registered WebSocket connection."""
+    
+    __slots__ = (
+        "connection_id",
+        "session_id",
+        "websocket",
+        "channel",
+        "connected_at",
+        "last_seen",
+        "state_version",
+        "state_snapshot"
+    )
+    
+    def __init__(self, connection_id: str, session_id: str, websocket: WebSocket, channel: WebSocketOutputChannel):
+        self.connection_id = connection_id
+        self.session_id = session_id
+        self.websocket = websocket
+        self.channel = channel
+        self.connected_at = datetime.now()
+        self.last_seen = time.monotonic()  # Last message received from the client
+        
+        # Session state last sent, which deltas are computed against
+        self.state_version: Optional[int] = None
+        self.state_snapshot: Optional[Dict] = None
+
 
 class WebSocketManager:
-    """Manage WebSocket connections."""
+    """
+    Manage WebSocket connections.
+    
+    Each connection is held as a WebSocketOutputChannel, through which all
+    of its output goes, so batching never reorders frames. Channels queue
+    and write in the background: sending here never waits on a client,
+    and a channel closed for being too slow is dropped on the next send.
+    
+    Connections are indexed by connection ID, by session and by channel,
+    so registering and removing one costs the same however many are open.
+    At most ``max_connections`` are accepted at a time. Heartbeats for all
+    of them come from one HeartbeatScheduler, which also reaps connections
+    that have stopped answering.
+    """
     
-    def __init__(self):
-        """Initialize WebSocket manager."""
-        self.active_connections: Dict[str, WebSocket] = {}
-        self.session_connections: Dict[str, List[WebSocket]] = {}
-        self.heartbeat_tasks: Dict[str, asyncio.Task] = {}
+    def __init__(self, max_connections: Optional[int] = None):
+        """
+        Initialize WebSocket manager.
+        
+        Args:
+            max_connections: Open connections allowed (defaults to WS_MAX_CONNECTIONS)
+        """
+        self.max_connections = max_connections or settings.WS_MAX_CONNECTIONS
+        self.connections: Dict[str, Connection] = {}
+        self.session_connections: Dict[str, Dict[str, Connection]] = {}
+        self.channel_connections: Dict[WebSocketOutputChannel, Connection] = {}
+        self.heartbeats = HeartbeatScheduler(self._reap)
         
-    async def connect(self, websocket: WebSocket, session_id: str):
+        # Metrics
+        self.connections_rejected = 0
+        self.peak_connections = 0
+    
+    async def connect(self, websocket: WebSocket, session_id: str) -> Optional[WebSocketOutputChannel]:
         """
         Accept a new WebSocket connection.
         
         Args:
             websocket: WebSocket connection
             session_id: Session identifier
-        """
-        await websocket.accept()
         
-        # Generate connection ID
-        connection_id = f"{session_id}_{datetime.now().timestamp()}"
+        Returns:
+            Output channel to send to the connection through, or None if
+            the connection limit is reached and the connection was refused
+        """
+        if len(self.connections) >= self.max_connections:
+            self.connections_rejected += 1
+            logger.warning(
+                f"Refusing WebSocket for session {session_id}: "
+                f"{self.max_connections} connections open"
+            )
+            await websocket.close(code=CLOSE_TRY_AGAIN_LATER)
+            return None
         
-        # Store connection
-        self.active_connections[connection_id] = websocket
+        await websocket.accept()
+        channel = WebSocketOutputChannel(websocket)
         
-        if session_id not in self.session_connections:
-            self.session_connections[session_id] = []
-        self.session_connections[session_id].append(websocket)
+        connection = Connection(uuid.uuid4().hex, session_id, websocket, channel)
+        self._register(connection)
         
         # Start heartbeat
-        self.heartbeat_tasks[connection_id] = asyncio.create_task(
-            self._heartbeat_loop(websocket, connection_id)
-        )
+        self.heartbeats.add(connection)
         
-        logger.info(f"WebSocket connected: {connection_id} (session: {session_id})")
+        logger.info(f"WebSocket connected: {connection.connection_id} (session: {session_id})")
         
         # Send connection confirmation
-        await websocket.send_json({
+        await channel.send_json({
             "type": "connection_established",
             "data": {
-                "connection_id": connection_id,
+                "connection_id": connection.connection_id,
                 "session_id": session_id,
                 "timestamp": datetime.now().isoformat()
             }
         })
+        
+        return channel
+    
+    def _register(self, connection: Connection):
+        """Add a connection to every index."""
+        self.connections[connection.connection_id] = connection
+        self.session_connections.setdefault(connection.session_id, {})[connection.connection_id] = connection
+        self.channel_connections[connection.channel] = connection
+        self.peak_connections = max(self.peak_connections, len(self.connections))
+    
+    def _unregister(self, connection: Connection):
+        """Remove a connection from every index and stop its heartbeat and writer."""
+        if self.connections.pop(connection.connection_id, None) is None:
+            return
+        self.channel_connections.pop(connection.channel, None)
+        
+        session = self.session_connections.get(connection.session_id)
+        if session is not None:
+            session.pop(connection.connection_id, None)
+            # Remove empty session
+            if not session:
+                del self.session_connections[connection.session_id]
+        
+        self.heartbeats.remove(connection.connection_id)
+        
+        # Stop its writer
+        connection.channel.detach()
+        
+        logger.info(f"WebSocket disconnected: {connection.connection_id}")
+    
+    async def _reap(self, connection: Connection):
+        """Drop a connection that stopped answering heartbeats."""
+        logger.debug(f"WebSocket {connection.connection_id} unresponsive, closing")
+        self._unregister(connection)
+        try:
+            await asyncio.wait_for(connection.websocket.close(), timeout=settings.WS_SEND_TIMEOUT)
+        except Exception:
+            pass
+    
+    def touch(self, websocket: WebSocketOutputChannel):
+        """
+        Record that a client is alive.
+        
+        Args:
+            websocket: Channel of the connection a message was received on
+        """
+        connection = self.channel_connections.get(websocket)
+        if connection is not None:
+            connection.last_seen = time.monotonic()
     
-    def disconnect(self, session_id: str, websocket: Optional[WebSocket] = None):
+    def disconnect(self, session_id: str, websocket: Optional[WebSocketOutputChannel] = None):
         """
         Disconnect a WebSocket connection.
         
         Args:
             session_id: Session identifier
-            websocket: Specific WebSocket to disconnect (optional)
+            websocket: Specific connection channel to disconnect (optional,
+                all connections of the session otherwise)
         """
-        # Find and remove connection
-        connections_to_remove = []
-        
-        for conn_id, conn_websocket in self.active_connections.items():
-            if conn_id.startswith(f"{session_id}_") and (websocket is None or conn_websocket == websocket):
-                connections_to_remove.append(conn_id)
-        
-        for conn_id in connections_to_remove:
-            # Cancel heartbeat task
-            if conn_id in self.heartbeat_tasks:
-                self.heartbeat_tasks[conn_id].cancel()
-                del self.heartbeat_tasks[conn_id]
-            
-            # Remove from active connections
-            if conn_id in self.active_connections:
-                del self.active_connections[conn_id]
-            
-            logger.info(f"WebSocket disconnected: {conn_id}")
-        
-        # Clean up session connections
-        if session_id in self.session_connections:
-            if websocket:
-                self.session_connections[session_id] = [
-                    conn for conn in self.session_connections[session_id] 
-                    if conn != websocket
-                ]
-            else:
-                self.session_connections[session_id] = []
-            
-            # Remove empty session
-            if not self.session_connections[session_id]:
-                del self.session_connections[session_id]
+        if websocket is not None:
+            connection = self.channel_connections.get(websocket)
+            if connection is not None and connection.session_id == session_id:
+                self._unregister(connection)
+            return
+        
+        for connection in list(self.session_connections.get(session_id, {}).values()):
+            self._unregister(connection)
     
     async def send_to_session(self, session_id: str, message: Dict):
         """
@@ -104,38 +198,27 @@ class WebSocketManager:
             session_id: Session identifier
             message: Message to send
         """
-        logger.info(f"🔍 Attempting to send message to session {session_id}: {message.get('type', 'unknown')}")
-        logger.info(f"🔍 Available sessions: {list(self.session_connections.keys())}")
-        
-        if session_id not in self.session_connections:
+        session = self.session_connections.get(session_id)
+        if not session:
             logger.warning(f"❌ No active connections for session: {session_id}")
             return
         
+        # Encode once (datetimes and models included) for all connections
+        payload = dumps_text(message)
+        
         # Send to all connections for this session
         disconnected = []
-        for websocket in self.session_connections[session_id]:
-            try:
-                # Ensure message is JSON serializable by using custom encoder
-                import json
-                from datetime import datetime
-                
-                def datetime_encoder(obj):
-                    if isinstance(obj, datetime):
-                        return obj.isoformat()
-                    raise TypeError(f"Object of type {type(obj)} is not JSON serializable")
-                
-                # Convert to JSON string first, then send
-                json_str = json.dumps(message, default=datetime_encoder)
-                json_obj = json.loads(json_str)
-                await websocket.send_json(json_obj)
-                logger.info(f"✅ Successfully sent {message.get('type', 'unknown')} to WebSocket")
-            except Exception as e:
-                logger.error(f"Error sending message to WebSocket: {e}")
-                disconnected.append(websocket)
+        for connection in session.values():
+            if connection.channel.closed:
+                disconnected.append(connection)
+                continue
+            await connection.channel.send_text(payload)
+        
+        logger.debug(f"Queued {message.get('type', 'unknown')} for session {session_id}")
         
         # Clean up disconnected connections
-        for websocket in disconnected:
-            self.disconnect(session_id, websocket)
+        for connection in disconnected:
+            self._unregister(connection)
     
     async def broadcast(self, message: Dict, exclude_sessions: List[str] = None):
         """
@@ -145,88 +228,88 @@ class WebSocketManager:
             message: Message to broadcast
             exclude_sessions: Sessions to exclude from broadcast
         """
-        exclude_sessions = exclude_sessions or []
+        excluded = set(exclude_sessions or ())
+        payload = dumps_text(message)
         
         disconnected = []
-        for conn_id, websocket in self.active_connections.items():
-            session_id = conn_id.split('_')[0]
-            
-            if session_id in exclude_sessions:
+        for connection in self.connections.values():
+            if connection.session_id in excluded:
                 continue
             
-            try:
-                await websocket.send_json(message)
-            except Exception as e:
-                logger.error(f"Error broadcasting to {conn_id}: {e}")
-                disconnected.append(conn_id)
+            if connection.channel.closed:
+                logger.warning(
+                    f"Dropping closed connection {connection.connection_id}: "
+                    f"{connection.channel.close_reason}"
+                )
+                disconnected.append(connection)
+                continue
+            await connection.channel.send_text(payload)
         
         # Clean up disconnected connections
-        for conn_id in disconnected:
-            if conn_id in self.active_connections:
-                websocket = self.active_connections[conn_id]
-                session_id = conn_id.split('_')[0]
-                self.disconnect(session_id, websocket)
+        for connection in disconnected:
+            self._unregister(connection)
     
     async def disconnect_all(self):
         """Disconnect all WebSocket connections."""
-        # Cancel all heartbeat tasks
-        for task in self.heartbeat_tasks.values():
-            task.cancel()
+        connections = list(self.connections.values())
+        
+        # Stop heartbeats
+        await self.heartbeats.close()
         
         # Close all connections
-        for websocket in self.active_connections.values():
+        for connection in connections:
             try:
-                await websocket.close()
+                await connection.channel.close()
             except Exception as e:
                 logger.error(f"Error closing WebSocket: {e}")
         
         # Clear all data structures
-        self.active_connections.clear()
+        self.connections.clear()
         self.session_connections.clear()
-        self.heartbeat_tasks.clear()
+        self.channel_connections.clear()
         
         logger.info("All WebSocket connections disconnected")
     
     def get_connection_count(self) -> int:
         """Get total number of active connections."""
-        return len(self.active_connections)
+        return len(self.connections)
     
     def get_session_count(self) -> int:
         """Get number of active sessions."""
         return len(self.session_connections)
     
-    def get_connections_for_session(self, session_id: str) -> List[WebSocket]:
-        """Get all connections for a session."""
-        return self.session_connections.get(session_id, [])
-    
-    async def _heartbeat_loop(self, websocket: WebSocket, connection_id: str):
-        """
-        Maintain heartbeat with WebSocket connection.
+    def get_output_stats(self) -> Dict[str, int]:
+        """Get frames queued versus frames sent, over all connections."""
+        totals = {
+            "frames_queued": 0,
+            "frames_sent": 0,
+            "bytes_sent": 0,
+            "frames_coalesced": 0,
+            "frames_dropped": 0,
+            "frames_discarded": 0,
+            "queue_depth": 0
+        }
+        for connection in self.connections.values():
+            stats = connection.channel.get_stats()
+            for key in totals:
+                totals[key] += stats[key]
         
-        Args:
-            websocket: WebSocket connection
-            connection_id: Connection identifier
-        """
-        try:
-            while True:
-                await asyncio.sleep(30)  # Heartbeat every 30 seconds
-                
-                # Send heartbeat
-                await websocket.send_json({
-                    "type": "heartbeat",
-                    "data": {
-                        "timestamp": datetime.now().isoformat(),
-                        "connection_id": connection_id
-                    }
-                })
-                
-        except asyncio.CancelledError:
-            logger.debug(f"Heartbeat cancelled for {connection_id}")
-        except Exception as e:
-            logger.error(f"Heartbeat error for {connection_id}: {e}")
-            # Remove failed connection
-            session_id = connection_id.split('_')[0]
-            self.disconnect(session_id, websocket)
+        totals["connections"] = len(self.connections)
+        totals["peak_connections"] = self.peak_connections
+        totals["connections_rejected"] = self.connections_rejected
+        return totals
+    
+    def get_heartbeat_stats(self) -> Dict[str, int]:
+        """Get heartbeats sent and connections reaped."""
+        return self.heartbeats.get_stats()
+    
+    def get_connection(self, websocket: WebSocketOutputChannel) -> Optional[Connection]:
+        """Get the registered connection of a channel."""
+        return self.channel_connections.get(websocket)
+    
+    def get_connections_for_session(self, session_id: str) -> List[WebSocketOutputChannel]:
+        """Get all connections for a session."""
+        return [connection.channel for connection in self.session_connections.get(session_id, {}).values()]
 
 
 class MessageTypes:
@@ -262,6 +345,9 @@ class MessageTypes:
     # Progress tracking
     PROGRESS_UPDATE = "progress_update"
     
+    # Turn management
+    TURN_CANCELLED = "turn_cancelled"
+    
     # Errors and notifications
     ERROR = "error"
     WARNING = "warning"
@@ -269,6 +355,105 @@ class MessageTypes:
     SUCCESS = "success"
 
 
+async def _send_error(websocket: WebSocket, message: str):
+    """Send an error notification, ignoring a closed connection."""
+    try:
+        await websocket.send_json({
+            "type": MessageTypes.ERROR,
+            "data": {
+                "message": message,
+                "timestamp": datetime.now().isoformat()
+            }
+        })
+    except Exception as e:
+        logger.debug(f"Could not send error to client: {e}")
+
+
+async def run_user_turn(
+    websocket: Optional[WebSocket],
+    user_input: str,
+    session_id: str,
+    conversation_agent,
+    session_manager
+):
+    """
+    Process one user message as a queued turn.
+    
+    The state is saved however the turn ends, so a superseded turn leaves
+    its partial progress (at least the user's message) for the next one.
+    
+    Args:
+        websocket: WebSocket for real-time updates, None for REST requests
+        user_input: User's message
+        session_id: Session identifier
+        conversation_agent: Conversation agent instance
+        session_manager: Session manager instance
+    """
+    session_state = await session_manager.load_state(session_id)
+    try:
+        await conversation_agent.process_conversation(
+            user_input=user_input,
+            session_state=session_state,
+            websocket=websocket
+        )
+    except asyncio.CancelledError:
+        logger.info(f"Turn of session {session_id} cancelled")
+        if websocket:
+            try:
+                await websocket.send_json({
+                    "type": MessageTypes.TURN_CANCELLED,
+                    "data": {
+                        "message": "Previous request cancelled",
+                        "timestamp": datetime.now().isoformat()
+                    }
+                })
+            except Exception:
+                pass
+        raise
+    except Exception as e:
+        logger.error(f"Error processing turn of session {session_id}: {e}")
+        if websocket:
+            await _send_error(websocket, f"Error processing message: {str(e)}")
+    finally:
+        await session_manager.save_state(session_id, session_state)
+
+
+async def _run_start_session(websocket: WebSocket, session_id: str, conversation_agent, websocket_manager=None):
+    """Start a new conversation as a queued turn."""
+    try:
+        session_state = await conversation_agent.start_new_conversation(
+            session_id=session_id,
+            websocket=websocket
+        )
+        
+        update = state_sync.build_update(
+            session_state,
+            connection=websocket_manager.get_connection(websocket) if websocket_manager else None
+        )
+        update["message"] = "New session started"
+        update["timestamp"] = datetime.now().isoformat()
+        
+        await websocket.send_json({
+            "type": MessageTypes.STATE_UPDATE,
+            "data": update
+        })
+    except Exception as e:
+        logger.error(f"Error starting session {session_id}: {e}")
+        await _send_error(websocket, f"Error processing message: {str(e)}")
+
+
+async def _run_resume_session(websocket: WebSocket, session_id: str, conversation_agent):
+    """Resume a conversation as a queued turn."""
+    try:
+        await conversation_agent.resume_conversation(
+            session_id=session_id,
+            websocket=websocket
+        )
+    except Exception as e:
+        logger.error(f"Error resuming session {session_id}: {e}")
+        await _send_error(websocket, f"Error processing message: {str(e)}")
+
+
 async def handle_websocket_message(
     websocket: WebSocket,
     message: Dict,
@@ -280,93 +465,85 @@ async def handle_websocket_message(
     """
     Handle incoming WebSocket messages.
     
+    Conversation turns are queued per session and return immediately, so
+    the receive loop stays free to take a newer message, which cancels the
+    turn in flight.
+    
     Args:
         websocket: WebSocket connection
         message: Received message
         session_id: Session identifier
         conversation_agent: Conversation agent instance
         session_manager: Session manager instance
+        websocket_manager: WebSocket manager, for per-connection state sync (optional)
     """
     message_type = message.get("type")
     data = message.get("data", {})
     
     try:
-        if message_type == MessageTypes.USER_MESSAGE:
-            # User sent a message
-            user_message = data.get("message", "")
-            
-            # Load session state
-            session_state = await session_manager.load_state(session_id)
-            
-            # Process conversation
-            await conversation_agent.process_conversation(
-                user_input=user_message,
-                session_state=session_state,
-                websocket=websocket
-            )
-            
-            # Save updated state
-            await session_manager.save_state(session_id, session_state)
-            
-        elif message_type == MessageTypes.USER_RESPONSE:
-            # User responded to a question/permission request
-            user_response = data.get("response", "")
-            
-            # Load session state
-            session_state = await session_manager.load_state(session_id)
+        if message_type in (MessageTypes.USER_MESSAGE, MessageTypes.USER_RESPONSE):
+            # User sent a message or responded to a question/permission request
+            if message_type == MessageTypes.USER_MESSAGE:
+                user_input = data.get("message", "")
+            else:
+                user_input = data.get("response", "")
             
-            # Process conversation with the user response
-            await conversation_agent.process_conversation(
-                user_input=user_response,
-                session_state=session_state,
-                websocket=websocket
+            # Supersede whatever the session is still working on
+            session_turn_queue.submit(
+                session_id,
+                lambda: run_user_turn(
+                    websocket, user_input, session_id, conversation_agent, session_manager
+                ),
+                name=message_type,
+                supersede=True
             )
-            
-            # Save updated state
-            await session_manager.save_state(session_id, session_state)
-            
+        
+        elif message_type == MessageTypes.HEARTBEAT_ACK:
+            # Liveness is recorded by the receive loop
+            pass
+        
         elif message_type == MessageTypes.HEARTBEAT:
             # Respond to heartbeat
             await websocket.send_json({
                 "type": MessageTypes.HEARTBEAT_ACK,
                 "data": {"timestamp": datetime.now().isoformat()}
             })
-            
+        
         elif message_type == "get_session_state":
-            # Send current session state
+            # Send what changed since the version the client holds
             session_state = await session_manager.load_state(session_id)
             
-            await websocket.send_json({
-                "type": MessageTypes.STATE_UPDATE,
-                "data": {
-                    "session_state": session_state.model_dump(mode='json'),
-                    "timestamp": datetime.now().isoformat()
-                }
-            })
-            
-        elif message_type == "start_new_session":
-            # Start a new conversation
-            session_state = await conversation_agent.start_new_conversation(
-                session_id=session_id,
-                websocket=websocket
+            update = state_sync.build_update(
+                session_state,
+                connection=websocket_manager.get_connection(websocket) if websocket_manager else None,
+                known_version=data.get("state_version"),
+                full=data.get("full", False)
             )
+            update["timestamp"] = datetime.now().isoformat()
             
             await websocket.send_json({
                 "type": MessageTypes.STATE_UPDATE,
-                "data": {
-                    "session_state": session_state.model_dump(mode='json'),
-                    "message": "New session started",
-                    "timestamp": datetime.now().isoformat()
-                }
+                "data": update
             })
-            
+        
+        elif message_type == "start_new_session":
+            # Start a new conversation once earlier turns are done
+            session_turn_queue.submit(
+                session_id,
+                lambda: _run_start_session(websocket, session_id, conversation_agent, websocket_manager),
+                name=message_type,
+                cancellable=False
+            )
+        
         elif message_type == "resume_session":
-            # Resume existing conversation
-            session_state = await conversation_agent.resume_conversation(
-                session_id=session_id,
-                websocket=websocket
+            # Resume existing conversation once earlier turns are done
+            session_turn_queue.submit(
+                session_id,
+                lambda: _run_resume_session(websocket, session_id, conversation_agent),
+                name=message_type,
+                cancellable=False
             )
-            
+        
         else:
             logger.warning(f"Unknown message type: {message_type}")
             await websocket.send_json({
@@ -376,7 +553,7 @@ async def handle_websocket_message(
                     "timestamp": datetime.now().isoformat()
                 }
             })
-            
+    
     except Exception as e:
         logger.error(f"Error handling WebSocket message: {e}")
         
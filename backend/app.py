@@ -11,8 +11,11 @@ from datetime import datetime
 from backend.config import settings
 from backend.api.routes import api_router
 from backend.api.websockets import WebSocketManager, handle_websocket_message
-from backend.core.session_manager import SessionManager
+from backend.core.session_manager import session_manager
 from backend.core.agent import ConversationAgent
+from backend.core.turn_queue import session_turn_queue
+from backend.gemini.http_pool import gemini_connection_pool
+from backend.capabilities.detector import capability_detector
 import logging
 
 # Configure logging
@@ -37,16 +40,24 @@ async def lifespan(app: FastAPI):
     logger.info(f"Debug mode: {settings.DEBUG}")
     
     # Initialize components
+    await gemini_connection_pool.start()
+    app.state.gemini_connection_pool = gemini_connection_pool
     app.state.websocket_manager = WebSocketManager()
-    app.state.session_manager = SessionManager()
+    app.state.session_manager = session_manager
+    await session_manager.start_expiry_sweeper()
     app.state.conversation_agent = ConversationAgent()
+    capability_detector.warm_up()
     
     yield
     
     # Shutdown
     logger.info("Shutting down AI Agent Bootstrapper...")
     # Cleanup tasks
+    await session_turn_queue.close()
     await app.state.websocket_manager.disconnect_all()
+    await session_manager.close()
+    await capability_detector.close()
+    await gemini_connection_pool.close()
 
 
 # Create FastAPI app
@@ -97,11 +108,15 @@ async def health_check():
 async def websocket_endpoint(websocket: WebSocket, session_id: str):
     """WebSocket endpoint for real-time communication."""
     manager = app.state.websocket_manager
-    await manager.connect(websocket, session_id)
+    # All output goes through the connection's batching channel
+    channel = await manager.connect(websocket, session_id)
+    if channel is None:
+        # Refused at the connection limit
+        return
     
     try:
         # Send initial connection message
-        await websocket.send_json({
+        await channel.send_json({
             "type": "connection_established",
             "data": {
                 "session_id": session_id,
@@ -115,7 +130,7 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str):
             from backend.api.websockets import handle_websocket_message
             # Trigger conversation start automatically
             await handle_websocket_message(
-                websocket=websocket,
+                websocket=channel,
                 message={"type": "start_new_session", "data": {}},
                 session_id=session_id,
                 conversation_agent=app.state.conversation_agent,
@@ -128,10 +143,11 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str):
         # Keep connection alive and handle messages
         while True:
             data = await websocket.receive_json()
+            manager.touch(channel)
             
             # Handle message using the dedicated handler
             await handle_websocket_message(
-                websocket=websocket,
+                websocket=channel,
                 message=data,
                 session_id=session_id,
                 conversation_agent=app.state.conversation_agent,
@@ -140,11 +156,16 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str):
             )
                 
     except WebSocketDisconnect:
-        manager.disconnect(session_id)
+        manager.disconnect(session_id, channel)
+        # Nobody is listening for the rest of the turn
+        if not manager.get_connections_for_session(session_id):
+            session_turn_queue.cancel(session_id)
         logger.info(f"WebSocket disconnected: {session_id}")
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
-        manager.disconnect(session_id)
+        manager.disconnect(session_id, channel)
+        if not manager.get_connections_for_session(session_id):
+            session_turn_queue.cancel(session_id)
 
 
 if __name__ == "__main__":
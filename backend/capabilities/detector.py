@@ -1,5 +1,6 @@
 """System capability detection."""
 import asyncio
+import hashlib
 import platform
 import os
 import shutil
@@ -7,13 +8,46 @@ import subprocess
 from typing import Dict, List, Optional, Any
 import logging
 import json
-from datetime import datetime
+import aiofiles
 
 from backend.models.schemas import SystemCapability
 from backend.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Version probes that may run at the same time
+MAX_CONCURRENT_PROBES = 8
+
+# Seconds to wait for a version probe, per executable
+DEFAULT_PROBE_TIMEOUT = 5
+PROBE_TIMEOUTS = {
+    "flutter": 10,
+    "dotnet": 10,
+    "java": 10,
+    "kotlinc": 10,
+    "swift": 10,
+    "xcodebuild": 10
+}
+
+# Seconds between toolchain fingerprint checks on the cached path
+FINGERPRINT_CHECK_INTERVAL = 5
+
+# Executables whose installation or upgrade changes detected capabilities
+TRACKED_TOOLS = [
+    "python", "python3", "node", "npm", "docker", "git",
+    "pip", "pip3", "pipenv", "poetry", "conda", "yarn", "pnpm",
+    "apt", "yum", "dnf", "pacman", "zypper", "apk", "brew", "port", "choco", "scoop",
+    "go", "rustc", "java", "php", "ruby", "dotnet", "swift",
+    "flutter", "dart", "kotlinc", "xcodebuild", "adb"
+]
+
+RELEVANT_ENV_VARS = [
+    'PATH', 'HOME', 'USER', 'SHELL',
+    'NODE_ENV', 'PYTHON_PATH', 'VIRTUAL_ENV',
+    'JAVA_HOME', 'GOPATH', 'CARGO_HOME',
+    'DOCKER_HOST', 'KUBECONFIG'
+]
+
 
 class CapabilityDetector:
     """Detect system capabilities and installed tools."""
@@ -21,7 +55,15 @@ class CapabilityDetector:
     def __init__(self):
         """Initialize capability detector."""
         self.cache_file = os.path.join(settings.DATA_DIR, "capabilities.json")
-        self.cache_ttl = 3600  # Cache for 1 hour
+        self._probe_semaphore = asyncio.Semaphore(MAX_CONCURRENT_PROBES)
+        # Executables found on PATH, set for the duration of a detection run
+        self._path_index: Optional[Dict[str, str]] = None
+        
+        # In-process cache, valid while the toolchain fingerprint is unchanged
+        self._cached: Optional[SystemCapability] = None
+        self._cached_fingerprint: Optional[str] = None
+        self._fingerprint_checked_at = 0.0
+        self._refresh_task: Optional[asyncio.Task] = None
         
     async def detect_all_capabilities(self, force_refresh: bool = False) -> SystemCapability:
         """
@@ -33,31 +75,141 @@ class CapabilityDetector:
         Returns:
             System capability information
         """
-        # Check cache first
-        if not force_refresh:
-            cached = await self._load_cache()
+        if force_refresh:
+            return await asyncio.shield(self._schedule_refresh(force=True))
+        
+        if self._cached is not None:
+            # Stale-while-revalidate: serve the cached result immediately and
+            # re-detect in the background if the toolchain has changed. The
+            # fingerprint stats every PATH entry, so keep it off the event loop
+            now = asyncio.get_running_loop().time()
+            if now - self._fingerprint_checked_at >= FINGERPRINT_CHECK_INTERVAL:
+                self._fingerprint_checked_at = now
+                if await asyncio.to_thread(self._compute_fingerprint) != self._cached_fingerprint:
+                    logger.info("Toolchain changed, refreshing capabilities in the background")
+                    self._schedule_refresh()
+            return self._cached
+        
+        return await asyncio.shield(self._schedule_refresh())
+    
+    def warm_up(self):
+        """Start detection in the background so the first session doesn't wait."""
+        if self._cached is None:
+            self._schedule_refresh()
+    
+    async def close(self):
+        """Cancel any in-progress background refresh."""
+        if self._refresh_task and not self._refresh_task.done():
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._refresh_task = None
+    
+    def _schedule_refresh(self, force: bool = False) -> asyncio.Task:
+        """Start a detection run unless one is already in progress."""
+        if self._refresh_task is None or self._refresh_task.done() or force:
+            self._refresh_task = asyncio.create_task(self._refresh(force))
+            self._refresh_task.add_done_callback(self._on_refresh_done)
+        return self._refresh_task
+    
+    @staticmethod
+    def _on_refresh_done(task: asyncio.Task):
+        """Log background refresh failures instead of losing them."""
+        if not task.cancelled() and task.exception():
+            logger.error(f"Capability refresh failed: {task.exception()}")
+    
+    async def _refresh(self, force: bool = False) -> SystemCapability:
+        """Load or detect capabilities and update both cache tiers."""
+        # Fingerprint first so changes made during detection trigger another run
+        fingerprint = await asyncio.to_thread(self._compute_fingerprint)
+        
+        if not force:
+            cached = await self._load_cache(fingerprint)
             if cached:
                 logger.info("Using cached capabilities")
+                self._store(cached, fingerprint)
                 return cached
         
+        capabilities = await self._detect()
+        self._store(capabilities, fingerprint)
+        await self._save_cache(capabilities, fingerprint)
+        return capabilities
+    
+    def _store(self, capabilities: SystemCapability, fingerprint: str):
+        """Update the in-process cache."""
+        self._cached = capabilities
+        self._cached_fingerprint = fingerprint
+        self._fingerprint_checked_at = asyncio.get_running_loop().time()
+    
+    def _compute_fingerprint(self) -> str:
+        """
+        Hash everything detection results depend on.
+        
+        Covers the relevant environment variables (including PATH), the
+        modification time of each PATH directory (tools added or removed)
+        and the mtime/inode of every tracked binary (tools upgraded in place).
+        """
+        parts = [f"{var}={os.environ.get(var, '')}" for var in RELEVANT_ENV_VARS]
+        
+        for directory in os.environ.get("PATH", "").split(os.pathsep):
+            try:
+                parts.append(f"{directory}:{os.stat(directory).st_mtime_ns}")
+            except OSError:
+                parts.append(f"{directory}:-")
+        
+        for tool in TRACKED_TOOLS:
+            path = shutil.which(tool)
+            try:
+                stat = os.stat(path) if path else None
+            except OSError:
+                stat = None
+            parts.append(f"{tool}:{path}:{stat.st_mtime_ns if stat else '-'}:{stat.st_ino if stat else '-'}")
+        
+        return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+    
+    async def _detect(self) -> SystemCapability:
+        """Run every capability probe."""
         logger.info("Detecting system capabilities...")
         
+        # Resolve executables once so missing tools are never spawned, then
+        # run the remaining version probes concurrently
+        self._path_index = self._scan_path()
+        try:
+            (
+                python_version,
+                node_version,
+                npm_version,
+                docker_installed,
+                git_installed,
+                package_managers,
+                runtimes
+            ) = await asyncio.gather(
+                self._detect_python(),
+                self._detect_node(),
+                self._detect_npm(),
+                self._detect_docker(),
+                self._detect_git(),
+                self._detect_package_managers(),
+                self._detect_runtimes()
+            )
+        finally:
+            self._path_index = None
+        
         capabilities = SystemCapability(
             os=self._detect_os(),
             shell=self._detect_shell(),
-            python_version=await self._detect_python(),
-            node_version=await self._detect_node(),
-            npm_version=await self._detect_npm(),
-            docker_installed=await self._detect_docker(),
-            git_installed=await self._detect_git(),
-            available_package_managers=await self._detect_package_managers(),
-            available_runtimes=await self._detect_runtimes(),
+            python_version=python_version,
+            node_version=node_version,
+            npm_version=npm_version,
+            docker_installed=docker_installed,
+            git_installed=git_installed,
+            available_package_managers=package_managers,
+            available_runtimes=runtimes,
             environment_variables=self._get_relevant_env_vars()
         )
         
-        # Save to cache
-        await self._save_cache(capabilities)
-        
         logger.info("System capability detection completed")
         return capabilities
     
@@ -190,17 +342,22 @@ class CapabilityDetector:
             "android": ["adb", "--version"]
         }
         
-        for runtime, cmd in runtime_commands.items():
-            try:
-                result = await self._run_command(cmd)
-                if result.returncode == 0:
-                    version_output = result.stdout or result.stderr
-                    # Extract version number (simplified)
-                    version = self._extract_version(version_output)
-                    if version:
-                        runtimes[runtime] = version
-            except Exception as e:
-                logger.debug(f"Runtime {runtime} detection failed: {e}")
+        results = await asyncio.gather(
+            *(self._run_command(cmd) for cmd in runtime_commands.values()),
+            return_exceptions=True
+        )
+        
+        for runtime, result in zip(runtime_commands, results):
+            if isinstance(result, Exception):
+                logger.debug(f"Runtime {runtime} detection failed: {result}")
+                continue
+            
+            if result.returncode == 0:
+                version_output = result.stdout or result.stderr
+                # Extract version number (simplified)
+                version = self._extract_version(version_output)
+                if version:
+                    runtimes[runtime] = version
         
         return runtimes
     
@@ -225,61 +382,95 @@ class CapabilityDetector:
     
     def _get_relevant_env_vars(self) -> Dict[str, str]:
         """Get relevant environment variables."""
-        relevant_vars = [
-            'PATH', 'HOME', 'USER', 'SHELL',
-            'NODE_ENV', 'PYTHON_PATH', 'VIRTUAL_ENV',
-            'JAVA_HOME', 'GOPATH', 'CARGO_HOME',
-            'DOCKER_HOST', 'KUBECONFIG'
-        ]
-        
         env_vars = {}
-        for var in relevant_vars:
+        for var in RELEVANT_ENV_VARS:
             value = os.environ.get(var)
             if value:
                 env_vars[var] = value
         
         return env_vars
     
+    def _scan_path(self) -> Dict[str, str]:
+        """Map executable names to their location with a single PATH scan."""
+        extensions = [""]
+        if platform.system() == "Windows":
+            extensions += [ext.lower() for ext in os.environ.get("PATHEXT", ".EXE;.BAT;.CMD").split(";") if ext]
+        
+        executables = {}
+        for directory in os.environ.get("PATH", "").split(os.pathsep):
+            if not directory:
+                continue
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            
+            for entry in entries:
+                name = entry.name
+                for ext in extensions:
+                    if ext and name.lower().endswith(ext):
+                        name = name[:-len(ext)]
+                        break
+                # Earlier PATH entries win, as in the shell
+                executables.setdefault(name, entry.path)
+        
+        return executables
+    
+    def _which(self, command: str) -> Optional[str]:
+        """Resolve a command to an executable path, or None if missing."""
+        if self._path_index is None:
+            return shutil.which(command)
+        
+        path = self._path_index.get(command)
+        if path and os.path.isfile(path) and os.access(path, os.X_OK):
+            return path
+        return None
+    
     async def _check_command_exists(self, command: str) -> bool:
         """Check if a command exists in PATH."""
-        try:
-            result = await self._run_command([command, "--version"])
-            return result.returncode == 0
-        except Exception:
-            # Try with 'which' or 'where'
-            try:
-                which_cmd = "where" if platform.system() == "Windows" else "which"
-                result = await self._run_command([which_cmd, command])
-                return result.returncode == 0
-            except Exception:
-                return False
+        return self._which(command) is not None
     
     async def _run_command(
         self,
         command: List[str],
-        timeout: int = 10
+        timeout: Optional[int] = None
     ) -> subprocess.CompletedProcess:
         """
         Run a command asynchronously.
         
         Args:
             command: Command to run
-            timeout: Timeout in seconds
+            timeout: Timeout in seconds (defaults to the per-tool probe timeout)
             
         Returns:
             Completed process result
         """
-        try:
-            process = await asyncio.create_subprocess_exec(
-                *command,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            
-            stdout, stderr = await asyncio.wait_for(
-                process.communicate(),
-                timeout=timeout
+        executable = self._which(command[0])
+        if executable is None:
+            # Not installed - don't pay for a process spawn to find out
+            return subprocess.CompletedProcess(
+                args=command,
+                returncode=127,
+                stdout="",
+                stderr=f"{command[0]}: command not found"
             )
+        
+        if timeout is None:
+            timeout = PROBE_TIMEOUTS.get(command[0], DEFAULT_PROBE_TIMEOUT)
+        
+        process = None
+        try:
+            async with self._probe_semaphore:
+                process = await asyncio.create_subprocess_exec(
+                    *command,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE
+                )
+                
+                stdout, stderr = await asyncio.wait_for(
+                    process.communicate(),
+                    timeout=timeout
+                )
             
             return subprocess.CompletedProcess(
                 args=command,
@@ -290,6 +481,11 @@ class CapabilityDetector:
             
         except asyncio.TimeoutError:
             logger.warning(f"Command timed out: {' '.join(command)}")
+            try:
+                process.kill()
+                await process.wait()
+            except Exception:
+                pass
             return subprocess.CompletedProcess(
                 args=command,
                 returncode=1,
@@ -305,30 +501,35 @@ class CapabilityDetector:
                 stderr=str(e)
             )
     
-    async def _load_cache(self) -> Optional[SystemCapability]:
-        """Load capabilities from cache if valid."""
+    async def _load_cache(self, fingerprint: str) -> Optional[SystemCapability]:
+        """Load capabilities from disk if they match the current toolchain."""
         try:
             if not os.path.exists(self.cache_file):
                 return None
             
-            # Check cache age
-            cache_age = datetime.now().timestamp() - os.path.getmtime(self.cache_file)
-            if cache_age > self.cache_ttl:
+            async with aiofiles.open(self.cache_file, 'r') as f:
+                data = json.loads(await f.read())
+            
+            if data.get("fingerprint") != fingerprint:
                 return None
             
-            with open(self.cache_file, 'r') as f:
-                data = json.load(f)
-                return SystemCapability(**data)
+            return SystemCapability(**data["capabilities"])
                 
         except Exception as e:
             logger.debug(f"Failed to load capability cache: {e}")
             return None
     
-    async def _save_cache(self, capabilities: SystemCapability):
-        """Save capabilities to cache."""
+    async def _save_cache(self, capabilities: SystemCapability, fingerprint: str):
+        """Save capabilities to disk along with the toolchain fingerprint."""
+        temp_file = f"{self.cache_file}.tmp"
         try:
-            with open(self.cache_file, 'w') as f:
-                json.dump(capabilities.model_dump(), f, indent=2)
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            async with aiofiles.open(temp_file, 'w') as f:
+                await f.write(json.dumps({
+                    "fingerprint": fingerprint,
+                    "capabilities": capabilities.model_dump()
+                }, indent=2))
+            os.replace(temp_file, self.cache_file)
         except Exception as e:
             logger.warning(f"Failed to save capability cache: {e}")
     
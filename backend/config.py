@@ -14,6 +14,25 @@ class Settings(BaseSettings):
     GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY", "")
     GEMINI_MODEL: str = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
     GEMINI_API_URL: str = os.getenv("GEMINI_API_URL", "https://generativelanguage.googleapis.com/v1beta")
+    GEMINI_MINIMAL_FUNCTION_SCHEMAS: bool = os.getenv("GEMINI_MINIMAL_FUNCTION_SCHEMAS", "False").lower() == "true"
+    
+    # Gemini HTTP Connection Pool
+    GEMINI_POOL_LIMIT: int = int(os.getenv("GEMINI_POOL_LIMIT", "100"))
+    GEMINI_POOL_LIMIT_PER_HOST: int = int(os.getenv("GEMINI_POOL_LIMIT_PER_HOST", "20"))
+    GEMINI_DNS_CACHE_TTL: int = int(os.getenv("GEMINI_DNS_CACHE_TTL", "300"))
+    GEMINI_KEEPALIVE_TIMEOUT: float = float(os.getenv("GEMINI_KEEPALIVE_TIMEOUT", "60"))
+    
+    # Gemini Request Scheduling (0 disables a budget)
+    GEMINI_MAX_CONCURRENT_REQUESTS: int = int(os.getenv("GEMINI_MAX_CONCURRENT_REQUESTS", "8"))
+    GEMINI_REQUESTS_PER_MINUTE: int = int(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "60"))
+    GEMINI_TOKENS_PER_MINUTE: int = int(os.getenv("GEMINI_TOKENS_PER_MINUTE", "1000000"))
+    
+    # Gemini Response Cache (deterministic, low-temperature completions only)
+    GEMINI_CACHE_ENABLED: bool = os.getenv("GEMINI_CACHE_ENABLED", "True").lower() == "true"
+    GEMINI_CACHE_MAX_TEMPERATURE: float = float(os.getenv("GEMINI_CACHE_MAX_TEMPERATURE", "0.2"))
+    GEMINI_CACHE_TTL: int = int(os.getenv("GEMINI_CACHE_TTL", "86400"))
+    GEMINI_CACHE_MAX_ENTRIES: int = int(os.getenv("GEMINI_CACHE_MAX_ENTRIES", "256"))
+    GEMINI_CACHE_MAX_DISK_MB: int = int(os.getenv("GEMINI_CACHE_MAX_DISK_MB", "100"))
     
     # Application Configuration
     APP_ENV: str = os.getenv("APP_ENV", "development")
@@ -25,10 +44,37 @@ class Settings(BaseSettings):
     SESSION_TIMEOUT: int = int(os.getenv("SESSION_TIMEOUT", "3600"))
     MAX_ITERATIONS: int = int(os.getenv("MAX_ITERATIONS", "50"))
     MAX_EXECUTION_TIME: int = int(os.getenv("MAX_EXECUTION_TIME", "300"))
+    SESSION_CACHE_SIZE: int = int(os.getenv("SESSION_CACHE_SIZE", "256"))
+    SESSION_DURABILITY: str = os.getenv("SESSION_DURABILITY", "write_behind")  # write_through or write_behind
+    SESSION_FLUSH_DELAY: float = float(os.getenv("SESSION_FLUSH_DELAY", "0.5"))
+    SESSION_SNAPSHOT_INTERVAL: int = int(os.getenv("SESSION_SNAPSHOT_INTERVAL", "200"))
+    SESSION_STORAGE: str = os.getenv("SESSION_STORAGE", "file")  # file or sqlite
+    SESSION_CODEC: str = os.getenv("SESSION_CODEC", "json")  # json or msgpack (snapshots and checkpoints)
+    SESSION_HOT_MESSAGES: int = int(os.getenv("SESSION_HOT_MESSAGES", "200"))
+    SESSION_HOT_FUNCTION_RESULTS: int = int(os.getenv("SESSION_HOT_FUNCTION_RESULTS", "10"))
+    SESSION_HOT_STATE_HISTORY: int = int(os.getenv("SESSION_HOT_STATE_HISTORY", "50"))
+    SESSION_PAYLOAD_MAX_CHARS: int = int(os.getenv("SESSION_PAYLOAD_MAX_CHARS", "4096"))
+    
+    # Conversation Context (prompt token budgets, ~4 characters per token)
+    CONVERSATION_HISTORY_TOKEN_BUDGET: int = int(os.getenv("CONVERSATION_HISTORY_TOKEN_BUDGET", "4000"))
+    CONVERSATION_SUMMARY_TOKEN_BUDGET: int = int(os.getenv("CONVERSATION_SUMMARY_TOKEN_BUDGET", "1000"))
+    CONVERSATION_MAX_RECENT_MESSAGES: int = int(os.getenv("CONVERSATION_MAX_RECENT_MESSAGES", "20"))
+    
+    # Deterministic Fast Path (workflow steps handled without Gemini)
+    FAST_PATH_ENABLED: bool = os.getenv("FAST_PATH_ENABLED", "True").lower() == "true"
+    FAST_PATH_MAX_STEPS: int = int(os.getenv("FAST_PATH_MAX_STEPS", "8"))
     
     # WebSocket Configuration
     WS_HEARTBEAT_INTERVAL: int = int(os.getenv("WS_HEARTBEAT_INTERVAL", "30"))
+    WS_HEARTBEAT_TIMEOUT: float = float(os.getenv("WS_HEARTBEAT_TIMEOUT", "90"))  # Silence before a connection is reaped
+    WS_HEARTBEAT_JITTER: float = float(os.getenv("WS_HEARTBEAT_JITTER", "0.1"))  # Fraction of the interval
     WS_MAX_CONNECTIONS: int = int(os.getenv("WS_MAX_CONNECTIONS", "100"))
+    WS_FLUSH_INTERVAL: float = float(os.getenv("WS_FLUSH_INTERVAL", "0.05"))
+    WS_FLUSH_MAX_BYTES: int = int(os.getenv("WS_FLUSH_MAX_BYTES", "65536"))
+    WS_SEND_QUEUE_SIZE: int = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+    WS_OVERFLOW_POLICY: str = os.getenv("WS_OVERFLOW_POLICY", "coalesce")  # coalesce or drop (progress frames only)
+    WS_SEND_TIMEOUT: float = float(os.getenv("WS_SEND_TIMEOUT", "10"))
+    WS_STATE_DELTAS_ENABLED: bool = os.getenv("WS_STATE_DELTAS_ENABLED", "True").lower() == "true"
     
     # CORS Configuration
     CORS_ORIGINS: List[str] = ["http://localhost:5173", "http://localhost:3000"]
@@ -48,11 +94,14 @@ class Settings(BaseSettings):
     # File Storage
     DATA_DIR: str = os.getenv("DATA_DIR", "./data")
     SESSION_DIR: str = os.getenv("SESSION_DIR", "./data/sessions")
+    SESSION_DB_PATH: str = os.getenv("SESSION_DB_PATH", "./data/sessions.db")
     LOG_DIR: str = os.getenv("LOG_DIR", "./data/logs")
     
     # Project Creation Configuration
     PROJECT_BASE_DIR: str = os.getenv("PROJECT_BASE_DIR", "./apps")
     ALLOW_ABSOLUTE_PROJECT_PATHS: bool = os.getenv("ALLOW_ABSOLUTE_PROJECT_PATHS", "False").lower() == "true"
+    FILE_GENERATION_CONCURRENCY: int = int(os.getenv("FILE_GENERATION_CONCURRENCY", "4"))
+    EXECUTION_MAX_PARALLEL_STEPS: int = int(os.getenv("EXECUTION_MAX_PARALLEL_STEPS", "4"))
     
     class Config:
         env_file = ".env"
@@ -1,9 +1,10 @@
 """Core components package."""
-from .session_manager import SessionManager
+from .session_manager import SessionManager, session_manager
 from .state_machine import ConversationStateMachine, conversation_state_machine
 
 __all__ = [
     "SessionManager", 
+    "session_manager",
     "ConversationStateMachine",
     "conversation_state_machine"
 ]
\ No newline at end of file
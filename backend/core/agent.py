@@ -1,6 +1,5 @@
 """Main conversation agent orchestrator."""
 import asyncio
-import json
 from typing import Dict, Any, Optional
 from datetime import datetime
 import logging
@@ -8,9 +7,13 @@ import logging
 from backend.config import settings
 from backend.models.schemas import SessionState, ConversationState, GeminiStreamChunk
 from backend.gemini.streaming_client import GeminiStreamingClient, GeminiChunkParser
+from backend.gemini.scheduler import RequestPriority
 from backend.gemini.function_registry import function_registry
 from backend.core.state_machine import conversation_state_machine
-from backend.core.session_manager import SessionManager
+from backend.core.session_manager import session_manager
+from backend.core.conversation_memory import conversation_memory
+from backend.core.prompt_builder import system_prompt_builder
+from backend.core.fast_path import fast_path, render_capabilities
 
 logger = logging.getLogger(__name__)
 
@@ -20,105 +23,30 @@ class ConversationAgent:
     
     def __init__(self):
         """Initialize conversation agent."""
-        self.gemini_client = None
-        self.chunk_parser = GeminiChunkParser()
         self.function_registry = function_registry
         self.state_machine = conversation_state_machine
-        self.session_manager = SessionManager()
+        self.session_manager = session_manager
+        self.conversation_memory = conversation_memory
+        self.prompt_builder = system_prompt_builder
+        self.fast_path = fast_path
         self.max_iterations = settings.MAX_ITERATIONS
         
-    async def _get_gemini_client(self) -> GeminiStreamingClient:
-        """Get or create Gemini client."""
-        if self.gemini_client is None:
-            self.gemini_client = GeminiStreamingClient()
-        return self.gemini_client
+    async def _get_gemini_client(self, session_id: Optional[str] = None) -> GeminiStreamingClient:
+        """
+        Get a Gemini client for a single turn.
+        
+        Clients are cheap since they borrow the shared connection pool, and a
+        fresh instance per turn keeps concurrent sessions from sharing state.
+        Conversation turns are scheduled ahead of background generation work.
+        """
+        return GeminiStreamingClient(
+            session_id=session_id,
+            priority=RequestPriority.INTERACTIVE
+        )
     
     def _build_system_prompt(self, session_state: SessionState) -> str:
-        """Build context-aware system prompt."""
-        current_state = session_state.current_state
-        requirements = session_state.requirements.model_dump()
-        capabilities = session_state.capabilities.model_dump() if session_state.capabilities else {}
-        
-        # Get state-specific instructions
-        state_instructions = self.state_machine.get_state_instructions(current_state)
-        
-        # Get progress information
-        progress_info = self.state_machine.get_state_progress(session_state)
-        
-        system_prompt = f"""You are an AI agent that helps users bootstrap development projects.
-
-CURRENT SESSION INFO:
-- Session ID: {session_state.session_id}
-- Current State: {current_state.value}
-- Iteration: {session_state.iteration_count}
-- Progress: {progress_info['progress_percentage']}%
-- Completion: {session_state.completion_percentage}%
-
-COLLECTED REQUIREMENTS:
-{json.dumps(requirements, indent=2)}
-
-SYSTEM CAPABILITIES:
-{json.dumps(capabilities, indent=2)}
-
-CURRENT STATE INSTRUCTIONS:
-{state_instructions}
-
-AVAILABLE FUNCTIONS:
-{json.dumps([func["name"] for func in self.function_registry.get_function_schemas()], indent=2)}
-
-CONVERSATION GUIDELINES:
-1. Be conversational and helpful
-2. Use function calls to update state and collect information
-3. Stream responses naturally, thinking step by step
-4. Adapt based on user responses and system capabilities
-5. Always validate information before proceeding
-6. Handle errors gracefully with alternatives
-7. Keep the user informed of progress
-
-IMPORTANT RULES:
-- If you are explicitly in a waiting stage, write back to the user in some time / frame it as a question so the user know what next
-- Use function calls when you need to update state or ask structured questions
-- Don't ask Language and Framework related questions.
-- Take decision on what Language and Framework to use based on detected system capabilities
-- Framework questions should be asked if user have multiple tools, which can be used for the same Project Requirement, Else suggest the best from detected system capabilities
-- Always confirm critical decisions before execution
-- Provide examples when the user seems confused
-- If something fails, suggest alternatives
-
-
-REQUIRED WORKFLOW:
-1. First, request permissions if needed (request_permission function)
-2. Ask User to first give permission to read capabilites and then move forward, end the session if not permission
-2. Then detect system capabilities (detect_system_capabilities function)
-3. Collect all project requirements (update_project_requirements function) 
-4. Create the project directly by calling create_project_with_steps function with detailed steps
-
-CRITICAL: When user confirms project creation, you MUST immediately call create_project_with_steps function with detailed steps.
-DO NOT just say "creating project" - ACTUALLY CALL THE FUNCTION!
-
-This function allows you to:
-- Provide shell commands to execute (mkdir, npm init, etc.)
-- Create files with content using command="CREATE_FILE", file_path="path/to/file", file_content="content"
-- Everything executes immediately - no separate execution step needed!
-
-ALWAYS call this function immediately after user confirms. Do not hesitate or ask again.
-
-IMPORTANT: First basic setup needs to be done, then For creating files, use generate_file_content function first to create appropriate content, should be executed for each file created during our create_project_with_steps!
-
-Example workflow for React Native project:
-1. generate_file_content(file_path="App.tsx", project_type="mobile_app", project_name="MyApp", framework="React Native")
-2. create_project_with_steps([
-  {{"command": "mkdir -p MyApp", "description": "Create project directory"}},
-  {{"command": "npx @react-native-community/cli init MyApp --template react-native-template-typescript", "description": "Create React Native project with modern CLI"}},
-  {{"command": "CREATE_FILE", "file_path": "App.tsx", "file_content": "[CONTENT FROM generate_file_content]", "description": "Create main App component with proper React Native code"}},
-  {{"command": "CREATE_FILE", "file_path": "README.md", "file_content": "[GENERATED README]", "description": "Create project documentation"}}
-])
-
-This ensures files have meaningful, working content instead of being empty!
-
-Remember: This is iteration {session_state.iteration_count}. Build upon the conversation history."""
-        
-        return system_prompt
+        """Build context-aware system prompt from cached segments."""
+        return self.prompt_builder.build(session_state)
     
     def _get_status_message(self, status: str, function_name: str) -> str:
         """Get user-friendly status message for function results."""
@@ -274,21 +202,9 @@ Remember: This is iteration {session_state.iteration_count}. Build upon the conv
             "content": system_prompt
         })
         
-        # Add conversation history (last 20 messages to stay within limits)
-        recent_history = session_state.conversation_history[-20:] if session_state.conversation_history else []
-        
-        for msg in recent_history:
-            role = msg.get("role", "user")
-            content = msg.get("content", "")
-            
-            # Skip empty messages
-            if not content.strip():
-                continue
-            
-            messages.append({
-                "role": role,
-                "content": content
-            })
+        # Add recent history within the token budget, older messages as a
+        # rolling summary
+        messages.extend(self.conversation_memory.build_messages(session_state))
         
         return messages
     
@@ -306,6 +222,7 @@ Remember: This is iteration {session_state.iteration_count}. Build upon the conv
             session_state: Current session state
             websocket: WebSocket for real-time updates
         """
+        self.fast_path.begin_turn(session_state.session_id)
         try:
             # Add user message to history first
             session_state.add_message("user", user_input)
@@ -314,6 +231,10 @@ Remember: This is iteration {session_state.iteration_count}. Build upon the conv
             if session_state.pending_question:
                 response_valid = await self._handle_user_response(user_input, session_state, websocket)
                 
+                # The question was already asked again from a template
+                if not response_valid and self.fast_path.skip_reask(user_input, session_state):
+                    return
+                
                 # Only clear waiting state if response was valid
                 if response_valid and session_state.waiting_for_user:
                     session_state.waiting_for_user = False
@@ -329,9 +250,14 @@ Remember: This is iteration {session_state.iteration_count}. Build upon the conv
                             }
                         })
                     
-                    await self._process_with_gemini(session_state, websocket)
+                    await self._continue_workflow(session_state, websocket)
                     return
             
+            # A plain "yes" to the project summary needs no interpretation
+            elif await self.fast_path.confirm(user_input, session_state, websocket):
+                await self._continue_workflow(session_state, websocket)
+                return
+            
             # Process with Gemini
             await self._process_with_gemini(session_state, websocket)
             
@@ -344,6 +270,34 @@ Remember: This is iteration {session_state.iteration_count}. Build upon the conv
                     "type": "error",
                     "data": {"message": f"An error occurred: {e}"}
                 })
+        finally:
+            await self._report_turn_metrics(session_state, websocket)
+    
+    async def _continue_workflow(self, session_state: SessionState, websocket=None):
+        """Advance locally as far as the rules allow, then call Gemini if still needed."""
+        if await self.fast_path.advance(session_state, websocket):
+            await self._process_with_gemini(session_state, websocket)
+    
+    async def _report_turn_metrics(self, session_state: SessionState, websocket=None):
+        """Log and stream how many Gemini calls a turn made and avoided."""
+        metrics = self.fast_path.end_turn(session_state.session_id)
+        logger.info(
+            f"📊 Turn of session {session_state.session_id}: {metrics['llm_calls']} Gemini calls, "
+            f"{metrics['llm_calls_avoided']} avoided {metrics['rules']}"
+        )
+        
+        if websocket:
+            try:
+                await websocket.send_json({
+                    "type": "turn_metrics",
+                    "data": {
+                        **metrics,
+                        "state": session_state.current_state.value,
+                        "timestamp": datetime.now().isoformat()
+                    }
+                })
+            except Exception as e:
+                logger.debug(f"Could not send turn metrics: {e}")
     
     async def _handle_user_response(
         self,
@@ -474,26 +428,7 @@ Remember: This is iteration {session_state.iteration_count}. Build upon the conv
                         
                         if websocket and result.get("status") == "capabilities_detected":
                             caps = result.get("capabilities", {})
-                            
-                            # Create detailed capability summary for UI
-                            capability_lines = []
-                            if caps.get("os"):
-                                capability_lines.append(f"🖥️  OS: {caps['os']}")
-                            if caps.get("python_version"):
-                                capability_lines.append(f"🐍 Python: {caps['python_version']}")
-                            if caps.get("node_version"):
-                                capability_lines.append(f"🟢 Node.js: {caps['node_version']}")
-                            if caps.get("npm_version"):
-                                capability_lines.append(f"📦 npm: {caps['npm_version']}")
-                            if caps.get("docker_installed"):
-                                capability_lines.append("🐳 Docker: Available")
-                            if caps.get("git_installed"):
-                                capability_lines.append("🗂️  Git: Available")
-                            if caps.get("available_package_managers"):
-                                managers = ", ".join(caps["available_package_managers"])
-                                capability_lines.append(f"📋 Package Managers: {managers}")
-                            
-                            summary_message = "🔍 System capabilities detected automatically:\n" + "\n".join(capability_lines)
+                            summary_message = render_capabilities(caps)
                             
                             await websocket.send_json({
                                 "type": "capabilities_auto_detected",
@@ -540,7 +475,7 @@ Remember: This is iteration {session_state.iteration_count}. Build upon the conv
     ):
         """Process conversation with Gemini AI."""
         try:
-            client = await self._get_gemini_client()
+            client = await self._get_gemini_client(session_state.session_id)
         except ValueError as e:
             # API key not configured
             error_msg = "Gemini API key not configured. Please set GEMINI_API_KEY in backend/.env file"
@@ -559,21 +494,28 @@ Remember: This is iteration {session_state.iteration_count}. Build upon the conv
         # Format messages for Gemini
         messages = self._format_conversation_history(session_state)
         
-        # Get function schemas
-        function_schemas = self.function_registry.get_function_schemas()
+        # Offer only the functions callable in the current state
+        function_schemas = self.function_registry.get_function_schemas_for_state(session_state)
         
         # Stream completion from Gemini
         accumulated_response = ""
+        self.fast_path.record_llm_call(session_state.session_id)
+        
+        stream = client.stream_completion(
+            messages=messages,
+            functions=function_schemas,
+            temperature=0.7
+        )
+        
+        # A parser per stream keeps chunk seq/offset from mixing across
+        # concurrent sessions or leaking from a turn that stopped early
+        chunk_parser = GeminiChunkParser()
         
         async with client:
             try:
-                async for chunk in client.stream_completion(
-                    messages=messages,
-                    functions=function_schemas,
-                    temperature=0.7
-                ):
+                async for chunk in stream:
                     # Process chunk
-                    result = await self.chunk_parser.process_chunk(
+                    result = await chunk_parser.process_chunk(
                         chunk,
                         session_state.__dict__,
                         websocket
@@ -827,10 +769,7 @@ Remember: This is iteration {session_state.iteration_count}. Build upon the conv
                             "result": func_result
                         }
                         session_state.function_results.append(function_result)
-                        
-                        # Keep only last 10 function results to prevent memory bloat
-                        if len(session_state.function_results) > 10:
-                            session_state.function_results.pop(0)
+                        # Older results are archived by the session retention policy
                         
                     # Handle completion
                     elif result["finished"]:
@@ -902,7 +841,7 @@ Remember: This is iteration {session_state.iteration_count}. Build upon the conv
                         
                         if should_transition and state_changed:
                             await self.session_manager.save_state(session_state.session_id, session_state)
-                            await self._process_with_gemini(session_state, websocket)
+                            await self._continue_workflow(session_state, websocket)
                         
                         break
                 
@@ -918,6 +857,10 @@ Remember: This is iteration {session_state.iteration_count}. Build upon the conv
                         "type": "ai_message",
                         "data": {"message": error_response}
                     })
+            finally:
+                # Close the stream eagerly so its scheduler slot and HTTP
+                # connection are released even when we break out early
+                await stream.aclose()
     
     async def start_new_conversation(
         self,
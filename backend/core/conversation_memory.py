@@ -0,0 +1,174 @@
+"""Token-budgeted conversation context with a rolling summary."""
+import re
+import unicodedata
+from typing import Any, Dict, List
+import logging
+
+from backend.config import settings
+from backend.models.schemas import SessionState
+from backend.gemini.scheduler import GeminiRequestScheduler
+
+logger = logging.getLogger(__name__)
+
+# Characters kept per summarized message, by role
+SUMMARY_LINE_CHARS = {"user": 300, "assistant": 160, "system": 160}
+
+SUMMARY_HEADER = "EARLIER CONVERSATION (summary of messages no longer shown in full):"
+
+_WHITESPACE = re.compile(r"\s+")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+def _estimate_tokens(text: str) -> int:
+    """Rough token count, using the same estimate as request scheduling."""
+    return GeminiRequestScheduler.estimate_tokens(len(text))
+
+
+def _compact(text: str) -> str:
+    """Strip emoji/symbols and markdown decoration, collapse whitespace."""
+    text = "".join(
+        char for char in text
+        if unicodedata.category(char) != "So" and char != "\ufe0f"
+    )
+    text = text.replace("**", "").replace("`", "")
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def _shorten(text: str, max_chars: int) -> str:
+    """Cut text to at most max_chars, preferring a sentence boundary."""
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    sentences = _SENTENCE_END.split(cut)
+    if len(sentences) > 1:
+        return " ".join(sentences[:-1])
+    return cut.rsplit(" ", 1)[0] + "..."
+
+
+class ConversationMemory:
+    """
+    Assemble the conversation part of a prompt within a token budget.
+    
+    The newest messages are sent verbatim for as long as they fit in the
+    history budget, always including the latest user turn. Messages that fall out of that window are folded once,
+    in order, into ``SessionState.conversation_summary`` as short lines, so
+    each turn only summarizes the delta. When the summary outgrows its own
+    budget the oldest assistant lines are dropped first, keeping what the
+    user asked for in context the longest.
+    """
+    
+    def __init__(self):
+        """Initialize conversation memory."""
+        self.history_token_budget = settings.CONVERSATION_HISTORY_TOKEN_BUDGET
+        self.summary_token_budget = settings.CONVERSATION_SUMMARY_TOKEN_BUDGET
+        self.max_recent_messages = settings.CONVERSATION_MAX_RECENT_MESSAGES
+    
+    def _window_start(self, history: List[Dict[str, Any]], first: int) -> int:
+        """Index of the oldest message sent verbatim."""
+        start = len(history)
+        used = 0
+        
+        # Always keep the latest user turn (or the newest message), however long
+        required = next(
+            (index for index in range(len(history) - 1, first - 1, -1) if history[index].get("role") == "user"),
+            len(history) - 1
+        )
+        
+        for index in range(len(history) - 1, first - 1, -1):
+            content = history[index].get("content")
+            cost = _estimate_tokens(content) if isinstance(content, str) else 0
+            
+            if index < required and (
+                len(history) - index > self.max_recent_messages
+                or used + cost > self.history_token_budget
+            ):
+                break
+            
+            used += cost
+            start = index
+        
+        return start
+    
+    def _summarize(self, message: Dict[str, Any]) -> str:
+        """One summary line for a message, or an empty string."""
+        content = message.get("content")
+        if not isinstance(content, str):
+            return ""
+        
+        text = _compact(content)
+        if not text:
+            return ""
+        
+        role = message.get("role", "user")
+        text = _shorten(text, SUMMARY_LINE_CHARS.get(role, SUMMARY_LINE_CHARS["system"]))
+        return f"{role.capitalize()}: {text}"
+    
+    def _trim_summary(self, summary: List[str]):
+        """Drop lines until the summary fits its budget."""
+        tokens = sum(_estimate_tokens(line) for line in summary)
+        while summary and tokens > self.summary_token_budget:
+            drop = next(
+                (index for index, line in enumerate(summary) if not line.startswith("User:")),
+                0
+            )
+            tokens -= _estimate_tokens(summary.pop(drop))
+    
+    def fold(self, session_state: SessionState, upto: int):
+        """
+        Fold messages before ``upto`` into the session's summary.
+        
+        Args:
+            session_state: Session state, updated in place
+            upto: Index of the first message to keep unsummarized
+        """
+        history = session_state.conversation_history
+        first = min(session_state.summarized_message_count, len(history))
+        if upto <= first:
+            return
+        
+        lines = [self._summarize(message) for message in history[first:upto]]
+        session_state.conversation_summary.extend(line for line in lines if line)
+        self._trim_summary(session_state.conversation_summary)
+        session_state.summarized_message_count = upto
+        
+        logger.debug(f"Summarized {upto - first} messages of session {session_state.session_id}")
+    
+    def build_messages(self, session_state: SessionState) -> List[Dict[str, str]]:
+        """
+        Build the conversation messages for a Gemini request.
+        
+        Args:
+            session_state: Session state; its summary is brought up to date
+        
+        Returns:
+            Summary message (if any) followed by the recent messages
+        """
+        history = session_state.conversation_history
+        first = min(session_state.summarized_message_count, len(history))
+        start = self._window_start(history, first)
+        self.fold(session_state, start)
+        
+        messages = []
+        if session_state.conversation_summary:
+            messages.append({
+                "role": "system",
+                "content": "\n".join([SUMMARY_HEADER, *session_state.conversation_summary])
+            })
+        
+        for msg in history[start:]:
+            content = msg.get("content", "")
+            
+            # Skip empty messages
+            if not isinstance(content, str) or not content.strip():
+                continue
+            
+            messages.append({
+                "role": msg.get("role", "user"),
+                "content": content
+            })
+        
+        return messages
+
+
+# Global conversation memory instance
+conversation_memory = ConversationMemory()
@@ -0,0 +1,324 @@
+"""Append-only session event log with compacted snapshots."""
+import copy
+import os
+from typing import Any, Dict, List, Optional, Tuple
+import aiofiles
+import logging
+
+from backend.models.schemas import SessionState
+from backend.models.serialization import DecodeError, dump_document, dumps, load_document, loads
+
+logger = logging.getLogger(__name__)
+
+# Growing SessionState lists that are persisted as append events
+LOGGED_FIELDS = ("conversation_history", "function_results", "state_history")
+
+# Snapshot key recording the last event folded into it
+SNAPSHOT_SEQ_KEY = "_event_seq"
+
+# Block size for reading the log backwards
+TAIL_READ_BLOCK = 64 * 1024
+
+
+class _LogPosition:
+    """What has been persisted for one session."""
+    
+    __slots__ = ("lists", "seq", "events_since_snapshot")
+    
+    def __init__(self, lists: Dict[str, List[Any]], seq: int, events_since_snapshot: int):
+        # Private copies of the logged lists, to spot in-place edits
+        self.lists = lists
+        self.seq = seq
+        self.events_since_snapshot = events_since_snapshot
+
+
+class SessionEventLog:
+    """
+    Persist sessions as a snapshot plus a JSONL log of changes.
+    
+    Each save appends the new conversation messages, function results and
+    state transitions plus the (small) remaining state fields, so write
+    cost no longer grows with session length. Every ``snapshot_interval``
+    events, or when a logged list was changed in a way other than
+    appending or trimming from the front, the full state is written as a
+    new snapshot and the log is truncated.
+    """
+    
+    def __init__(self, session_dir: str, snapshot_interval: int):
+        """
+        Initialize event log.
+        
+        Args:
+            session_dir: Directory holding snapshots and logs
+            snapshot_interval: Events between compacted snapshots
+        """
+        self.session_dir = session_dir
+        self.snapshot_interval = snapshot_interval
+        self._positions: Dict[str, _LogPosition] = {}
+    
+    def _get_snapshot_file(self, session_id: str) -> str:
+        """Get snapshot file path."""
+        return os.path.join(self.session_dir, f"{session_id}.json")
+    
+    def _get_log_file(self, session_id: str) -> str:
+        """Get event log file path."""
+        return os.path.join(self.session_dir, f"{session_id}.events.jsonl")
+    
+    def forget(self, session_id: str):
+        """Drop what we know about a session's persisted position."""
+        self._positions.pop(session_id, None)
+    
+    def delete(self, session_id: str):
+        """Remove a session's event log."""
+        self.forget(session_id)
+        log_file = self._get_log_file(session_id)
+        if os.path.exists(log_file):
+            os.remove(log_file)
+    
+    @staticmethod
+    def _copy_lists(data: Dict[str, Any]) -> Dict[str, List[Any]]:
+        """Deep copy the logged lists, detached from the live session."""
+        return {field: copy.deepcopy(data.get(field) or []) for field in LOGGED_FIELDS}
+    
+    def _diff_list(
+        self,
+        position: _LogPosition,
+        field: str,
+        items: List[Any]
+    ) -> Optional[Tuple[List[Dict[str, Any]], List[Any]]]:
+        """
+        Describe how a logged list changed since it was persisted.
+        
+        Returns:
+            Events turning the persisted list into ``items`` and a copy of
+            the list once they are written, or None if the change can't be
+            expressed as a front trim plus appends
+        """
+        persisted = position.lists[field]
+        
+        if not persisted:
+            events = [{"type": "append", "field": field, "item": item} for item in items]
+            return events, copy.deepcopy(items)
+        
+        # Find the last persisted item; anything after it is new and
+        # anything missing before it was trimmed from the front. Every item
+        # kept must still equal its copy, or an in-place edit would be lost
+        count = len(persisted)
+        for kept in range(min(len(items), count), 0, -1):
+            trimmed = count - kept
+            if items[kept - 1] != persisted[-1] or items[:kept] != persisted[trimmed:]:
+                continue
+            
+            events = []
+            if trimmed:
+                events.append({"type": "trim", "field": field, "count": trimmed})
+            events.extend(
+                {"type": "append", "field": field, "item": item}
+                for item in items[kept:]
+            )
+            return events, persisted[trimmed:] + copy.deepcopy(items[kept:])
+        
+        return None
+    
+    async def write(self, session_id: str, session_state: SessionState):
+        """
+        Persist a session, appending to its log when possible.
+        
+        Args:
+            session_id: Session identifier
+            session_state: Session state to persist
+        """
+        position = self._positions.get(session_id)
+        
+        events = []
+        # Captured before awaiting, the lists may keep growing
+        persisted_lists = {}
+        if position is not None:
+            for field in LOGGED_FIELDS:
+                diff = self._diff_list(position, field, getattr(session_state, field))
+                if diff is None:
+                    events = None
+                    break
+                events.extend(diff[0])
+                persisted_lists[field] = diff[1]
+        
+        if events is None or position is None or position.events_since_snapshot + len(events) >= self.snapshot_interval:
+            await self.write_snapshot(session_id, session_state)
+            return
+        
+        events.append({
+            "type": "state",
+            "fields": session_state.model_dump(mode="json", exclude=set(LOGGED_FIELDS))
+        })
+        
+        seq = position.seq
+        lines = []
+        for event in events:
+            seq += 1
+            event["seq"] = seq
+            lines.append(dumps(event))
+        
+        new_position = _LogPosition(persisted_lists, seq, position.events_since_snapshot + len(events))
+        
+        async with aiofiles.open(self._get_log_file(session_id), 'ab') as f:
+            await f.write(b"\n".join(lines) + b"\n")
+        
+        self._positions[session_id] = new_position
+    
+    async def write_snapshot(self, session_id: str, session_state: SessionState):
+        """
+        Write the full state and truncate the log.
+        
+        Args:
+            session_id: Session identifier
+            session_state: Session state to persist
+        """
+        snapshot_file = self._get_snapshot_file(session_id)
+        temp_file = f"{snapshot_file}.tmp"
+        position = self._positions.get(session_id)
+        seq = position.seq if position else await self._last_seq(session_id)
+        
+        data = session_state.model_dump(mode="json")
+        data[SNAPSHOT_SEQ_KEY] = seq
+        # Copied from the live lists, which later writes compare against
+        lists = self._copy_lists({field: getattr(session_state, field) for field in LOGGED_FIELDS})
+        
+        try:
+            # Write to temporary file first
+            async with aiofiles.open(temp_file, 'wb') as f:
+                await f.write(dump_document(data))
+            
+            # Atomic move
+            os.rename(temp_file, snapshot_file)
+        except Exception:
+            # Clean up temp file if it exists
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+            raise
+        
+        # Events up to seq are now in the snapshot (and skipped on replay if
+        # truncation is interrupted)
+        async with aiofiles.open(self._get_log_file(session_id), 'wb'):
+            pass
+        
+        self._positions[session_id] = _LogPosition(lists, seq, 0)
+    
+    async def _last_seq(self, session_id: str) -> int:
+        """Find the highest sequence number in an untracked session's log."""
+        async for event in self._iter_tail(session_id):
+            return event.get("seq", 0)
+        return 0
+    
+    async def read(self, session_id: str, track: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        Rebuild a session from its snapshot plus log.
+        
+        Args:
+            session_id: Session identifier
+            track: Remember the log position for subsequent writes (only
+                safe while holding the session lock)
+        
+        Returns:
+            Session data, or None if the session doesn't exist
+        
+        Raises:
+            DecodeError: If the snapshot is corrupted
+        """
+        snapshot_file = self._get_snapshot_file(session_id)
+        if not os.path.exists(snapshot_file):
+            return None
+        
+        async with aiofiles.open(snapshot_file, 'rb') as f:
+            data = load_document(await f.read())
+        
+        snapshot_seq = data.pop(SNAPSHOT_SEQ_KEY, 0)
+        seq = snapshot_seq
+        applied = 0
+        
+        log_file = self._get_log_file(session_id)
+        if os.path.exists(log_file):
+            async with aiofiles.open(log_file, 'rb') as f:
+                async for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        event = loads(line)
+                    except DecodeError:
+                        # Torn write at the end of the log
+                        logger.warning(f"Ignoring incomplete event in log for session {session_id}")
+                        break
+                    
+                    if event["seq"] <= snapshot_seq:
+                        continue
+                    
+                    self._apply(data, event)
+                    seq = event["seq"]
+                    applied += 1
+        
+        if track:
+            self._positions[session_id] = _LogPosition(self._copy_lists(data), seq, applied)
+        return data
+    
+    @staticmethod
+    def _apply(data: Dict[str, Any], event: Dict[str, Any]):
+        """Apply one event to session data."""
+        event_type = event["type"]
+        if event_type == "append":
+            data.setdefault(event["field"], []).append(event["item"])
+        elif event_type == "trim":
+            del data.setdefault(event["field"], [])[:event["count"]]
+        elif event_type == "state":
+            data.update(event["fields"])
+    
+    async def _iter_tail(self, session_id: str):
+        """Yield log events newest first, reading the file backwards."""
+        log_file = self._get_log_file(session_id)
+        if not os.path.exists(log_file):
+            return
+        
+        async with aiofiles.open(log_file, 'rb') as f:
+            position = await f.seek(0, os.SEEK_END)
+            remainder = b""
+            
+            while position > 0:
+                read_size = min(TAIL_READ_BLOCK, position)
+                position -= read_size
+                await f.seek(position)
+                block = await f.read(read_size) + remainder
+                
+                lines = block.split(b"\n")
+                # The first line may be cut off - keep it for the next block
+                remainder = lines.pop(0) if position > 0 else b""
+                
+                for line in reversed(lines):
+                    if line.strip():
+                        try:
+                            yield loads(line)
+                        except DecodeError:
+                            continue
+    
+    async def read_tail(self, session_id: str, field: str, limit: int) -> Optional[List[Any]]:
+        """
+        Read the last ``limit`` items of a logged list from the log alone.
+        
+        Args:
+            session_id: Session identifier
+            field: One of LOGGED_FIELDS
+            limit: Number of items wanted
+        
+        Returns:
+            Items oldest first, or None if the log doesn't hold enough of
+            them (the caller should load the full session instead)
+        """
+        items = []
+        async for event in self._iter_tail(session_id):
+            if event.get("field") != field:
+                continue
+            if event["type"] != "append":
+                return None
+            items.append(event["item"])
+            if len(items) >= limit:
+                items.reverse()
+                return items
+        
+        return None
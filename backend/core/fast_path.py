@@ -0,0 +1,343 @@
+"""Rule-driven fast path for workflow steps that don't need Gemini."""
+from typing import Any, Dict, Optional
+from datetime import datetime
+import logging
+
+from backend.config import settings
+from backend.models.schemas import SessionState, ConversationState
+from backend.gemini.function_registry import FunctionRegistry, function_registry
+from backend.core.state_machine import (
+    ConversationStateMachine,
+    StateTransition,
+    STATE_PROGRESS,
+    conversation_state_machine
+)
+
+logger = logging.getLogger(__name__)
+
+# Replies accepted as a plain "yes" to a confirmation
+AFFIRMATIVE_REPLIES = {
+    "yes", "y", "ok", "okay", "sure", "confirm", "confirmed", "proceed",
+    "go ahead", "looks good", "lgtm", "correct", "yes please"
+}
+
+# Longest reply still treated as a mistyped option rather than free text
+ATTEMPTED_CHOICE_MAX_LENGTH = 30
+
+
+def render_capabilities(capabilities: Dict[str, Any]) -> str:
+    """Templated summary of detected system capabilities."""
+    capability_lines = []
+    if capabilities.get("os"):
+        capability_lines.append(f"🖥️  OS: {capabilities['os']}")
+    if capabilities.get("python_version"):
+        capability_lines.append(f"🐍 Python: {capabilities['python_version']}")
+    if capabilities.get("node_version"):
+        capability_lines.append(f"🟢 Node.js: {capabilities['node_version']}")
+    if capabilities.get("npm_version"):
+        capability_lines.append(f"📦 npm: {capabilities['npm_version']}")
+    if capabilities.get("docker_installed"):
+        capability_lines.append("🐳 Docker: Available")
+    if capabilities.get("git_installed"):
+        capability_lines.append("🗂️  Git: Available")
+    if capabilities.get("available_package_managers"):
+        managers = ", ".join(capabilities["available_package_managers"])
+        capability_lines.append(f"📋 Package Managers: {managers}")
+    
+    return "🔍 System capabilities detected automatically:\n" + "\n".join(capability_lines)
+
+
+def render_validation(result: Dict[str, Any]) -> str:
+    """Templated summary of a requirements validation."""
+    lines = ["✅ Requirements checked against your system."]
+    lines.extend(f"🔧 {correction}" for correction in result.get("corrections_made", []))
+    return "\n".join(lines)
+
+
+def _is_affirmative(user_input: str) -> bool:
+    """Whether a reply is an unambiguous "yes"."""
+    return user_input.lower().strip().rstrip(".!") in AFFIRMATIVE_REPLIES
+
+
+def _is_attempted_choice(user_input: str) -> bool:
+    """Whether a reply looks like a (mistyped) option rather than a question or remark."""
+    reply = user_input.strip()
+    return (
+        0 < len(reply) <= ATTEMPTED_CHOICE_MAX_LENGTH
+        and "?" not in reply
+        and len(reply.split()) == 1
+    )
+
+
+class DeterministicFastPath:
+    """
+    Handle workflow steps whose outcome is fully decided by session state.
+    
+    Most turns between the interview questions only acknowledge an answer
+    and move the state machine along, so they need no language
+    understanding. The fast path covers three such cases locally:
+    
+    - a mistyped choice, whose templated re-ask is already in the history
+    - a plain "yes" to the project summary
+    - forward transitions whose guard already holds, plus the deterministic
+      work of a state (capability detection, validation against them)
+    
+    Gemini is called only once a step needs to be phrased or understood.
+    Each handled step replaces the round-trip that would otherwise have
+    produced it, and is counted per turn and in total.
+    """
+    
+    def __init__(
+        self,
+        registry: FunctionRegistry,
+        state_machine: ConversationStateMachine
+    ):
+        """
+        Initialize fast path.
+        
+        Args:
+            registry: Function registry running local state actions
+            state_machine: State machine whose guards decide transitions
+        """
+        self.registry = registry
+        self.state_machine = state_machine
+        self.enabled = settings.FAST_PATH_ENABLED
+        self.max_steps = settings.FAST_PATH_MAX_STEPS
+        
+        # Function run locally in a state, while its result is missing
+        self.state_actions = {
+            ConversationState.CHECK_SYSTEM_CAPABILITIES: (
+                "detect_system_capabilities",
+                lambda state: not (state.capabilities and state.capabilities.detection_completed)
+            ),
+            ConversationState.VALIDATE_INFO: (
+                "validate_requirements_against_capabilities",
+                lambda state: state.capabilities is not None and not state.validation_completed
+            )
+        }
+        
+        # Metrics of turns in progress, by session
+        self._turns: Dict[str, Dict[str, Any]] = {}
+        
+        # Totals
+        self.turns = 0
+        self.llm_calls = 0
+        self.llm_calls_avoided = 0
+        self.avoided_by_rule: Dict[str, int] = {}
+    
+    def begin_turn(self, session_id: str):
+        """Start collecting metrics for a user turn."""
+        self._turns[session_id] = {"llm_calls": 0, "llm_calls_avoided": 0, "rules": []}
+    
+    def end_turn(self, session_id: str) -> Dict[str, Any]:
+        """
+        Finish a user turn.
+        
+        Returns:
+            Model calls made and avoided during the turn, and the rules applied
+        """
+        self.turns += 1
+        return self._turns.pop(session_id, {"llm_calls": 0, "llm_calls_avoided": 0, "rules": []})
+    
+    def record_llm_call(self, session_id: Optional[str]):
+        """Count a Gemini round-trip."""
+        self.llm_calls += 1
+        turn = self._turns.get(session_id)
+        if turn is not None:
+            turn["llm_calls"] += 1
+    
+    def _record_avoided(self, session_id: str, rule: str):
+        """Count a round-trip replaced by a local step."""
+        self.llm_calls_avoided += 1
+        self.avoided_by_rule[rule] = self.avoided_by_rule.get(rule, 0) + 1
+        turn = self._turns.get(session_id)
+        if turn is not None:
+            turn["llm_calls_avoided"] += 1
+            turn["rules"].append(rule)
+        logger.debug(f"⚡ Fast path '{rule}' handled a step of session {session_id}")
+    
+    def skip_reask(self, user_input: str, session_state: SessionState) -> bool:
+        """
+        Whether an invalid answer can be left at its templated re-ask.
+        
+        Only replies that look like an attempted choice qualify; questions
+        and free text still go to Gemini.
+        
+        Args:
+            user_input: User's reply
+            session_state: Session whose pending question was answered
+        
+        Returns:
+            True if Gemini should not be called for the turn
+        """
+        if not self.enabled or not session_state.pending_question:
+            return False
+        if not _is_attempted_choice(user_input):
+            return False
+        
+        self._record_avoided(session_state.session_id, "question_reasked")
+        return True
+    
+    async def confirm(self, user_input: str, session_state: SessionState, websocket=None) -> bool:
+        """
+        Accept a plain "yes" to the project summary without Gemini.
+        
+        Args:
+            user_input: User's reply
+            session_state: Current session state
+            websocket: WebSocket for real-time updates
+        
+        Returns:
+            True if the reply confirmed the project
+        """
+        if not self.enabled or session_state.current_state != ConversationState.SUMMARY_CONFIRMATION:
+            return False
+        if session_state.pending_question or not _is_affirmative(user_input):
+            return False
+        
+        if not self.state_machine.transition_to(session_state, ConversationState.PLANNING):
+            return False
+        
+        message = "✓ Great, the project is confirmed. Preparing the execution plan..."
+        session_state.add_message("assistant", message)
+        
+        if websocket:
+            await websocket.send_json({
+                "type": "project_confirmed",
+                "data": {
+                    "message": message,
+                    "state": ConversationState.PLANNING.value,
+                    "timestamp": datetime.now().isoformat()
+                }
+            })
+        
+        self._record_avoided(session_state.session_id, "summary_confirmed")
+        return True
+    
+    def _forward_transition(self, session_state: SessionState) -> Optional[StateTransition]:
+        """
+        The transition auto_transition would take, if it's safe to take locally.
+        
+        Only guarded transitions that move the workflow forward qualify.
+        Unguarded ones stand for a decision (user confirmation, abort) and
+        loops back to earlier states need the model to explain them.
+        """
+        valid_transitions = self.state_machine.get_valid_transitions(session_state)
+        if not valid_transitions:
+            return None
+        
+        transition = valid_transitions[0]
+        if transition.condition is None:
+            return None
+        if transition.to_state not in STATE_PROGRESS:
+            return None
+        if STATE_PROGRESS[transition.to_state] <= STATE_PROGRESS.get(transition.from_state, 0):
+            return None
+        return transition
+    
+    async def _run_state_action(self, session_state: SessionState, websocket=None) -> bool:
+        """Run the deterministic function of the current state, if still needed."""
+        action = self.state_actions.get(session_state.current_state)
+        if not action:
+            return False
+        
+        function_name, needed = action
+        if not needed(session_state):
+            return False
+        
+        func_result = await self.registry.execute(
+            {"name": function_name, "arguments": {}},
+            session_state,
+            websocket
+        )
+        status = func_result.get("status")
+        session_state.function_results.append({
+            "name": function_name,
+            "status": status,
+            "timestamp": datetime.now().isoformat(),
+            "result": func_result
+        })
+        
+        if status == "capabilities_detected":
+            session_state.capabilities_detected = True
+            message = render_capabilities(func_result.get("capabilities", {}))
+        elif status == "validation_complete":
+            message = render_validation(func_result)
+        else:
+            # Leave failures to the model, which can explain and recover
+            logger.warning(f"⚠️ Fast path {function_name} returned {status}, deferring to Gemini")
+            return False
+        
+        session_state.add_message("assistant", message)
+        if websocket:
+            await websocket.send_json({
+                "type": "ai_message",
+                "data": {
+                    "message": message,
+                    "state": session_state.current_state.value
+                }
+            })
+        return True
+    
+    async def advance(self, session_state: SessionState, websocket=None) -> bool:
+        """
+        Advance the workflow locally as far as the rules allow.
+        
+        Args:
+            session_state: Current session state
+            websocket: WebSocket for real-time updates
+        
+        Returns:
+            True if Gemini is needed to continue
+        """
+        if not self.enabled:
+            return True
+        
+        for _ in range(self.max_steps):
+            if session_state.waiting_for_user or session_state.pending_question:
+                return False
+            
+            transition = self._forward_transition(session_state)
+            if transition:
+                old_state = session_state.current_state.value
+                transition.execute(session_state)
+                new_state = session_state.current_state.value
+                
+                if websocket:
+                    await websocket.send_json({
+                        "type": "state_transitioned",
+                        "data": {
+                            "from_state": old_state,
+                            "to_state": new_state,
+                            "message": f"✅ Moved from {old_state} to {new_state}",
+                            "timestamp": datetime.now().isoformat()
+                        }
+                    })
+                
+                self._record_avoided(session_state.session_id, "state_advanced")
+                continue
+            
+            if await self._run_state_action(session_state, websocket):
+                self._record_avoided(session_state.session_id, "state_action")
+                continue
+            
+            return True
+        
+        logger.warning(f"⚠️ Fast path step limit reached in {session_state.current_state.value}")
+        return True
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get model calls made and avoided since startup."""
+        total = self.llm_calls + self.llm_calls_avoided
+        return {
+            "enabled": self.enabled,
+            "turns": self.turns,
+            "llm_calls": self.llm_calls,
+            "llm_calls_avoided": self.llm_calls_avoided,
+            "avoided_rate": self.llm_calls_avoided / total if total else 0.0,
+            "avoided_by_rule": dict(self.avoided_by_rule)
+        }
+
+
+# Global fast path instance
+fast_path = DeterministicFastPath(function_registry, conversation_state_machine)
@@ -0,0 +1,191 @@
+"""Segmented, memoized system prompt builder."""
+import json
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+from backend.config import settings
+from backend.models.schemas import ConversationState, SessionState
+from backend.gemini.function_registry import FunctionRegistry, function_registry
+from backend.core.state_machine import ConversationStateMachine, conversation_state_machine
+
+logger = logging.getLogger(__name__)
+
+PROMPT_INTRO = "You are an AI agent that helps users bootstrap development projects."
+
+# Guidelines, rules and workflow shared by every session and turn
+STATIC_GUIDELINES = """CONVERSATION GUIDELINES:
+1. Be conversational and helpful
+2. Use function calls to update state and collect information
+3. Stream responses naturally, thinking step by step
+4. Adapt based on user responses and system capabilities
+5. Always validate information before proceeding
+6. Handle errors gracefully with alternatives
+7. Keep the user informed of progress
+
+IMPORTANT RULES:
+- If you are explicitly in a waiting stage, write back to the user in some time / frame it as a question so the user know what next
+- Use function calls when you need to update state or ask structured questions
+- Don't ask Language and Framework related questions.
+- Take decision on what Language and Framework to use based on detected system capabilities
+- Framework questions should be asked if user have multiple tools, which can be used for the same Project Requirement, Else suggest the best from detected system capabilities
+- Always confirm critical decisions before execution
+- Provide examples when the user seems confused
+- If something fails, suggest alternatives
+
+
+REQUIRED WORKFLOW:
+1. First, request permissions if needed (request_permission function)
+2. Ask User to first give permission to read capabilites and then move forward, end the session if not permission
+2. Then detect system capabilities (detect_system_capabilities function)
+3. Collect all project requirements (update_project_requirements function) 
+4. Create the project directly by calling create_project_with_steps function with detailed steps
+
+CRITICAL: When user confirms project creation, you MUST immediately call create_project_with_steps function with detailed steps.
+DO NOT just say "creating project" - ACTUALLY CALL THE FUNCTION!
+
+This function allows you to:
+- Provide shell commands to execute (mkdir, npm init, etc.)
+- Create files with content using command="CREATE_FILE", file_path="path/to/file", file_content="content"
+- Everything executes immediately - no separate execution step needed!
+
+ALWAYS call this function immediately after user confirms. Do not hesitate or ask again.
+
+IMPORTANT: First basic setup needs to be done, then For creating files, use generate_file_content function first to create appropriate content, should be executed for each file created during our create_project_with_steps!
+
+Example workflow for React Native project:
+1. generate_file_content(file_path="App.tsx", project_type="mobile_app", project_name="MyApp", framework="React Native")
+2. create_project_with_steps([
+  {"command": "mkdir -p MyApp", "description": "Create project directory"},
+  {"command": "npx @react-native-community/cli init MyApp --template react-native-template-typescript", "description": "Create React Native project with modern CLI"},
+  {"command": "CREATE_FILE", "file_path": "App.tsx", "file_content": "[CONTENT FROM generate_file_content]", "description": "Create main App component with proper React Native code"},
+  {"command": "CREATE_FILE", "file_path": "README.md", "file_content": "[GENERATED README]", "description": "Create project documentation"}
+])
+
+This ensures files have meaningful, working content instead of being empty!"""
+
+
+class SystemPromptBuilder:
+    """
+    Build the agent's system prompt from cached segments.
+    
+    The prompt is assembled from three kinds of segments:
+    
+    - static: guidelines and workflow rules, the per-state instructions and
+      the list of functions offered (rendered once per schema subset)
+    - per-session: requirements and capabilities JSON, re-rendered only
+      when the ``version`` of either model changes or it is replaced
+    - per-turn: session info, progress and iteration count, which are
+      cheap to format
+    """
+    
+    def __init__(
+        self,
+        registry: FunctionRegistry,
+        state_machine: ConversationStateMachine,
+        max_sessions: Optional[int] = None
+    ):
+        """
+        Initialize prompt builder.
+        
+        Args:
+            registry: Function registry whose functions are listed
+            state_machine: State machine providing instructions and progress
+            max_sessions: Sessions whose segments are kept cached
+        """
+        self.function_registry = registry
+        self.state_machine = state_machine
+        self.max_sessions = max_sessions or settings.SESSION_CACHE_SIZE
+        
+        self._state_segments: Dict[ConversationState, str] = {}
+        # id(schema subset) -> (subset, text); the registry keeps subsets stable
+        self._functions_segments: Dict[int, Tuple[List[Dict[str, Any]], str]] = {}
+        # session_id -> (requirements, version, capabilities, version, text)
+        self._session_segments: "OrderedDict[str, Tuple[Any, int, Any, int, str]]" = OrderedDict()
+    
+    def _state_segment(self, state: ConversationState) -> str:
+        """Instructions for a state, rendered once per state."""
+        segment = self._state_segments.get(state)
+        if segment is None:
+            segment = f"CURRENT STATE INSTRUCTIONS:\n{self.state_machine.get_state_instructions(state)}"
+            self._state_segments[state] = segment
+        return segment
+    
+    def _functions_segment(self, session_state: SessionState) -> str:
+        """Names of the functions offered in the session's state."""
+        schemas = self.function_registry.get_function_schemas_for_state(session_state)
+        cached = self._functions_segments.get(id(schemas))
+        if cached is None or cached[0] is not schemas:
+            names = json.dumps([func["name"] for func in schemas], indent=2)
+            cached = (schemas, f"AVAILABLE FUNCTIONS:\n{names}")
+            self._functions_segments[id(schemas)] = cached
+        return cached[1]
+    
+    def _session_segment(self, session_state: SessionState) -> str:
+        """Requirements and capabilities, re-rendered when either changes."""
+        requirements = session_state.requirements
+        capabilities = session_state.capabilities
+        requirements_version = requirements.version
+        capabilities_version = capabilities.version if capabilities else 0
+        
+        cached = self._session_segments.get(session_state.session_id)
+        if (
+            cached is not None
+            and cached[0] is requirements and cached[1] == requirements_version
+            and cached[2] is capabilities and cached[3] == capabilities_version
+        ):
+            self._session_segments.move_to_end(session_state.session_id)
+            return cached[4]
+        
+        capabilities_data = capabilities.model_dump() if capabilities else {}
+        text = (
+            f"COLLECTED REQUIREMENTS:\n{json.dumps(requirements.model_dump(), indent=2)}\n\n"
+            f"SYSTEM CAPABILITIES:\n{json.dumps(capabilities_data, indent=2)}"
+        )
+        
+        self._session_segments[session_state.session_id] = (
+            requirements, requirements_version, capabilities, capabilities_version, text
+        )
+        self._session_segments.move_to_end(session_state.session_id)
+        while len(self._session_segments) > self.max_sessions:
+            self._session_segments.popitem(last=False)
+        return text
+    
+    def build(self, session_state: SessionState) -> str:
+        """
+        Build the system prompt for a turn.
+        
+        Args:
+            session_state: Current session state
+        
+        Returns:
+            System prompt text
+        """
+        current_state = session_state.current_state
+        
+        session_info = (
+            "CURRENT SESSION INFO:\n"
+            f"- Session ID: {session_state.session_id}\n"
+            f"- Current State: {current_state.value}\n"
+            f"- Iteration: {session_state.iteration_count}\n"
+            f"- Progress: {self.state_machine.get_progress_percentage(current_state)}%\n"
+            f"- Completion: {session_state.completion_percentage}%"
+        )
+        
+        return "\n\n".join((
+            PROMPT_INTRO,
+            session_info,
+            self._session_segment(session_state),
+            self._state_segment(current_state),
+            self._functions_segment(session_state),
+            STATIC_GUIDELINES,
+            f"Remember: This is iteration {session_state.iteration_count}. Build upon the conversation history."
+        ))
+    
+    def forget(self, session_id: str):
+        """Drop a session's cached segments."""
+        self._session_segments.pop(session_id, None)
+
+
+# Global system prompt builder instance
+system_prompt_builder = SystemPromptBuilder(function_registry, conversation_state_machine)
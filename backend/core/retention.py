@@ -0,0 +1,315 @@
+"""Retention policy keeping live sessions bounded, with a per-session archive."""
+import hashlib
+import os
+from typing import Any, Dict, List, Optional
+import aiofiles
+import logging
+
+from backend.config import settings
+from backend.models.schemas import SessionState
+from backend.models.serialization import DecodeError, dumps, loads
+
+logger = logging.getLogger(__name__)
+
+# Characters of a digested payload kept inline as a preview
+PAYLOAD_PREVIEW_CHARS = 256
+
+DIGEST_MARKER = "[truncated: {size} chars, digest {digest}]"
+
+
+def payload_digest(value: str) -> str:
+    """Short content digest identifying an archived payload."""
+    return hashlib.sha256(value.encode("utf-8", "surrogatepass")).hexdigest()[:32]
+
+
+class SessionArchive:
+    """
+    Append-only archive of entries evicted from a session.
+    
+    Entries live in ``{session_id}.archive.jsonl``; the companion
+    ``{session_id}.archive.idx`` holds the byte offset of every archived
+    list item (per field) and payload (per digest), so any of them can be
+    read back with a single seek. The index is rebuilt from the archive if
+    it is missing or behind it.
+    """
+    
+    def __init__(self, session_dir: str):
+        """
+        Initialize archive.
+        
+        Args:
+            session_dir: Directory holding session files
+        """
+        self.session_dir = session_dir
+    
+    def _get_archive_file(self, session_id: str) -> str:
+        """Get archive file path."""
+        return os.path.join(self.session_dir, f"{session_id}.archive.jsonl")
+    
+    def _get_index_file(self, session_id: str) -> str:
+        """Get archive index file path."""
+        return os.path.join(self.session_dir, f"{session_id}.archive.idx")
+    
+    @staticmethod
+    def _empty_index() -> Dict[str, Any]:
+        """Index of an empty archive."""
+        return {"size": 0, "items": {}, "payloads": {}}
+    
+    async def _load_index(self, session_id: str) -> Dict[str, Any]:
+        """Load the index, rebuilding it if it doesn't cover the whole archive."""
+        archive_file = self._get_archive_file(session_id)
+        if not os.path.exists(archive_file):
+            return self._empty_index()
+        
+        size = os.path.getsize(archive_file)
+        index_file = self._get_index_file(session_id)
+        if os.path.exists(index_file):
+            try:
+                async with aiofiles.open(index_file, 'rb') as f:
+                    index = loads(await f.read())
+                if index.get("size") == size:
+                    return index
+            except DecodeError:
+                pass
+        
+        logger.info(f"Rebuilding archive index for session {session_id}")
+        index = self._empty_index()
+        async with aiofiles.open(archive_file, 'rb') as f:
+            offset = 0
+            async for line in f:
+                try:
+                    self._index_entry(index, loads(line), offset)
+                except DecodeError:
+                    # Torn write at the end of the archive - drop it
+                    size = offset
+                    break
+                offset += len(line)
+        index["size"] = size
+        return index
+    
+    @staticmethod
+    def _index_entry(index: Dict[str, Any], entry: Dict[str, Any], offset: int):
+        """Record where an archive entry starts."""
+        if "digest" in entry:
+            index["payloads"].setdefault(entry["digest"], offset)
+        else:
+            index["items"].setdefault(entry["field"], []).append(offset)
+    
+    async def append(
+        self,
+        session_id: str,
+        items: Dict[str, List[Any]],
+        payloads: Dict[str, str]
+    ):
+        """
+        Archive list items and digested payloads.
+        
+        Args:
+            session_id: Session identifier
+            items: Items per field, oldest first
+            payloads: Full payload values by digest
+        """
+        index = await self._load_index(session_id)
+        
+        entries = [
+            {"digest": digest, "value": value}
+            for digest, value in payloads.items()
+            if digest not in index["payloads"]
+        ]
+        for field, field_items in items.items():
+            entries.extend({"field": field, "item": item} for item in field_items)
+        
+        if not entries:
+            return
+        
+        offset = index["size"]
+        lines = []
+        for entry in entries:
+            line = dumps(entry) + b"\n"
+            self._index_entry(index, entry, offset)
+            offset += len(line)
+            lines.append(line)
+        
+        archive_file = self._get_archive_file(session_id)
+        async with aiofiles.open(archive_file, 'ab') as f:
+            # Drop any torn tail left behind by an interrupted append
+            await f.truncate(index["size"])
+            await f.write(b"".join(lines))
+        
+        index["size"] = offset
+        async with aiofiles.open(self._get_index_file(session_id), 'wb') as f:
+            await f.write(dumps(index))
+    
+    async def count(self, session_id: str, field: str) -> int:
+        """Number of archived items of a field."""
+        index = await self._load_index(session_id)
+        return len(index["items"].get(field, []))
+    
+    async def read_items(
+        self,
+        session_id: str,
+        field: str,
+        offset: int = 0,
+        limit: Optional[int] = None
+    ) -> List[Any]:
+        """
+        Read archived items of a field, oldest first.
+        
+        Args:
+            session_id: Session identifier
+            field: Session list field
+            offset: Index of the first item to return
+            limit: Maximum number of items to return
+        
+        Returns:
+            Archived items
+        """
+        index = await self._load_index(session_id)
+        offsets = index["items"].get(field, [])
+        offsets = offsets[offset:] if limit is None else offsets[offset:offset + limit]
+        if not offsets:
+            return []
+        
+        items = []
+        async with aiofiles.open(self._get_archive_file(session_id), 'rb') as f:
+            for position in offsets:
+                await f.seek(position)
+                items.append(loads(await f.readline())["item"])
+        return items
+    
+    async def fetch_payload(self, session_id: str, digest: str) -> Optional[str]:
+        """
+        Read a digested payload back in full.
+        
+        Args:
+            session_id: Session identifier
+            digest: Digest from the truncation marker
+        
+        Returns:
+            Original value, or None if unknown
+        """
+        index = await self._load_index(session_id)
+        position = index["payloads"].get(digest)
+        if position is None:
+            return None
+        
+        async with aiofiles.open(self._get_archive_file(session_id), 'rb') as f:
+            await f.seek(position)
+            return loads(await f.readline())["value"]
+    
+    def delete(self, session_id: str):
+        """Remove a session's archive and index."""
+        for path in (self._get_archive_file(session_id), self._get_index_file(session_id)):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class RetentionPolicy:
+    """
+    Keep the growing lists of a live session bounded.
+    
+    Each list keeps its most recent entries hot. Once it grows a quarter
+    past its limit the oldest entries are moved to the session archive in
+    one batch, so archiving (and the non-append write it causes) happens
+    only every few saves. Strings in function results longer than
+    ``payload_max_chars`` are archived and replaced by a preview ending in
+    a digest marker, which ``SessionArchive.fetch_payload`` resolves.
+    """
+    
+    def __init__(
+        self,
+        archive: SessionArchive,
+        hot_limits: Optional[Dict[str, int]] = None,
+        payload_max_chars: Optional[int] = None
+    ):
+        """
+        Initialize retention policy.
+        
+        Args:
+            archive: Archive receiving evicted entries
+            hot_limits: Entries kept in memory per SessionState list field
+            payload_max_chars: Longest string kept inline in function results
+        """
+        self.archive = archive
+        self.hot_limits = hot_limits or {
+            "conversation_history": settings.SESSION_HOT_MESSAGES,
+            "function_results": settings.SESSION_HOT_FUNCTION_RESULTS,
+            "state_history": settings.SESSION_HOT_STATE_HISTORY
+        }
+        self.payload_max_chars = payload_max_chars or settings.SESSION_PAYLOAD_MAX_CHARS
+    
+    def _digest_payloads(self, value: Any, payloads: Dict[str, str]) -> Any:
+        """
+        Replace oversized strings inside a value with digest previews.
+        
+        Returns the value itself when nothing in it was digested; otherwise
+        a copy in which only the containers on the way to a digested string
+        are new.
+        """
+        if isinstance(value, str):
+            if len(value) <= self.payload_max_chars:
+                return value
+            digest = payload_digest(value)
+            payloads[digest] = value
+            marker = DIGEST_MARKER.format(size=len(value), digest=digest)
+            return f"{value[:PAYLOAD_PREVIEW_CHARS]}... {marker}"
+        if isinstance(value, dict):
+            digested = {key: self._digest_payloads(item, payloads) for key, item in value.items()}
+            if all(digested[key] is item for key, item in value.items()):
+                return value
+            return digested
+        if isinstance(value, list):
+            digested = [self._digest_payloads(item, payloads) for item in value]
+            if all(new is old for new, old in zip(digested, value)):
+                return value
+            return digested
+        return value
+    
+    async def apply(self, session_id: str, session_state: SessionState) -> bool:
+        """
+        Enforce the policy on a session in place.
+        
+        Args:
+            session_id: Session identifier
+            session_state: Live session state
+        
+        Returns:
+            True if anything was archived
+        """
+        payloads: Dict[str, str] = {}
+        originals = list(session_state.function_results)
+        digested = [self._digest_payloads(result, payloads) for result in originals]
+        
+        evicted: Dict[str, List[Any]] = {}
+        for field, limit in self.hot_limits.items():
+            items = digested if field == "function_results" else getattr(session_state, field)
+            if len(items) > limit + max(1, limit // 4):
+                evicted[field] = items[:len(items) - limit]
+        
+        if not payloads and not evicted:
+            return False
+        
+        try:
+            await self.archive.append(session_id, evicted, payloads)
+        except Exception as e:
+            # Keep everything hot rather than lose it
+            logger.error(f"Failed to archive entries of session {session_id}: {e}")
+            return False
+        
+        # Replace by index: results appended while archiving stay as they are
+        results = session_state.function_results
+        for index, (original, replacement) in enumerate(zip(originals, digested)):
+            if replacement is not original and index < len(results) and results[index] is original:
+                results[index] = replacement
+        for field, items in evicted.items():
+            del getattr(session_state, field)[:len(items)]
+        
+        # The summary position counts from the front of the hot history
+        trimmed = len(evicted.get("conversation_history", ()))
+        session_state.summarized_message_count = max(0, session_state.summarized_message_count - trimmed)
+        
+        logger.debug(
+            f"Archived {sum(len(items) for items in evicted.values())} entries and "
+            f"{len(payloads)} payloads of session {session_id}"
+        )
+        return True
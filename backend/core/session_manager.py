@@ -1,19 +1,38 @@
 """Session management system."""
 import json
 import aiofiles
+import glob
+import heapq
 import os
+import time
 import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
-from typing import Dict, Optional, List
+from typing import Any, AsyncIterator, Dict, Optional, List, Set, Tuple
 import asyncio
 import logging
 
 from backend.config import settings
 from backend.models.schemas import SessionState, ConversationState
+from backend.models.serialization import dump_document, hydrate_session, load_document
+from backend.core.session_storage import create_session_storage
+from backend.core.retention import RetentionPolicy, SessionArchive
 
 logger = logging.getLogger(__name__)
 
 
+class _SessionLock:
+    """A session's lock, the tasks using it and whether the session was deleted."""
+    
+    __slots__ = ("lock", "users", "deleted")
+    
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+        self.deleted = False
+
+
 class SessionManager:
     """Manage session state persistence and lifecycle."""
     
@@ -21,20 +40,199 @@ class SessionManager:
         """Initialize session manager."""
         self.session_dir = settings.SESSION_DIR
         self.session_timeout = settings.SESSION_TIMEOUT
-        self._locks = {}  # Per-session locks for atomic operations
+        self._locks: Dict[str, _SessionLock] = {}  # Per-session locks for atomic operations
+        
+        # Live session objects, least recently used first
+        self._cache: "OrderedDict[str, SessionState]" = OrderedDict()
+        self._dirty: Set[str] = set()
+        self.cache_size = settings.SESSION_CACHE_SIZE
+        self.write_through = settings.SESSION_DURABILITY == "write_through"
+        self.flush_delay = settings.SESSION_FLUSH_DELAY
+        self._flush_task: Optional[asyncio.Task] = None
+        
+        # File (snapshot + event log) or SQLite backend, per SESSION_STORAGE
+        self.storage = create_session_storage()
+        
+        # Older history and oversized function payloads move to a per-session archive
+        self.retention = RetentionPolicy(SessionArchive(self.session_dir))
+        
+        # Expiry deadlines as a min-heap of (deadline, session_id). Entries are
+        # pushed on every save and superseded ones skipped when popped.
+        self._expiry_heap: List[Tuple[float, str]] = []
+        self._expiry_deadlines: Dict[str, float] = {}
+        self._expiry_added = asyncio.Event()
+        self._sweeper_task: Optional[asyncio.Task] = None
         
         # Ensure session directory exists
         os.makedirs(self.session_dir, exist_ok=True)
     
-    def _get_session_file(self, session_id: str) -> str:
-        """Get session file path."""
-        return os.path.join(self.session_dir, f"{session_id}.json")
-    
-    def _get_lock(self, session_id: str) -> asyncio.Lock:
+    def _get_lock(self, session_id: str) -> _SessionLock:
         """Get or create lock for session."""
-        if session_id not in self._locks:
-            self._locks[session_id] = asyncio.Lock()
-        return self._locks[session_id]
+        entry = self._locks.get(session_id)
+        if entry is None or entry.deleted:
+            # Tasks still queued on a deleted session's lock see the flag and
+            # back off; new callers start from a fresh lock
+            entry = self._locks[session_id] = _SessionLock()
+        return entry
+    
+    @asynccontextmanager
+    async def _session_lock(self, session_id: str) -> AsyncIterator[_SessionLock]:
+        """
+        Hold a session's lock.
+        
+        Callers must check ``deleted`` on the yielded entry: it is set when
+        the session was deleted while they waited for the lock.
+        
+        Args:
+            session_id: Session identifier
+        """
+        entry = self._get_lock(session_id)
+        entry.users += 1
+        try:
+            async with entry.lock:
+                yield entry
+        finally:
+            entry.users -= 1
+            # The last task queued behind a delete drops the lock
+            if entry.deleted and entry.users == 0 and self._locks.get(session_id) is entry:
+                del self._locks[session_id]
+    
+    async def _cache_put(self, session_id: str, session_state: SessionState):
+        """
+        Insert into the cache, writing back any dirty session it evicts.
+        
+        A session whose write-back fails stays cached (and over the limit)
+        until a later flush succeeds.
+        """
+        self._cache[session_id] = session_state
+        self._cache.move_to_end(session_id)
+        
+        overflow = len(self._cache) - self.cache_size
+        for evicted_id in list(self._cache)[:max(overflow, 0)]:
+            evicted_state = self._cache.get(evicted_id)
+            if evicted_id in self._dirty and evicted_state is not None:
+                try:
+                    await self._write_state(evicted_id, evicted_state)
+                except Exception:
+                    # Already logged; the caller's own session is unaffected
+                    pass
+                if evicted_id in self._dirty:
+                    # Write failed or saved again meanwhile: keep it cached
+                    # so the next flush still has the changes
+                    continue
+            self._cache.pop(evicted_id, None)
+    
+    def _schedule_flush(self):
+        """Coalesce dirty sessions into one debounced flush."""
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._delayed_flush())
+    
+    async def _delayed_flush(self):
+        """Wait for the debounce window, then write all dirty sessions."""
+        await asyncio.sleep(self.flush_delay)
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Background session flush failed: {e}")
+    
+    async def flush(self, session_id: Optional[str] = None):
+        """
+        Write dirty sessions to disk.
+        
+        Args:
+            session_id: Only flush this session, flushes all if not provided
+        """
+        session_ids = [session_id] if session_id else list(self._dirty)
+        for dirty_id in session_ids:
+            session_state = self._cache.get(dirty_id)
+            if dirty_id in self._dirty and session_state is not None:
+                await self._write_state(dirty_id, session_state)
+    
+    def _schedule_expiry(self, session_id: str, updated_at: datetime):
+        """Record when a session will expire."""
+        deadline = updated_at.timestamp() + self.session_timeout
+        self._expiry_deadlines[session_id] = deadline
+        heapq.heappush(self._expiry_heap, (deadline, session_id))
+        
+        # Drop superseded entries once they dominate the heap
+        if len(self._expiry_heap) > 2 * len(self._expiry_deadlines) + 64:
+            self._expiry_heap = [(d, sid) for sid, d in self._expiry_deadlines.items()]
+            heapq.heapify(self._expiry_heap)
+        
+        self._expiry_added.set()
+    
+    async def start_expiry_sweeper(self):
+        """Seed expiry deadlines from storage and start the background sweeper."""
+        for session_info in await self.storage.list_sessions():
+            try:
+                modified = datetime.fromisoformat(session_info["modified"])
+            except (KeyError, ValueError):
+                continue
+            if session_info["session_id"] not in self._expiry_deadlines:
+                self._schedule_expiry(session_info["session_id"], modified)
+        
+        if self._sweeper_task is None or self._sweeper_task.done():
+            self._sweeper_task = asyncio.create_task(self._run_expiry_sweeper())
+        
+        logger.info(f"Session expiry sweeper tracking {len(self._expiry_deadlines)} sessions")
+    
+    async def _run_expiry_sweeper(self):
+        """Sleep until the earliest deadline, then delete the sessions that are due."""
+        while True:
+            if not self._expiry_heap:
+                self._expiry_added.clear()
+                await self._expiry_added.wait()
+                continue
+            
+            delay = self._expiry_heap[0][0] - time.time()
+            if delay > 0:
+                # New deadlines are always later than existing ones, so the
+                # head of the heap can't move earlier while we sleep
+                await asyncio.sleep(delay)
+            
+            try:
+                await self._sweep_expired()
+            except Exception as e:
+                logger.error(f"Session expiry sweep failed: {e}")
+    
+    async def _sweep_expired(self) -> int:
+        """Delete sessions whose deadline has passed."""
+        cleaned = 0
+        now = time.time()
+        
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            deadline, session_id = heapq.heappop(self._expiry_heap)
+            if self._expiry_deadlines.get(session_id) != deadline:
+                # Superseded by a later save
+                continue
+            
+            if await self.delete_session(session_id):
+                cleaned += 1
+        
+        if cleaned > 0:
+            logger.info(f"Expired {cleaned} sessions")
+        
+        return cleaned
+    
+    async def close(self):
+        """Stop background tasks and write everything out."""
+        if self._sweeper_task and not self._sweeper_task.done():
+            self._sweeper_task.cancel()
+            try:
+                await self._sweeper_task
+            except asyncio.CancelledError:
+                pass
+        self._sweeper_task = None
+        
+        if self._flush_task and not self._flush_task.done():
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+        self._flush_task = None
+        await self.flush()
+        await self.storage.close()
     
     async def create_session(
         self,
@@ -78,7 +276,7 @@ class SessionManager:
     
     async def load_state(self, session_id: str) -> SessionState:
         """
-        Load session state from file.
+        Load session state from the cache or storage backend.
         
         Args:
             session_id: Session identifier
@@ -89,72 +287,114 @@ class SessionManager:
         Raises:
             FileNotFoundError: If session doesn't exist
         """
-        session_file = self._get_session_file(session_id)
-        
-        if not os.path.exists(session_file):
-            logger.warning(f"Session not found: {session_id}")
-            # Create new session with the given ID
-            return await self.create_session(session_id)
-        
-        lock = self._get_lock(session_id)
-        async with lock:
+        session_state = self._cache.get(session_id)
+        if session_state is not None:
+            self._cache.move_to_end(session_id)
+            self._mark_if_expired(session_state)
+            return session_state
+        
+        session_state = None
+        async with self._session_lock(session_id) as lock:
+            # Another task may have loaded it while we waited
+            cached = self._cache.get(session_id)
+            if cached is not None and not lock.deleted:
+                self._cache.move_to_end(session_id)
+                return cached
+            
             try:
-                async with aiofiles.open(session_file, 'r') as f:
-                    data = await f.read()
-                    session_data = json.loads(data)
-                    
+                session_data = await self.storage.read(session_id)
+                
+                if session_data is not None:
                     # Create SessionState from loaded data
-                    session_state = SessionState(**session_data)
+                    session_state = hydrate_session(session_data)
                     
                     # Check if session is expired
-                    if self._is_session_expired(session_state):
-                        logger.warning(f"Session expired: {session_id}")
-                        session_state.current_state = ConversationState.ERROR
-                        session_state.error_message = "Session expired"
-                    
-                    return session_state
+                    self._mark_if_expired(session_state)
+                else:
+                    logger.warning(f"Session not found: {session_id}")
                     
             except json.JSONDecodeError as e:
                 logger.error(f"JSON decode error for session {session_id}: {e}")
-                # Create new session if corrupted
-                return await self.create_session(session_id)
             except Exception as e:
                 logger.error(f"Failed to load session {session_id}: {e}")
-                # Try to handle validation errors by recreating the session
-                return await self.create_session(session_id)
+        
+        if session_state is None:
+            # Create a new session with the given ID, replacing corrupted or
+            # invalid data (outside the lock, which the save needs)
+            self.storage.forget(session_id)
+            return await self.create_session(session_id)
+        
+        # Another task may have cached it while we were reading
+        if session_id in self._cache:
+            return await self.load_state(session_id)
+        
+        await self._cache_put(session_id, session_state)
+        return session_state
+    
+    def _mark_if_expired(self, session_state: SessionState):
+        """Flag an expired session as errored."""
+        if self._is_session_expired(session_state):
+            logger.warning(f"Session expired: {session_state.session_id}")
+            session_state.current_state = ConversationState.ERROR
+            session_state.error_message = "Session expired"
     
     async def save_state(self, session_id: str, session_state: SessionState):
         """
-        Save session state to file atomically.
+        Save session state.
+        
+        In write-through mode the file is written before returning. In
+        write-behind mode the session is marked dirty and saves within the
+        flush delay are coalesced into a single write.
         
         Args:
             session_id: Session identifier
             session_state: Session state to save
         """
-        session_file = self._get_session_file(session_id)
-        temp_file = f"{session_file}.tmp"
+        # Keep the live state bounded before it is cached and persisted
+        async with self._session_lock(session_id) as lock:
+            if lock.deleted:
+                # Don't resurrect a session deleted while we waited
+                logger.warning(f"Not saving session deleted during save: {session_id}")
+                return
+            await self.retention.apply(session_id, session_state)
         
         # Update timestamp
         session_state.updated_at = datetime.now()
         session_state.state_version += 1
         
-        lock = self._get_lock(session_id)
-        async with lock:
+        self._dirty.add(session_id)
+        self._schedule_expiry(session_id, session_state.updated_at)
+        await self._cache_put(session_id, session_state)
+        
+        if self.write_through:
+            await self._write_state(session_id, session_state)
+        else:
+            self._schedule_flush()
+    
+    async def _write_state(self, session_id: str, session_state: SessionState):
+        """
+        Persist session state, appending to the event log when possible.
+        
+        Args:
+            session_id: Session identifier
+            session_state: Session state to write
+        """
+        async with self._session_lock(session_id) as lock:
+            if lock.deleted or session_id not in self._dirty:
+                # Already written by another flush, or deleted meanwhile
+                return
+            
+            # Saves made while writing mark the session dirty again
+            self._dirty.discard(session_id)
             try:
-                # Write to temporary file first
-                async with aiofiles.open(temp_file, 'w') as f:
-                    await f.write(session_state.model_dump_json(indent=2))
-                
-                # Atomic move
-                os.rename(temp_file, session_file)
-                
+                await self.storage.write(session_id, session_state)
                 logger.debug(f"Saved session state: {session_id}")
                 
             except Exception as e:
                 logger.error(f"Failed to save session {session_id}: {e}")
-                # Clean up temp file if it exists
-                if os.path.exists(temp_file):
-                    os.remove(temp_file)
+                self._dirty.add(session_id)
+                # Next write starts from scratch
+                self.storage.forget(session_id)
                 raise
     
     async def update_state(
@@ -200,50 +440,69 @@ class SessionManager:
         Returns:
             True if deleted, False if not found
         """
-        session_file = self._get_session_file(session_id)
-        
-        if os.path.exists(session_file):
-            os.remove(session_file)
+        # Wait for any in-flight write so it can't recreate the session
+        async with self._session_lock(session_id) as lock:
+            if lock.deleted:
+                # Deleted by another task while we waited
+                return False
             
-            # Clean up lock
-            if session_id in self._locks:
-                del self._locks[session_id]
+            cached = self._cache.pop(session_id, None) is not None
+            self._dirty.discard(session_id)
+            self._expiry_deadlines.pop(session_id, None)
+            
+            # Clean up checkpoints
+            for checkpoint_file in glob.glob(os.path.join(self.session_dir, f"checkpoint_{glob.escape(session_id)}_*.json")):
+                try:
+                    os.remove(checkpoint_file)
+                except OSError as e:
+                    logger.warning(f"Failed to remove checkpoint {checkpoint_file}: {e}")
             
+            deleted = await self.storage.delete(session_id)
+            self.retention.archive.delete(session_id)
+            
+            # Tasks queued on the lock see the flag once they acquire it
+            lock.deleted = True
+            if lock.users == 1:
+                # Nobody else is waiting: drop the lock while still holding it
+                del self._locks[session_id]
+        
+        if deleted:
             logger.info(f"Deleted session: {session_id}")
-            return True
         
-        return False
+        return deleted or cached
     
-    async def list_sessions(self) -> List[Dict[str, str]]:
+    async def list_sessions(self, state: Optional[str] = None) -> List[Dict[str, str]]:
         """
         List all sessions.
         
+        Args:
+            state: Only list sessions in this conversation state
+            
         Returns:
             List of session information
         """
-        sessions = []
-        
-        try:
-            for filename in os.listdir(self.session_dir):
-                if filename.endswith('.json'):
-                    session_id = filename[:-5]  # Remove .json
-                    session_file = self._get_session_file(session_id)
-                    
-                    try:
-                        stat = os.stat(session_file)
-                        sessions.append({
-                            "session_id": session_id,
-                            "created": datetime.fromtimestamp(stat.st_ctime).isoformat(),
-                            "modified": datetime.fromtimestamp(stat.st_mtime).isoformat(),
-                            "size": stat.st_size
-                        })
-                    except Exception as e:
-                        logger.warning(f"Failed to get stats for session {session_id}: {e}")
-                        
-        except Exception as e:
-            logger.error(f"Failed to list sessions: {e}")
+        # Sessions created in write-behind mode may not be stored yet
+        await self.flush()
+        return await self.storage.list_sessions(state)
+    
+    async def get_session_stats(self) -> Dict[str, Any]:
+        """
+        Get session counts and cache statistics.
         
-        return sessions
+        Returns:
+            Session statistics
+        """
+        await self.flush()
+        counts = await self.storage.count_sessions(
+            datetime.now() - timedelta(seconds=self.session_timeout)
+        )
+        return {
+            "storage": self.storage.name,
+            "total_sessions": counts["total"],
+            "active_sessions": counts["active"],
+            "cached_sessions": len(self._cache),
+            "dirty_sessions": len(self._dirty)
+        }
     
     async def cleanup_expired_sessions(self) -> int:
         """
@@ -255,19 +514,15 @@ class SessionManager:
         cleaned = 0
         
         try:
-            sessions = await self.list_sessions()
+            await self.flush()
+            cutoff = datetime.now() - timedelta(seconds=self.session_timeout)
             
-            for session_info in sessions:
+            for session_id in await self.storage.list_expired(cutoff):
                 try:
-                    # Load session to check expiry
-                    session_state = await self.load_state(session_info["session_id"])
-                    
-                    if self._is_session_expired(session_state):
-                        await self.delete_session(session_info["session_id"])
+                    if await self.delete_session(session_id):
                         cleaned += 1
-                        
                 except Exception as e:
-                    logger.warning(f"Failed to check session {session_info['session_id']}: {e}")
+                    logger.warning(f"Failed to delete session {session_id}: {e}")
                     
         except Exception as e:
             logger.error(f"Failed to cleanup expired sessions: {e}")
@@ -319,7 +574,7 @@ class SessionManager:
         limit: Optional[int] = None
     ) -> List[Dict]:
         """
-        Get conversation history for session.
+        Get conversation history for session, including archived messages.
         
         Args:
             session_id: Session identifier
@@ -328,14 +583,75 @@ class SessionManager:
         Returns:
             Conversation history
         """
-        session_state = await self.load_state(session_id)
-        history = session_state.conversation_history
+        history = None
+        if limit and session_id not in self._cache:
+            # Recent messages can usually be read on their own without
+            # rebuilding the whole session
+            history = await self.storage.read_tail(session_id, "conversation_history", limit)
         
-        if limit:
-            history = history[-limit:]
+        if history is None:
+            session_state = await self.load_state(session_id)
+            history = session_state.conversation_history
+            
+            if limit:
+                history = history[-limit:]
+        
+        # Older messages come from the archive
+        missing = limit - len(history) if limit else None
+        if missing is None or missing > 0:
+            archived_count = await self.retention.archive.count(session_id, "conversation_history")
+            start = 0 if missing is None else max(0, archived_count - missing)
+            if start < archived_count:
+                archived = await self.retention.archive.read_items(
+                    session_id, "conversation_history", start
+                )
+                history = archived + list(history)
         
         return history
     
+    async def get_archived_entries(
+        self,
+        session_id: str,
+        field: str,
+        offset: int = 0,
+        limit: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Get entries moved out of a session by the retention policy.
+        
+        Args:
+            session_id: Session identifier
+            field: conversation_history, function_results or state_history
+            offset: Index of the first archived entry to return
+            limit: Optional limit on number of entries
+            
+        Returns:
+            Total archived count and the requested entries, oldest first
+            
+        Raises:
+            ValueError: If the field is not archived
+        """
+        if field not in self.retention.hot_limits:
+            raise ValueError(f"Unknown archived field: {field}")
+        
+        return {
+            "total": await self.retention.archive.count(session_id, field),
+            "entries": await self.retention.archive.read_items(session_id, field, offset, limit)
+        }
+    
+    async def fetch_payload(self, session_id: str, digest: str) -> Optional[str]:
+        """
+        Get a function result value that was truncated to a digest.
+        
+        Args:
+            session_id: Session identifier
+            digest: Digest from the truncation marker
+            
+        Returns:
+            Original value, or None if unknown
+        """
+        return await self.retention.archive.fetch_payload(session_id, digest)
+    
     async def create_checkpoint(self, session_id: str) -> str:
         """
         Create a checkpoint of the current session state.
@@ -350,8 +666,8 @@ class SessionManager:
         checkpoint_id = f"{session_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
         checkpoint_file = os.path.join(self.session_dir, f"checkpoint_{checkpoint_id}.json")
         
-        async with aiofiles.open(checkpoint_file, 'w') as f:
-            await f.write(session_state.model_dump_json(indent=2))
+        async with aiofiles.open(checkpoint_file, 'wb') as f:
+            await f.write(dump_document(session_state.model_dump(mode="json")))
         
         logger.info(f"Created checkpoint: {checkpoint_id}")
         return checkpoint_id
@@ -373,13 +689,13 @@ class SessionManager:
             return False
         
         try:
-            async with aiofiles.open(checkpoint_file, 'r') as f:
+            async with aiofiles.open(checkpoint_file, 'rb') as f:
                 data = await f.read()
-                session_data = json.loads(data)
+                session_data = load_document(data)
                 
                 # Update session ID to current one
                 session_data['session_id'] = session_id
-                session_state = SessionState(**session_data)
+                session_state = hydrate_session(session_data)
                 
                 await self.save_state(session_id, session_state)
                 logger.info(f"Restored session {session_id} from checkpoint {checkpoint_id}")
@@ -387,4 +703,8 @@ class SessionManager:
                 
         except Exception as e:
             logger.error(f"Failed to restore checkpoint {checkpoint_id}: {e}")
-            return False
\ No newline at end of file
+            return False
+
+
+# Global session manager instance
+session_manager = SessionManager()
@@ -0,0 +1,440 @@
+"""Pluggable storage backends for session persistence."""
+import asyncio
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+from backend.config import settings
+from backend.core.event_log import SessionEventLog
+from backend.models.schemas import SessionState
+from backend.models.serialization import dumps_text, loads
+
+logger = logging.getLogger(__name__)
+
+
+class SessionStorage(ABC):
+    """
+    Interface implemented by session storage backends.
+    
+    ``forget``, ``read_tail`` and ``close`` are optional hooks with no-op
+    defaults; everything else must be implemented.
+    """
+    
+    name = "base"
+    
+    @abstractmethod
+    async def read(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Load session data, or None if the session doesn't exist."""
+    
+    @abstractmethod
+    async def write(self, session_id: str, session_state: SessionState):
+        """Persist a session."""
+    
+    @abstractmethod
+    async def delete(self, session_id: str) -> bool:
+        """Delete a session, returning whether it existed."""
+    
+    def forget(self, session_id: str):
+        """Drop incremental-write bookkeeping so the next write is a full one."""
+    
+    async def read_tail(self, session_id: str, field: str, limit: int) -> Optional[List[Any]]:
+        """Read the last items of a list field cheaply, or None if not possible."""
+        return None
+    
+    @abstractmethod
+    async def list_sessions(self, state: Optional[str] = None) -> List[Dict[str, Any]]:
+        """List sessions, optionally only those in the given conversation state."""
+    
+    @abstractmethod
+    async def list_expired(self, cutoff: datetime) -> List[str]:
+        """IDs of sessions not updated since ``cutoff``."""
+    
+    @abstractmethod
+    async def count_sessions(self, active_since: datetime) -> Dict[str, int]:
+        """Total sessions and sessions updated since ``active_since``."""
+    
+    async def close(self):
+        """Release backend resources."""
+
+
+class FileSessionStorage(SessionStorage):
+    """One snapshot file plus event log per session in SESSION_DIR."""
+    
+    name = "file"
+    
+    def __init__(self, session_dir: str, snapshot_interval: int):
+        """
+        Initialize file storage.
+        
+        Args:
+            session_dir: Directory holding session files
+            snapshot_interval: Events between compacted snapshots
+        """
+        self.session_dir = session_dir
+        self.event_log = SessionEventLog(session_dir, snapshot_interval)
+        os.makedirs(self.session_dir, exist_ok=True)
+    
+    def _get_session_file(self, session_id: str) -> str:
+        """Get session file path."""
+        return os.path.join(self.session_dir, f"{session_id}.json")
+    
+    def _stat_session(self, session_id: str) -> Tuple[float, float, int]:
+        """Created time, last modified time and size across snapshot and log."""
+        stat = os.stat(self._get_session_file(session_id))
+        created, modified, size = stat.st_ctime, stat.st_mtime, stat.st_size
+        
+        log_file = self.event_log._get_log_file(session_id)
+        if os.path.exists(log_file):
+            log_stat = os.stat(log_file)
+            modified = max(modified, log_stat.st_mtime)
+            size += log_stat.st_size
+        
+        return created, modified, size
+    
+    def _session_ids(self) -> List[str]:
+        """IDs of all sessions on disk."""
+        return [
+            filename[:-5]  # Remove .json
+            for filename in os.listdir(self.session_dir)
+            if filename.endswith('.json') and not filename.startswith('checkpoint_')
+        ]
+    
+    async def read(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Replay snapshot plus event log."""
+        return await self.event_log.read(session_id)
+    
+    async def write(self, session_id: str, session_state: SessionState):
+        """Append to the event log, or write a new snapshot."""
+        await self.event_log.write(session_id, session_state)
+    
+    async def delete(self, session_id: str) -> bool:
+        """Remove the snapshot and event log."""
+        self.event_log.delete(session_id)
+        
+        session_file = self._get_session_file(session_id)
+        if os.path.exists(session_file):
+            os.remove(session_file)
+            return True
+        return False
+    
+    def forget(self, session_id: str):
+        """Next write starts from a fresh snapshot."""
+        self.event_log.forget(session_id)
+    
+    async def read_tail(self, session_id: str, field: str, limit: int) -> Optional[List[Any]]:
+        """Read recent items from the end of the event log."""
+        return await self.event_log.read_tail(session_id, field, limit)
+    
+    async def list_sessions(self, state: Optional[str] = None) -> List[Dict[str, Any]]:
+        """List session files, loading each one only when filtering by state."""
+        sessions = []
+        
+        try:
+            for session_id in self._session_ids():
+                try:
+                    current_state = None
+                    if state is not None:
+                        data = await self.event_log.read(session_id, track=False)
+                        current_state = data.get("current_state") if data else None
+                        if current_state != state:
+                            continue
+                    
+                    created, modified, size = self._stat_session(session_id)
+                    info = {
+                        "session_id": session_id,
+                        "created": datetime.fromtimestamp(created).isoformat(),
+                        "modified": datetime.fromtimestamp(modified).isoformat(),
+                        "size": size
+                    }
+                    if current_state is not None:
+                        info["current_state"] = current_state
+                    sessions.append(info)
+                except Exception as e:
+                    logger.warning(f"Failed to get stats for session {session_id}: {e}")
+        
+        except Exception as e:
+            logger.error(f"Failed to list sessions: {e}")
+        
+        return sessions
+    
+    async def list_expired(self, cutoff: datetime) -> List[str]:
+        """Sessions whose files haven't been modified since the cutoff."""
+        cutoff_ts = cutoff.timestamp()
+        expired = []
+        for session_id in self._session_ids():
+            try:
+                if self._stat_session(session_id)[1] < cutoff_ts:
+                    expired.append(session_id)
+            except OSError:
+                continue
+        return expired
+    
+    async def count_sessions(self, active_since: datetime) -> Dict[str, int]:
+        """Count session files by modification time."""
+        since_ts = active_since.timestamp()
+        total = active = 0
+        for session_id in self._session_ids():
+            try:
+                modified = self._stat_session(session_id)[1]
+            except OSError:
+                continue
+            total += 1
+            if modified >= since_ts:
+                active += 1
+        return {"total": total, "active": active}
+
+
+class SQLiteSessionStorage(SessionStorage):
+    """
+    Sessions in a single SQLite database.
+    
+    Scalar state is stored as a JSON blob next to indexed ``current_state``,
+    ``created_at`` and ``updated_at`` columns. Conversation messages live in
+    their own table so each save only inserts the new ones, and deletes the
+    ones retention trimmed from the front of the history.
+    """
+    
+    name = "sqlite"
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS sessions (
+            session_id TEXT PRIMARY KEY,
+            current_state TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_sessions_updated_at ON sessions(updated_at);
+        CREATE INDEX IF NOT EXISTS idx_sessions_current_state ON sessions(current_state);
+        CREATE INDEX IF NOT EXISTS idx_sessions_created_at ON sessions(created_at);
+        CREATE TABLE IF NOT EXISTS messages (
+            session_id TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            message TEXT NOT NULL,
+            PRIMARY KEY (session_id, seq)
+        );
+    """
+    
+    def __init__(self, db_path: str):
+        """
+        Initialize SQLite storage.
+        
+        Args:
+            db_path: Database file path
+        """
+        self.db_path = db_path
+        self._conn: Optional[sqlite3.Connection] = None
+        # sqlite3 connections must not be used from two threads at once
+        self._db_lock = threading.Lock()
+        # session_id -> (seq of first stored message, messages stored, encoded last message)
+        self._message_positions: Dict[str, Tuple[int, int, Optional[str]]] = {}
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Open the database on first use."""
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(self.SCHEMA)
+            self._conn = conn
+        return self._conn
+    
+    async def _run(self, fn, *args):
+        """Run a database call in a worker thread."""
+        def call():
+            with self._db_lock:
+                return fn(self._connect(), *args)
+        return await asyncio.to_thread(call)
+    
+    async def read(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Load the session row and its messages."""
+        def query(conn: sqlite3.Connection):
+            row = conn.execute(
+                "SELECT data FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is None:
+                return None, []
+            rows = conn.execute(
+                "SELECT seq, message FROM messages WHERE session_id = ? ORDER BY seq", (session_id,)
+            ).fetchall()
+            return row[0], rows
+        
+        data_json, rows = await self._run(query)
+        if data_json is None:
+            return None
+        
+        data = loads(data_json)
+        data["conversation_history"] = [loads(message) for _, message in rows]
+        self._message_positions[session_id] = (
+            rows[0][0] if rows else 0, len(rows), rows[-1][1] if rows else None
+        )
+        return data
+    
+    @staticmethod
+    def _kept_prefix(encoded: List[str], stored: int, last_message: Optional[str]) -> Optional[int]:
+        """
+        How many of the stored messages still lead the history.
+        
+        Retention only trims the front and saves only append, so the last
+        stored message is either where it was or moved towards the front.
+        
+        Returns:
+            Number of stored messages kept, or None if the history was rewritten
+        """
+        if stored == 0:
+            return 0
+        for kept in range(min(stored, len(encoded)), 0, -1):
+            if encoded[kept - 1] == last_message:
+                return kept
+        return None
+    
+    async def write(self, session_id: str, session_state: SessionState):
+        """Upsert the session row and insert new messages."""
+        # Serialize up front so the write reflects one consistent state
+        data_json = dumps_text(session_state.model_dump(mode="json", exclude={"conversation_history"}))
+        encoded = [dumps_text(message) for message in session_state.conversation_history]
+        
+        first_seq, stored, last_message = self._message_positions.get(session_id, (0, None, None))
+        kept = None if stored is None else self._kept_prefix(encoded, stored, last_message)
+        append_only = kept is not None
+        if append_only:
+            # Rows of messages trimmed from the front are deleted, the rest kept
+            first_seq += stored - kept
+        else:
+            first_seq, kept = 0, 0
+        
+        def execute(conn: sqlite3.Connection):
+            conn.execute("BEGIN")
+            try:
+                conn.execute(
+                    """
+                    INSERT INTO sessions (session_id, current_state, created_at, updated_at, data)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(session_id) DO UPDATE SET
+                        current_state = excluded.current_state,
+                        updated_at = excluded.updated_at,
+                        data = excluded.data
+                    """,
+                    (
+                        session_id,
+                        session_state.current_state.value,
+                        session_state.created_at.timestamp(),
+                        session_state.updated_at.timestamp(),
+                        data_json
+                    )
+                )
+                if not append_only:
+                    conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+                elif kept < stored:
+                    conn.execute(
+                        "DELETE FROM messages WHERE session_id = ? AND seq < ?", (session_id, first_seq)
+                    )
+                conn.executemany(
+                    "INSERT INTO messages (session_id, seq, message) VALUES (?, ?, ?)",
+                    [(session_id, first_seq + index, encoded[index]) for index in range(kept, len(encoded))]
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        
+        await self._run(execute)
+        self._message_positions[session_id] = (first_seq, len(encoded), encoded[-1] if encoded else None)
+    
+    async def delete(self, session_id: str) -> bool:
+        """Delete the session row and its messages."""
+        self.forget(session_id)
+        
+        def execute(conn: sqlite3.Connection) -> bool:
+            conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            return conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,)).rowcount > 0
+        
+        return await self._run(execute)
+    
+    def forget(self, session_id: str):
+        """Next write replaces all stored messages."""
+        self._message_positions.pop(session_id, None)
+    
+    async def read_tail(self, session_id: str, field: str, limit: int) -> Optional[List[Any]]:
+        """Read the most recent messages straight from the messages table."""
+        if field != "conversation_history":
+            return None
+        
+        def query(conn: sqlite3.Connection):
+            if conn.execute("SELECT 1 FROM sessions WHERE session_id = ?", (session_id,)).fetchone() is None:
+                return None
+            return conn.execute(
+                "SELECT message FROM messages WHERE session_id = ? ORDER BY seq DESC LIMIT ?",
+                (session_id, limit)
+            ).fetchall()
+        
+        rows = await self._run(query)
+        if rows is None:
+            return None
+        return [loads(message) for (message,) in reversed(rows)]
+    
+    async def list_sessions(self, state: Optional[str] = None) -> List[Dict[str, Any]]:
+        """List sessions, most recently updated first."""
+        def query(conn: sqlite3.Connection):
+            sql = "SELECT session_id, current_state, created_at, updated_at, length(data) FROM sessions"
+            params: Tuple = ()
+            if state is not None:
+                sql += " WHERE current_state = ?"
+                params = (state,)
+            return conn.execute(sql + " ORDER BY updated_at DESC", params).fetchall()
+        
+        return [
+            {
+                "session_id": session_id,
+                "created": datetime.fromtimestamp(created_at).isoformat(),
+                "modified": datetime.fromtimestamp(updated_at).isoformat(),
+                "size": size,
+                "current_state": current_state
+            }
+            for session_id, current_state, created_at, updated_at, size in await self._run(query)
+        ]
+    
+    async def list_expired(self, cutoff: datetime) -> List[str]:
+        """Sessions not updated since the cutoff (uses the updated_at index)."""
+        def query(conn: sqlite3.Connection):
+            return conn.execute(
+                "SELECT session_id FROM sessions WHERE updated_at < ?", (cutoff.timestamp(),)
+            ).fetchall()
+        
+        return [session_id for (session_id,) in await self._run(query)]
+    
+    async def count_sessions(self, active_since: datetime) -> Dict[str, int]:
+        """Count sessions with indexed queries."""
+        def query(conn: sqlite3.Connection):
+            total = conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+            active = conn.execute(
+                "SELECT COUNT(*) FROM sessions WHERE updated_at >= ?", (active_since.timestamp(),)
+            ).fetchone()[0]
+            return total, active
+        
+        total, active = await self._run(query)
+        return {"total": total, "active": active}
+    
+    async def close(self):
+        """Close the database connection."""
+        def close():
+            with self._db_lock:
+                if self._conn is not None:
+                    self._conn.close()
+                    self._conn = None
+        await asyncio.to_thread(close)
+
+
+def create_session_storage() -> SessionStorage:
+    """Create the storage backend selected by SESSION_STORAGE."""
+    if settings.SESSION_STORAGE == "sqlite":
+        return SQLiteSessionStorage(settings.SESSION_DB_PATH)
+    
+    if settings.SESSION_STORAGE != "file":
+        logger.warning(f"Unknown SESSION_STORAGE '{settings.SESSION_STORAGE}', using file storage")
+    return FileSessionStorage(settings.SESSION_DIR, settings.SESSION_SNAPSHOT_INTERVAL)
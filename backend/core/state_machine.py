@@ -8,6 +8,22 @@ from backend.models.schemas import ConversationState, SessionState
 
 logger = logging.getLogger(__name__)
 
+# Overall progress reported for each state
+STATE_PROGRESS = {
+    ConversationState.INIT: 0,
+    ConversationState.ASK_PROJECT_TYPE: 10,
+    ConversationState.ASK_LANGUAGE_PREFERENCE: 20,
+    ConversationState.ASK_PROJECT_NAME_FOLDER: 30,
+    ConversationState.ASK_ADDITIONAL_DETAILS: 40,
+    ConversationState.CHECK_SYSTEM_CAPABILITIES: 50,
+    ConversationState.VALIDATE_INFO: 60,
+    ConversationState.SUMMARY_CONFIRMATION: 70,
+    ConversationState.PLANNING: 80,
+    ConversationState.EXECUTING: 90,
+    ConversationState.VERIFYING: 95,
+    ConversationState.COMPLETED: 100
+}
+
 
 class StateTransition:
     """Represents a state transition."""
@@ -165,30 +181,19 @@ class ConversationStateMachine:
                 except Exception as e:
                     logger.error(f"Error in state handler for {current_state.value}: {e}")
     
+    def get_progress_percentage(self, state: ConversationState) -> int:
+        """Get overall progress for a state without evaluating transitions."""
+        return STATE_PROGRESS.get(state, 0)
+    
     def get_state_progress(self, session_state: SessionState) -> Dict[str, Any]:
         """Get progress information for current state."""
-        state_progress = {
-            ConversationState.INIT: 0,
-            ConversationState.ASK_PROJECT_TYPE: 10,
-            ConversationState.ASK_LANGUAGE_PREFERENCE: 20,
-            ConversationState.ASK_PROJECT_NAME_FOLDER: 30,
-            ConversationState.ASK_ADDITIONAL_DETAILS: 40,
-            ConversationState.CHECK_SYSTEM_CAPABILITIES: 50,
-            ConversationState.VALIDATE_INFO: 60,
-            ConversationState.SUMMARY_CONFIRMATION: 70,
-            ConversationState.PLANNING: 80,
-            ConversationState.EXECUTING: 90,
-            ConversationState.VERIFYING: 95,
-            ConversationState.COMPLETED: 100
-        }
-        
-        current_progress = state_progress.get(session_state.current_state, 0)
+        current_progress = self.get_progress_percentage(session_state.current_state)
         
         return {
             "current_state": session_state.current_state.value,
             "progress_percentage": current_progress,
             "completed_states": [
-                state.value for state, progress in state_progress.items()
+                state.value for state, progress in STATE_PROGRESS.items()
                 if progress < current_progress
             ],
             "next_states": [
@@ -0,0 +1,166 @@
+"""Per-session serialized conversation turns with cancellation."""
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class QueuedTurn:
+    """Conversation turn waiting for, or holding, its session."""
+    
+    __slots__ = ("run", "name", "cancellable", "task")
+    
+    def __init__(self, run: Callable[[], Awaitable[Any]], name: str, cancellable: bool):
+        self.run = run
+        self.name = name
+        self.cancellable = cancellable
+        self.task: Optional[asyncio.Task] = None
+
+
+class SessionTurnQueue:
+    """
+    Run the turns of each session one at a time, in arrival order.
+    
+    Every turn loads, mutates and saves the same cached ``SessionState``,
+    so turns of one session must never interleave. Each session with work
+    gets a worker task that runs its queued turns sequentially. Submitting
+    a superseding turn (a new user message) first cancels the running turn
+    and drops queued ones that haven't started; cancellation propagates
+    into the Gemini stream and any running command, so a stale turn stops
+    spending tokens and subprocess time right away. Turns that set up the
+    session (start, resume) are never cancelled or dropped.
+    """
+    
+    def __init__(self):
+        """Initialize turn queue."""
+        self._pending: Dict[str, Deque[QueuedTurn]] = {}
+        self._current: Dict[str, QueuedTurn] = {}
+        self._workers: Dict[str, asyncio.Task] = {}
+        
+        # Metrics
+        self.turns_completed = 0
+        self.turns_failed = 0
+        self.turns_cancelled = 0
+        self.turns_dropped = 0
+    
+    def submit(
+        self,
+        session_id: str,
+        run: Callable[[], Awaitable[Any]],
+        name: str = "turn",
+        supersede: bool = False,
+        cancellable: bool = True
+    ):
+        """
+        Queue a turn for a session.
+        
+        Args:
+            session_id: Session identifier
+            run: Coroutine function performing the turn
+            name: Turn description for logs
+            supersede: Cancel the running turn and drop queued turns first
+            cancellable: Whether later superseding turns may cancel this one
+        """
+        if supersede:
+            self.cancel(session_id)
+        
+        self._pending.setdefault(session_id, deque()).append(QueuedTurn(run, name, cancellable))
+        
+        if session_id not in self._workers:
+            self._workers[session_id] = asyncio.create_task(self._worker(session_id))
+    
+    def cancel(self, session_id: str) -> int:
+        """
+        Cancel the running turn of a session and drop its queued turns.
+        
+        Args:
+            session_id: Session identifier
+        
+        Returns:
+            Number of turns cancelled or dropped
+        """
+        stopped = 0
+        
+        pending = self._pending.get(session_id)
+        if pending:
+            kept = [turn for turn in pending if not turn.cancellable]
+            dropped = len(pending) - len(kept)
+            if dropped:
+                pending.clear()
+                pending.extend(kept)
+                self.turns_dropped += dropped
+                stopped += dropped
+                logger.info(f"🗑️ Dropped {dropped} queued turns of session {session_id}")
+        
+        current = self._current.get(session_id)
+        if current and current.cancellable and current.task and not current.task.done():
+            current.task.cancel()
+            stopped += 1
+            logger.info(f"🛑 Cancelling {current.name} of session {session_id}")
+        
+        return stopped
+    
+    def is_busy(self, session_id: str) -> bool:
+        """Whether a session has a running or queued turn."""
+        return session_id in self._workers
+    
+    async def _worker(self, session_id: str):
+        """Run the queued turns of a session until none are left."""
+        pending = self._pending[session_id]
+        try:
+            while pending:
+                turn = pending.popleft()
+                turn.task = asyncio.create_task(turn.run())
+                self._current[session_id] = turn
+                
+                try:
+                    # Wait without propagating the turn's own cancellation; a
+                    # cancelled turn kills its command's whole process group,
+                    # so a superseding turn doesn't wait out an npm install
+                    await asyncio.wait({turn.task})
+                except asyncio.CancelledError:
+                    turn.task.cancel()
+                    raise
+                finally:
+                    self._current.pop(session_id, None)
+                
+                if turn.task.cancelled():
+                    self.turns_cancelled += 1
+                elif turn.task.exception() is not None:
+                    self.turns_failed += 1
+                    logger.error(
+                        f"Error in {turn.name} of session {session_id}: {turn.task.exception()}"
+                    )
+                else:
+                    self.turns_completed += 1
+        finally:
+            self._workers.pop(session_id, None)
+            if not pending:
+                self._pending.pop(session_id, None)
+    
+    async def close(self):
+        """Cancel all running and queued turns."""
+        workers = list(self._workers.values())
+        for session_id in list(self._pending):
+            self._pending[session_id].clear()
+        for worker in workers:
+            worker.cancel()
+        if workers:
+            await asyncio.gather(*workers, return_exceptions=True)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get turn queue metrics."""
+        return {
+            "busy_sessions": len(self._workers),
+            "queued_turns": sum(len(pending) for pending in self._pending.values()),
+            "turns_completed": self.turns_completed,
+            "turns_failed": self.turns_failed,
+            "turns_cancelled": self.turns_cancelled,
+            "turns_dropped": self.turns_dropped
+        }
+
+
+# Global turn queue instance
+session_turn_queue = SessionTurnQueue()
@@ -0,0 +1,250 @@
+"""Dependency graph for execution plan steps."""
+import asyncio
+import heapq
+import os
+import shlex
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+import logging
+
+from backend.models.schemas import ExecutionStep
+
+logger = logging.getLogger(__name__)
+
+# Commands whose only effect is creating the paths they are given
+PATH_CREATING_COMMANDS = {"mkdir", "touch"}
+
+# Commands that only write their output to a redirect target
+WRITING_COMMANDS = {"echo", "printf"}
+
+SHELL_OPERATORS = {"&&", "||", ";", "|", "&"}
+
+# Scope shared by every step that changes machine-wide state (system
+# packages, global package prefixes, user config). It matches no real path,
+# so such steps are serialized with each other but not with project steps.
+GLOBAL_SCOPE = "<global>"
+
+# Installers that always change machine-wide state
+SYSTEM_INSTALLERS = {
+    "apt", "apt-get", "yum", "dnf", "pacman", "zypper", "apk",
+    "brew", "port", "choco", "scoop", "snap"
+}
+
+# Installers that change machine-wide state unless pointed at a local target
+GLOBAL_UNLESS_TARGETED = {
+    "pip": {"-t", "--target", "--prefix", "--root"},
+    "pip3": {"-t", "--target", "--prefix", "--root"},
+    "gem": {"-i", "--install-dir"},
+    "cargo": {"--root"},
+    "go": set(),
+    "conda": {"-p", "--prefix"}
+}
+
+# Package-manager subcommands that install or remove packages
+INSTALL_SUBCOMMANDS = {"install", "uninstall", "remove", "add", "create", "update", "upgrade"}
+
+
+def _resolve(path: str, cwd: str) -> str:
+    """Resolve a path relative to the step's working directory."""
+    return os.path.normpath(os.path.join(cwd, os.path.expanduser(path)))
+
+
+def _overlaps(first: str, second: str) -> bool:
+    """Check whether one path is the other or one of its ancestors."""
+    if first == second:
+        return True
+    shorter, longer = sorted((first, second), key=len)
+    return longer.startswith(shorter.rstrip(os.sep) + os.sep)
+
+
+def _segments(tokens: List[str]) -> List[List[str]]:
+    """Split a tokenized command line into its simple commands."""
+    segments = [[]]
+    for token in tokens:
+        if token in SHELL_OPERATORS:
+            segments.append([])
+        else:
+            segments[-1].append(token)
+    return [segment for segment in segments if segment]
+
+
+def _changes_global_state(tokens: List[str]) -> bool:
+    """
+    Check whether a simple command installs into, or configures, something
+    shared by the whole machine rather than the project.
+    """
+    # Skip sudo and leading VAR=value assignments
+    while tokens and (tokens[0] == "sudo" or ("=" in tokens[0] and not tokens[0].startswith("-"))):
+        tokens = tokens[1:]
+    if not tokens:
+        return False
+    
+    program = tokens[0]
+    arguments = tokens[1:]
+    
+    # python -m pip ... behaves like pip
+    if program.startswith("python") and arguments[:2] == ["-m", "pip"]:
+        program, arguments = "pip", arguments[2:]
+    
+    if program in SYSTEM_INSTALLERS:
+        return True
+    
+    if program in ("npm", "pnpm"):
+        return "-g" in arguments or "--global" in arguments
+    if program == "yarn":
+        return arguments[:1] == ["global"]
+    if program == "git":
+        return arguments[:1] == ["config"] and ("--global" in arguments or "--system" in arguments)
+    
+    local_flags = GLOBAL_UNLESS_TARGETED.get(program)
+    if local_flags is None or not INSTALL_SUBCOMMANDS.intersection(arguments[:1]):
+        return False
+    return not any(argument.split("=")[0] in local_flags for argument in arguments)
+
+
+def step_scopes(step: ExecutionStep, base_dir: Optional[str] = None) -> Set[str]:
+    """
+    Work out which paths a step may touch.
+    
+    ``mkdir``/``touch`` and ``echo ... > file`` only touch their targets.
+    Anything else is assumed to touch its whole working directory plus any
+    path-like arguments. Installers without a project-local target (a bare
+    ``pip install``, ``npm install -g``, ``apt``, ``brew``, ...) and
+    ``git config --global`` also get GLOBAL_SCOPE, so they never run
+    concurrently with one another.
+    
+    Args:
+        step: Execution step
+        base_dir: Directory relative working directories resolve against
+    
+    Returns:
+        Set of absolute paths
+    """
+    cwd = os.path.abspath(_resolve(step.working_directory or ".", base_dir or os.getcwd()))
+    
+    try:
+        tokens = shlex.split(step.command)
+    except ValueError:
+        return {cwd}
+    
+    if not tokens:
+        return {cwd}
+    
+    if not SHELL_OPERATORS.intersection(tokens):
+        if tokens[0] in PATH_CREATING_COMMANDS:
+            targets = [token for token in tokens[1:] if not token.startswith("-")]
+            if targets:
+                return {_resolve(target, cwd) for target in targets}
+        
+        if tokens[0] in WRITING_COMMANDS:
+            for position, token in enumerate(tokens[:-1]):
+                if token in (">", ">>"):
+                    return {_resolve(tokens[position + 1], cwd)}
+    
+    scopes = {cwd}
+    for token in tokens[1:]:
+        if os.sep in token and not token.startswith("-") and "://" not in token:
+            scopes.add(_resolve(token, cwd))
+    
+    if any(_changes_global_state(segment) for segment in _segments(tokens)):
+        scopes.add(GLOBAL_SCOPE)
+    return scopes
+
+
+def build_step_graph(steps: List[ExecutionStep], base_dir: Optional[str] = None) -> List[Set[int]]:
+    """
+    Build the dependency graph for a list of steps.
+    
+    A step depends on every earlier step whose paths overlap its own, and
+    on any earlier steps listed in its ``depends_on`` field. Edges only
+    ever point backwards, so the result is always acyclic and running it
+    in list order is a valid schedule.
+    
+    Args:
+        steps: Steps in plan order
+        base_dir: Directory relative working directories resolve against
+    
+    Returns:
+        For each step, the indices of the steps it depends on
+    """
+    scopes = [step_scopes(step, base_dir) for step in steps]
+    dependencies: List[Set[int]] = []
+    
+    for index, step in enumerate(steps):
+        depends_on = set()
+        
+        for explicit in step.depends_on:
+            if 0 <= explicit < index:
+                depends_on.add(explicit)
+            else:
+                logger.warning(f"Ignoring invalid dependency {explicit} of step {index}: {step.description}")
+        
+        for earlier in range(index):
+            if any(_overlaps(mine, theirs) for mine in scopes[index] for theirs in scopes[earlier]):
+                depends_on.add(earlier)
+        
+        dependencies.append(depends_on)
+    
+    return dependencies
+
+
+async def run_step_graph(
+    dependencies: List[Set[int]],
+    run_step: Callable[[int], Awaitable[bool]],
+    max_workers: int,
+    stop_on_failure: bool = True
+) -> Set[int]:
+    """
+    Run steps concurrently as soon as their dependencies have succeeded.
+    
+    Args:
+        dependencies: Output of build_step_graph
+        run_step: Coroutine running one step, returns whether it succeeded
+        max_workers: Maximum number of steps running at once
+        stop_on_failure: Start no further steps once one has failed
+    
+    Returns:
+        Indices of the steps that succeeded
+    """
+    remaining = [set(depends_on) for depends_on in dependencies]
+    dependents: Dict[int, List[int]] = {index: [] for index in range(len(dependencies))}
+    for index, depends_on in enumerate(dependencies):
+        for dependency in depends_on:
+            dependents[dependency].append(index)
+    
+    # Ready steps are started lowest index first to stay close to plan order
+    ready = [index for index, depends_on in enumerate(remaining) if not depends_on]
+    heapq.heapify(ready)
+    
+    running: Dict[asyncio.Task, int] = {}
+    succeeded: Set[int] = set()
+    failed = False
+    
+    try:
+        while ready or running:
+            while ready and len(running) < max(1, max_workers) and not (failed and stop_on_failure):
+                index = heapq.heappop(ready)
+                running[asyncio.create_task(run_step(index))] = index
+            
+            if not running:
+                break
+            
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                index = running.pop(task)
+                if not task.result():
+                    failed = True
+                    continue
+                
+                succeeded.add(index)
+                for dependent in dependents[index]:
+                    remaining[dependent].discard(index)
+                    if not remaining[dependent]:
+                        heapq.heappush(ready, dependent)
+    finally:
+        # Wait for cancelled steps so they can stop their commands first
+        for task in running:
+            task.cancel()
+        if running:
+            await asyncio.wait(running)
+    
+    return succeeded
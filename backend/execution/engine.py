@@ -2,15 +2,54 @@
 import asyncio
 import os
 import json
+import signal
 from datetime import datetime
 from typing import Dict, List, Optional, Any, AsyncGenerator
 import logging
 
 from backend.models.schemas import ExecutionPlan, ExecutionStep, ExecutionResult, SessionState
 from backend.config import settings
+from backend.execution.dag import build_step_graph, run_step_graph
 
 logger = logging.getLogger(__name__)
 
+# Output is read in chunks and split into lines here, so a single line longer
+# than the StreamReader limit (64 KiB) doesn't fail the step
+OUTPUT_READ_SIZE = 65536
+
+
+async def _read_lines(stream: asyncio.StreamReader) -> AsyncGenerator[bytes, None]:
+    """Yield lines from a subprocess stream without a maximum line length."""
+    pending = b""
+    while True:
+        chunk = await stream.read(OUTPUT_READ_SIZE)
+        if not chunk:
+            break
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line
+    if pending:
+        yield pending
+
+
+async def _kill_process_group(process: asyncio.subprocess.Process):
+    """Kill a command together with every child it spawned and reap it.
+    
+    Shell commands such as ``cd app && npm install`` run under ``/bin/sh``;
+    killing only the shell would leave the real command running and keep
+    ``process.wait()`` blocked until it exits on its own.
+    """
+    if process.returncode is None:
+        try:
+            if hasattr(os, "killpg"):
+                os.killpg(process.pid, signal.SIGKILL)
+            else:
+                process.kill()
+        except ProcessLookupError:
+            pass
+    await process.wait()
+
 
 class ExecutionEngine:
     """Execute commands with streaming output and fallback support."""
@@ -19,6 +58,7 @@ class ExecutionEngine:
         """Initialize execution engine."""
         self.max_execution_time = settings.MAX_EXECUTION_TIME
         self.log_file = os.path.join(settings.LOG_DIR, "execution_log.jsonl")
+        self.max_parallel_steps = settings.EXECUTION_MAX_PARALLEL_STEPS
         
     async def execute_plan(
         self,
@@ -39,16 +79,19 @@ class ExecutionEngine:
         """
         logger.info(f"Starting execution of plan with {len(execution_plan.steps)} steps")
         
-        results = []
+        steps = execution_plan.steps
+        step_results: Dict[int, List[ExecutionResult]] = {}
         
-        for i, step in enumerate(execution_plan.steps):
+        async def run_step(i: int) -> bool:
+            step = steps[i]
+            
             # Notify start of step
             if websocket:
                 await websocket.send_json({
                     "type": "command_start",
                     "data": {
                         "step_index": i,
-                        "total_steps": len(execution_plan.steps),
+                        "total_steps": len(steps),
                         "command": step.command,
                         "description": step.description,
                         "timestamp": datetime.now().isoformat()
@@ -57,13 +100,16 @@ class ExecutionEngine:
             
             # Execute step with streaming
             result = await self.execute_step(step, i, websocket)
-            results.append(result)
+            step_results[i] = [result]
             
             # Log result
             await self._log_execution_result(result)
             
+            if result.success:
+                return True
+            
             # Check if step failed
-            if not result.success and not step.fallback_command:
+            if not step.fallback_command:
                 logger.error(f"Step {i} failed without fallback: {step.command}")
                 
                 if websocket:
@@ -76,29 +122,37 @@ class ExecutionEngine:
                         }
                     })
                 
-                # Stop execution on critical failure
-                break
+                return False
             
-            elif not result.success and step.fallback_command:
-                # Try fallback command
-                logger.warning(f"Step {i} failed, trying fallback: {step.fallback_command}")
-                
-                fallback_step = ExecutionStep(
-                    command=step.fallback_command,
-                    description=f"Fallback for: {step.description}",
-                    working_directory=step.working_directory,
-                    timeout=step.timeout
-                )
-                
-                fallback_result = await self.execute_step(fallback_step, i, websocket)
-                fallback_result.fallback_used = True
-                results.append(fallback_result)
-                
-                await self._log_execution_result(fallback_result)
-                
-                if not fallback_result.success:
-                    logger.error(f"Fallback also failed for step {i}")
-                    break
+            # Try fallback command
+            logger.warning(f"Step {i} failed, trying fallback: {step.fallback_command}")
+            
+            fallback_step = ExecutionStep(
+                command=step.fallback_command,
+                description=f"Fallback for: {step.description}",
+                working_directory=step.working_directory,
+                timeout=step.timeout
+            )
+            
+            fallback_result = await self.execute_step(fallback_step, i, websocket)
+            fallback_result.fallback_used = True
+            step_results[i].append(fallback_result)
+            
+            await self._log_execution_result(fallback_result)
+            
+            if not fallback_result.success:
+                logger.error(f"Fallback also failed for step {i}")
+                return False
+            
+            return True
+        
+        # Independent steps (sibling directories, distinct files, installs in
+        # different working directories) run concurrently; a failure stops
+        # any further steps from starting, as in sequential execution
+        dependencies = build_step_graph(steps)
+        await run_step_graph(dependencies, run_step, self.max_parallel_steps)
+        
+        results = [result for i in sorted(step_results) for result in step_results[i]]
         
         logger.info(f"Execution completed. {len(results)} commands executed")
         return results
@@ -107,7 +161,8 @@ class ExecutionEngine:
         self,
         step: ExecutionStep,
         step_index: int,
-        websocket=None
+        websocket=None,
+        shell: bool = False
     ) -> ExecutionResult:
         """
         Execute a single step with streaming output.
@@ -116,11 +171,13 @@ class ExecutionEngine:
             step: Execution step
             step_index: Index of the step
             websocket: Optional WebSocket for streaming
+            shell: Run the command through the shell (pipes, &&, quoting)
             
         Returns:
             Execution result
         """
         start_time = datetime.now()
+        process = None
         
         logger.info(f"Executing step {step_index}: {step.command}")
         
@@ -135,20 +192,31 @@ class ExecutionEngine:
             if not os.path.exists(cwd):
                 os.makedirs(cwd, exist_ok=True)
             
-            # Create subprocess
-            process = await asyncio.create_subprocess_exec(
-                *cmd_parts,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-                cwd=cwd
-            )
+            # Create subprocess in its own process group so a timeout or
+            # cancel can kill everything it started
+            if shell:
+                process = await asyncio.create_subprocess_shell(
+                    step.command,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                    cwd=cwd,
+                    start_new_session=True
+                )
+            else:
+                process = await asyncio.create_subprocess_exec(
+                    *cmd_parts,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                    cwd=cwd,
+                    start_new_session=True
+                )
             
             # Stream output
             stdout_lines = []
             stderr_lines = []
             
             async def stream_stdout():
-                async for line in process.stdout:
+                async for line in _read_lines(process.stdout):
                     line_str = line.decode('utf-8', errors='ignore').rstrip()
                     stdout_lines.append(line_str)
                     
@@ -164,7 +232,7 @@ class ExecutionEngine:
                         })
             
             async def stream_stderr():
-                async for line in process.stderr:
+                async for line in _read_lines(process.stderr):
                     line_str = line.decode('utf-8', errors='ignore').rstrip()
                     stderr_lines.append(line_str)
                     
@@ -194,16 +262,21 @@ class ExecutionEngine:
             except asyncio.TimeoutError:
                 logger.warning(f"Command timed out after {step.timeout} seconds: {step.command}")
                 
-                # Kill process
-                try:
-                    process.kill()
-                    await process.wait()
-                except:
-                    pass
+                # Kill the command and anything it spawned
+                stdout_task.cancel()
+                stderr_task.cancel()
+                await _kill_process_group(process)
                 
                 exit_code = 1
                 stderr_lines.append(f"Command timed out after {step.timeout} seconds")
             
+            except asyncio.CancelledError:
+                # Turn was cancelled - don't leave the command running
+                stdout_task.cancel()
+                stderr_task.cancel()
+                await _kill_process_group(process)
+                raise
+            
             # Calculate duration
             duration = (datetime.now() - start_time).total_seconds()
             
@@ -235,6 +308,9 @@ class ExecutionEngine:
             return result
             
         except Exception as e:
+            if process is not None:
+                await _kill_process_group(process)
+            
             duration = (datetime.now() - start_time).total_seconds()
             error_msg = str(e)
             
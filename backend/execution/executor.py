@@ -244,7 +244,16 @@ class ProjectExecutor:
                 stderr=asyncio.subprocess.PIPE
             )
             
-            stdout, stderr = await process.communicate()
+            try:
+                stdout, stderr = await process.communicate()
+            except asyncio.CancelledError:
+                # Turn was cancelled - don't leave the command running
+                try:
+                    process.kill()
+                    await process.wait()
+                except ProcessLookupError:
+                    pass
+                raise
             
             output = stdout.decode().strip()
             error_output = stderr.decode().strip()
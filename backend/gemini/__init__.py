@@ -1,7 +1,17 @@
 """Gemini integration package."""
 from .streaming_client import GeminiStreamingClient, GeminiChunkParser
+from .http_pool import GeminiConnectionPool, gemini_connection_pool
+from .response_cache import GeminiResponseCache, gemini_response_cache
+from .scheduler import GeminiRequestScheduler, RequestPriority, gemini_request_scheduler
 
 __all__ = [
     "GeminiStreamingClient",
-    "GeminiChunkParser"
+    "GeminiChunkParser",
+    "GeminiConnectionPool",
+    "gemini_connection_pool",
+    "GeminiRequestScheduler",
+    "RequestPriority",
+    "gemini_request_scheduler",
+    "GeminiResponseCache",
+    "gemini_response_cache"
 ]
\ No newline at end of file
@@ -1,20 +1,74 @@
 """Function registry for Gemini function calling."""
 import inspect
 import asyncio
-from typing import Dict, Any, Callable, List, Optional
+import os
+import shlex
+from typing import Dict, Any, Callable, List, Optional, Tuple
 from datetime import datetime
 import logging
 
-from backend.models.schemas import SessionState, ConversationState, ProjectRequirements
+from backend.models.schemas import SessionState, ConversationState, ProjectRequirements, ExecutionStep
 from backend.config import settings
 from backend.capabilities.detector import capability_detector
 from backend.planning.planner import execution_planner
 from backend.execution.engine import execution_engine
+from backend.execution.dag import build_step_graph, run_step_graph
 from backend.verification.tester import project_tester
 from backend.reporting.generator import report_generator
 
 logger = logging.getLogger(__name__)
 
+# Functions the model may not call in a state (and so isn't offered)
+STATE_BLOCKED_FUNCTIONS: Dict[ConversationState, List[str]] = {
+    ConversationState.INIT: [
+        # update_project_requirements is allowed in INIT since we auto-call it
+        "create_project_with_steps",
+        "generate_file_content",
+        "ai_generate_project_steps",
+        "validate_requirements_against_capabilities",
+        "fail_technology_and_switch"
+    ]
+}
+
+# INIT functions unblocked once project type, language and name are known
+INIT_FUNCTIONS_WITH_REQUIREMENTS = [
+    "ai_generate_project_steps",
+    "create_project_with_steps",
+    "fail_technology_and_switch"
+]
+
+
+def _requirements_ready(session_state: SessionState) -> bool:
+    """Whether the core requirements have been collected."""
+    reqs = session_state.requirements
+    return bool(reqs.project_type and reqs.language and reqs.project_name)
+
+
+def _strip_descriptions(schema: Any) -> Any:
+    """Copy of a JSON schema without its description keywords."""
+    if isinstance(schema, list):
+        return [_strip_descriptions(item) for item in schema]
+    if not isinstance(schema, dict):
+        return schema
+    
+    stripped = {}
+    for key, value in schema.items():
+        if key == "properties" and isinstance(value, dict):
+            # Property names are not keywords, keep them all
+            stripped[key] = {name: _strip_descriptions(prop) for name, prop in value.items()}
+        elif key != "description":
+            stripped[key] = _strip_descriptions(value)
+    return stripped
+
+
+def _minimal_schema(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Function schema with a one-sentence description and no parameter descriptions."""
+    return {
+        "name": schema["name"],
+        "description": schema["description"].split(". ")[0].split("\n")[0].rstrip("."),
+        "parameters": _strip_descriptions(schema["parameters"])
+    }
+
 
 class FunctionRegistry:
     """Registry for functions that Gemini can call."""
@@ -23,6 +77,9 @@ class FunctionRegistry:
         """Initialize function registry."""
         self.functions: Dict[str, Callable] = {}
         self.schemas: List[Dict[str, Any]] = []
+        self.minimal_schemas = settings.GEMINI_MINIMAL_FUNCTION_SCHEMAS
+        # (state, requirements ready, minimal) -> schemas offered
+        self._state_schemas: Dict[Tuple[ConversationState, bool, bool], List[Dict[str, Any]]] = {}
         self._register_default_functions()
     
     def register(self, name: str, description: str, parameters: Dict[str, Any]):
@@ -41,6 +98,7 @@ class FunctionRegistry:
                 "description": description,
                 "parameters": parameters
             })
+            self._state_schemas.clear()
             return func
         return decorator
     
@@ -103,7 +161,7 @@ class FunctionRegistry:
                     "status": "blocked_by_state_machine",
                     "error": validation_error,
                     "current_state": session_state.current_state.value,
-                    "allowed_functions": self._get_allowed_functions_for_state(session_state.current_state)
+                    "allowed_functions": self._get_allowed_functions_for_state(session_state)
                 }
             
             func = self.functions[func_name]
@@ -160,6 +218,46 @@ class FunctionRegistry:
         """Get all registered function schemas."""
         return self.schemas.copy()
     
+    def _blocked_functions(self, state: ConversationState, requirements_ready: bool) -> List[str]:
+        """Functions that may not be called in a state."""
+        blocked = STATE_BLOCKED_FUNCTIONS.get(state, [])
+        if state == ConversationState.INIT and requirements_ready:
+            blocked = [func for func in blocked if func not in INIT_FUNCTIONS_WITH_REQUIREMENTS]
+        return blocked
+    
+    def get_function_schemas_for_state(
+        self,
+        session_state: SessionState,
+        minimal: Optional[bool] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Get the schemas of the functions callable in the session's state.
+        
+        Subsets are computed once per state and cached, so the returned list
+        is shared and must not be modified.
+        
+        Args:
+            session_state: Current session state
+            minimal: Keep only the first sentence of function descriptions
+                and drop parameter descriptions (defaults to
+                GEMINI_MINIMAL_FUNCTION_SCHEMAS)
+            
+        Returns:
+            Function schemas to offer the model
+        """
+        if minimal is None:
+            minimal = self.minimal_schemas
+        
+        key = (session_state.current_state, _requirements_ready(session_state), minimal)
+        schemas = self._state_schemas.get(key)
+        if schemas is None:
+            blocked = set(self._blocked_functions(key[0], key[1]))
+            schemas = [schema for schema in self.schemas if schema["name"] not in blocked]
+            if minimal:
+                schemas = [_minimal_schema(schema) for schema in schemas]
+            self._state_schemas[key] = schemas
+        return schemas
+    
     def _register_default_functions(self):
         """Register default functions for the AI agent."""
         
@@ -909,6 +1007,7 @@ class FunctionRegistry:
                 except Exception as e:
                     logger.error(f"❌ Both WebSocket methods failed: {e}")
                     return False
+            pending_file_contents = {}
             try:
                 logger.info(f"🚀 Creating project with {len(steps)} AI-generated steps")
                 
@@ -987,72 +1086,21 @@ class FunctionRegistry:
                         "timestamp": datetime.now().isoformat()
                     }
                 }, session_id, websocket)
-                i =0
-                attempts = 0
-                while i < len(steps) and attempts !=5:
-                    step_num = i
-                    step_data = steps[i]
+                # Generate content for all content-less CREATE_FILE steps up front
+                # so the LLM calls overlap with each other and with command steps
+                pending_file_contents = self._prefetch_file_contents(
+                    session_state, websocket, steps, project_name, project_type
+                )
+                
+                async def run_step(index: int) -> bool:
+                    """Run one step; returns False once a technology switch is pending."""
+                    step_num = index
+                    step_data = steps[index]
                     
-                    # CRITICAL: Check for technology switch mid-execution and regenerate steps
+                    # Steps queued behind a failure that switched technology don't run
                     if getattr(session_state, 'should_regenerate_steps', False):
-                        logger.info(f"🔄 Technology switch detected during step {step_num}, regenerating steps for new technology")
-                        
-                        # Clear the flag first
-                        session_state.should_regenerate_steps = False
-                        
-                        # Regenerate steps using same logic as beginning of function
-                        try:
-                            tech = session_state.requirements.language if session_state.requirements and session_state.requirements.language else "JavaScript"
-                            framework = session_state.requirements.framework if session_state.requirements and session_state.requirements.framework else ""
-                            project_name = session_state.requirements.project_name if session_state.requirements and session_state.requirements.project_name else "project"
-                            folder_path = session_state.requirements.folder_path if session_state.requirements and session_state.requirements.folder_path else f"./{project_name}"
-                            project_type = session_state.requirements.project_type if session_state.requirements and session_state.requirements.project_type else "application"
-                            
-                            requirements_summary = f"Create a {project_type} project using {tech} + {framework}, named '{project_name}' in folder '{folder_path}'"
-                            
-                            logger.info(f"🤖 Regenerating steps mid-execution for {tech} + {framework}")
-                            regeneration_result = await self.functions["ai_generate_project_steps"](
-                                session_state, websocket, requirements_summary=requirements_summary
-                            )
-                            
-                            if regeneration_result.get("status") in ["steps_generated", "steps_generated_text"]:
-                                if regeneration_result.get("steps"):
-                                    new_steps = regeneration_result["steps"]
-                                    logger.info(f"✅ Mid-execution regenerated {len(new_steps)} steps for {tech} + {framework}")
-                                    logger.info(f"🔄 BREAKING OUT to restart with new Flutter steps: {[s['description'] for s in new_steps[:3]]}...")
-                                    
-                                    if websocket:
-                                        await websocket.send_json({
-                                            "type": "steps_regenerated_mid_execution",
-                                            "data": {
-                                                "message": f"✅ Generated {len(new_steps)} new steps for {tech} + {framework}",
-                                                "interrupted_at_step": step_num,
-                                                "new_steps_count": len(new_steps),
-                                                "technology": f"{tech} + {framework}",
-                                                "action": "restarting_execution"
-                                            }
-                                        })
-                                    
-                                    # CRITICAL FIX: Replace steps array and signal to restart
-                                    i = -1
-                                    steps = new_steps
-                                    attempts+=1
-                                    continue
-                                    
-                            logger.warning("⚠️ Mid-execution step regeneration failed, stopping execution")
-                            return {
-                                "status": "regenerate_steps_failed",
-                                "message": f"Failed to regenerate steps for {tech} + {framework}",
-                                "interrupted_at_step": step_num
-                            }
-                            
-                        except Exception as e:
-                            logger.error(f"❌ Error during mid-execution step regeneration: {e}")
-                            return {
-                                "status": "regenerate_steps_error", 
-                                "error": str(e),
-                                "interrupted_at_step": step_num
-                            }
+                        return False
+                    started_steps.add(index)
                     
                     try:
                         # Send step start notification using safe WebSocket
@@ -1075,78 +1123,16 @@ class FunctionRegistry:
                             file_path = step_data["file_path"]
                             file_content = step_data.get("file_content", "")
                             
-                            # If no file content provided, use AI to generate it
+                            # If no file content provided, use the AI content that was
+                            # generated concurrently by the pre-pass
                             if not file_content or file_content.strip() == "":
-                                try:
-                                    logger.info(f"🤖 Generating content for {file_path} using AI...")
-                                    
-                                    # Create context for AI generation
-                                    project_context = f"Creating a {project_type} project named '{project_name}'"
-                                    if session_state.requirements.language:
-                                        project_context += f" using {session_state.requirements.language}"
-                                    if session_state.requirements.framework:
-                                        project_context += f" with {session_state.requirements.framework}"
-                                    if session_state.requirements.database:
-                                        project_context += f" and {session_state.requirements.database} database"
-                                    
-                                    file_purpose = step_data.get("description", f"File for {file_path}")
-                                    
-                                    # Call AI to generate file content
-                                    from backend.gemini.streaming_client import GeminiStreamingClient
-                                    
-                                    ai_context = f"""
-Generate file content for: {file_path}
-
-Purpose: {file_purpose}
-Project Context: {project_context}
-
-Project Details:
-- Type: {session_state.requirements.project_type or 'general'}
-- Language: {session_state.requirements.language or 'JavaScript'}
-- Framework: {session_state.requirements.framework or 'generic'}
-- Name: {session_state.requirements.project_name or 'MyProject'}
-- Database: {session_state.requirements.database or 'none'}
-- Authentication: {session_state.requirements.authentication}
-- Testing: {session_state.requirements.testing}
-
-Generate appropriate, working file content that follows best practices.
-Return ONLY the file content, no explanations, no markdown code blocks.
-"""
-
-                                    messages = [{"role": "user", "content": ai_context}]
-                                    
-                                    async with GeminiStreamingClient() as client:
-                                        ai_result = await client.complete(messages, temperature=0.2)
-                                        
-                                        if "candidates" in ai_result and ai_result["candidates"]:
-                                            ai_content = ai_result["candidates"][0]["content"]["parts"][0]["text"]
-                                            
-                                            # Clean up markdown formatting
-                                            import re
-                                            if ai_content.startswith('```'):
-                                                ai_content = re.sub(r'^```[a-zA-Z]*\s*', '', ai_content)
-                                                ai_content = re.sub(r'\s*```$', '', ai_content)
-                                            
-                                            file_content = ai_content.strip()
-                                            logger.info(f"✅ AI generated {len(file_content)} characters for {file_path}")
-                                            
-                                            # Stream AI generation info to UI
-                                            if websocket:
-                                                await websocket.send_json({
-                                                    "type": "ai_file_generation",
-                                                    "data": {
-                                                        "file_path": file_path,
-                                                        "content_length": len(file_content),
-                                                        "generated_by": "AI"
-                                                    }
-                                                })
-                                        else:
-                                            logger.warning(f"AI failed to generate content for {file_path}, using placeholder")
-                                            file_content = f"// Generated file: {file_path}\n// TODO: Add implementation\n"
-                                            
-                                except Exception as e:
-                                    logger.error(f"Error generating AI content for {file_path}: {e}")
-                                    file_content = f"// Generated file: {file_path}\n// Error during AI generation: {str(e)}\n"
+                                content_task = pending_file_contents.pop(index, None)
+                                if content_task is not None:
+                                    file_content = await content_task
+                                else:
+                                    file_content = await self._generate_file_content_with_ai(
+                                        session_state, websocket, step_data, project_name, project_type
+                                    )
                             
                             # Make relative to project path
                             if not file_path.startswith("/"):
@@ -1185,8 +1171,6 @@ Return ONLY the file content, no explanations, no markdown code blocks.
                                 })
                         else:
                             # Execute shell command
-                            import subprocess
-                            import os
                             work_dir = step_data.get("working_directory", project_path)
                             
                             # Replace project placeholders
@@ -1204,7 +1188,7 @@ Return ONLY the file content, no explanations, no markdown code blocks.
                                         "command": command,
                                         "error": f"Failed to create directory {work_dir}: {e}"
                                     })
-                                    continue
+                                    return True
                             
                             logger.info(f"⚙️ Executing: {command} in {work_dir}")
                             
@@ -1221,24 +1205,28 @@ Return ONLY the file content, no explanations, no markdown code blocks.
                                     }
                                 })
                             
-                            proc = subprocess.run(
-                                command,
-                                shell=True,
-                                cwd=work_dir,
-                                capture_output=True,
-                                text=True,
-                                timeout=120
+                            # Run without blocking the event loop, streaming output lines
+                            proc = await execution_engine.execute_step(
+                                ExecutionStep(
+                                    command=command,
+                                    description=step_data["description"],
+                                    working_directory=work_dir,
+                                    timeout=120
+                                ),
+                                step_num,
+                                websocket,
+                                shell=True
                             )
                             
                             result = {
-                                "success": proc.returncode == 0,
+                                "success": proc.exit_code == 0,
                                 "output": proc.stdout,
                                 "error": proc.stderr,
-                                "return_code": proc.returncode,
+                                "return_code": proc.exit_code,
                                 "command": command
                             }
                             
-                            if proc.returncode == 0:
+                            if proc.exit_code == 0:
                                 logger.info(f"✅ Command succeeded: {command}")
                                 
                                 # Stream success to UI
@@ -1266,7 +1254,7 @@ Return ONLY the file content, no explanations, no markdown code blocks.
                                             "command": command,
                                             "error": proc.stderr[:500] if proc.stderr else "",
                                             "message": f"❌ Command failed: {command}",
-                                            "return_code": proc.returncode,
+                                            "return_code": proc.exit_code,
                                             "timestamp": datetime.now().isoformat()
                                         }
                                     })
@@ -1339,16 +1327,19 @@ Return ONLY the file content, no explanations, no markdown code blocks.
                                 logger.info(f"🔄 Trying AI alternative: {alternative_cmd}")
                                 
                                 try:
-                                    alt_proc = subprocess.run(
-                                        alternative_cmd,
-                                        shell=True,
-                                        cwd=work_dir,
-                                        capture_output=True,
-                                        text=True,
-                                        timeout=120
+                                    alt_proc = await execution_engine.execute_step(
+                                        ExecutionStep(
+                                            command=alternative_cmd,
+                                            description=f"AI alternative for: {step_data['description']}",
+                                            working_directory=work_dir,
+                                            timeout=120
+                                        ),
+                                        step_num,
+                                        websocket,
+                                        shell=True
                                     )
                                     
-                                    if alt_proc.returncode == 0:
+                                    if alt_proc.exit_code == 0:
                                         logger.info(f"✅ AI alternative succeeded: {alternative_cmd}")
                                         # Update result to show success
                                         result = {
@@ -1394,7 +1385,9 @@ Return ONLY the file content, no explanations, no markdown code blocks.
                                     session_state, websocket, command, result["error"],
                                     step_data["description"], step_num
                                 )
-                                break  # Stop current execution, let AI regenerate with new tech
+                                # Stop current execution, let AI regenerate with new tech
+                                stopped_steps.add(step_num)
+                                return False
                                 
                             else:
                                 # Unknown status, mark as failed
@@ -1408,9 +1401,96 @@ Return ONLY the file content, no explanations, no markdown code blocks.
                             "error": str(e),
                             "command": step_data["command"]
                         })
+                    
+                    # Dependents of this step don't start once a switch is pending
+                    return not getattr(session_state, 'should_regenerate_steps', False)
                 
-                    i = i+ 1
+                attempts = 0
+                while attempts != 5:
+                    started_steps = set()
+                    stopped_steps = set()
+                    
+                    # Independent steps (files, installs in different working
+                    # directories) run concurrently; dependent ones in plan order
+                    dependencies = build_step_graph(self._command_steps(steps, project_path, session_state))
+                    await run_step_graph(dependencies, run_step, execution_engine.max_parallel_steps)
+                    
+                    if stopped_steps or len(started_steps) == len(steps):
+                        break
+                    
+                    # CRITICAL: Check for technology switch mid-execution and regenerate steps
+                    if getattr(session_state, 'should_regenerate_steps', False):
+                        step_num = min(index for index in range(len(steps)) if index not in started_steps)
+                        logger.info(f"🔄 Technology switch detected during step {step_num}, regenerating steps for new technology")
+                        
+                        # Clear the flag first
+                        session_state.should_regenerate_steps = False
+                        
+                        # Regenerate steps using same logic as beginning of function
+                        try:
+                            tech = session_state.requirements.language if session_state.requirements and session_state.requirements.language else "JavaScript"
+                            framework = session_state.requirements.framework if session_state.requirements and session_state.requirements.framework else ""
+                            project_name = session_state.requirements.project_name if session_state.requirements and session_state.requirements.project_name else "project"
+                            folder_path = session_state.requirements.folder_path if session_state.requirements and session_state.requirements.folder_path else f"./{project_name}"
+                            project_type = session_state.requirements.project_type if session_state.requirements and session_state.requirements.project_type else "application"
+                            
+                            requirements_summary = f"Create a {project_type} project using {tech} + {framework}, named '{project_name}' in folder '{folder_path}'"
+                            
+                            logger.info(f"🤖 Regenerating steps mid-execution for {tech} + {framework}")
+                            regeneration_result = await self.functions["ai_generate_project_steps"](
+                                session_state, websocket, requirements_summary=requirements_summary
+                            )
+                            
+                            if regeneration_result.get("status") in ["steps_generated", "steps_generated_text"]:
+                                if regeneration_result.get("steps"):
+                                    new_steps = regeneration_result["steps"]
+                                    logger.info(f"✅ Mid-execution regenerated {len(new_steps)} steps for {tech} + {framework}")
+                                    logger.info(f"🔄 BREAKING OUT to restart with new Flutter steps: {[s['description'] for s in new_steps[:3]]}...")
+                                    
+                                    if websocket:
+                                        await websocket.send_json({
+                                            "type": "steps_regenerated_mid_execution",
+                                            "data": {
+                                                "message": f"✅ Generated {len(new_steps)} new steps for {tech} + {framework}",
+                                                "interrupted_at_step": step_num,
+                                                "new_steps_count": len(new_steps),
+                                                "technology": f"{tech} + {framework}",
+                                                "action": "restarting_execution"
+                                            }
+                                        })
+                                    
+                                    # CRITICAL FIX: Replace steps array and signal to restart
+                                    steps = new_steps
+                                    attempts+=1
+                                    
+                                    self._cancel_file_content_tasks(pending_file_contents)
+                                    pending_file_contents = self._prefetch_file_contents(
+                                        session_state, websocket, steps, project_name, project_type
+                                    )
+                                    continue
+                                    
+                            logger.warning("⚠️ Mid-execution step regeneration failed, stopping execution")
+                            self._cancel_file_content_tasks(pending_file_contents)
+                            return {
+                                "status": "regenerate_steps_failed",
+                                "message": f"Failed to regenerate steps for {tech} + {framework}",
+                                "interrupted_at_step": step_num
+                            }
+                            
+                        except Exception as e:
+                            logger.error(f"❌ Error during mid-execution step regeneration: {e}")
+                            self._cancel_file_content_tasks(pending_file_contents)
+                            return {
+                                "status": "regenerate_steps_error", 
+                                "error": str(e),
+                                "interrupted_at_step": step_num
+                            }
+                    
+                    break
 
+                # Drop generation work for steps that were never reached
+                self._cancel_file_content_tasks(pending_file_contents)
+                
                 # Check if we need to regenerate steps due to technology switch
                 if session_state.should_regenerate_steps:
                     logger.info("🔄 Technology switch occurred - steps need regeneration")
@@ -1513,12 +1593,16 @@ Return ONLY the file content, no explanations, no markdown code blocks.
                     }
                 }
                 
+            except asyncio.CancelledError:
+                # Superseded turn - stop generating content for remaining steps
+                self._cancel_file_content_tasks(pending_file_contents)
+                raise
             except Exception as e:
                 logger.error(f"💥 Exception in project creation: {e}", exc_info=True)
+                self._cancel_file_content_tasks(pending_file_contents)
                 
                 # Send error notification to UI
                 if websocket:
-                    import asyncio
                     try:
                         await websocket.send_json({
                             "type": "project_creation_error",
@@ -1990,7 +2074,7 @@ Example correct response:
                 # Import here to avoid circular import
                 from backend.gemini.streaming_client import GeminiStreamingClient
                 
-                async with GeminiStreamingClient() as client:
+                async with GeminiStreamingClient(session_id=session_state.session_id) as client:
                     result = await client.complete(messages, temperature=0.1)
                     
                     if "candidates" in result and result["candidates"]:
@@ -2084,7 +2168,7 @@ Return ONLY the file content, no explanations, no markdown code blocks, no addit
                 
                 from backend.gemini.streaming_client import GeminiStreamingClient
                 
-                async with GeminiStreamingClient() as client:
+                async with GeminiStreamingClient(session_id=session_state.session_id) as client:
                     result = await client.complete(messages, temperature=0.2)
                     
                     if "candidates" in result and result["candidates"]:
@@ -2886,8 +2970,9 @@ If no alternative exists, respond with: TECH_SWITCH_NEEDED
                 
                 messages = [{"role": "user", "content": ai_context}]
                 
-                async with GeminiStreamingClient() as client:
-                    result = await client.complete(messages, temperature=0.1)
+                async with GeminiStreamingClient(session_id=session_state.session_id) as client:
+                    # Reacts to a live failure - never reuse a cached answer
+                    result = await client.complete(messages, temperature=0.1, use_cache=False)
                     
                     if "candidates" in result and result["candidates"]:
                         ai_response = result["candidates"][0]["content"]["parts"][0]["text"].strip()
@@ -3084,8 +3169,9 @@ Return ONLY the JSON, no other text.
                 
                 messages = [{"role": "user", "content": ai_context}]
                 
-                async with GeminiStreamingClient() as client:
-                    result = await client.complete(messages, temperature=0.2)
+                async with GeminiStreamingClient(session_id=session_state.session_id) as client:
+                    # Reacts to a live failure - never reuse a cached answer
+                    result = await client.complete(messages, temperature=0.2, use_cache=False)
                     
                     if "candidates" in result and result["candidates"]:
                         ai_response = result["candidates"][0]["content"]["parts"][0]["text"].strip()
@@ -3261,6 +3347,180 @@ Return ONLY the JSON, no other text.
                     "error": str(e)
                 }
     
+    async def _generate_file_content_with_ai(
+        self,
+        session_state: SessionState,
+        websocket,
+        step_data: Dict[str, Any],
+        project_name: str,
+        project_type: Any
+    ) -> str:
+        """
+        Generate content for a CREATE_FILE step that has none.
+        
+        Never raises - falls back to a placeholder so the file is still created.
+        """
+        file_path = step_data["file_path"]
+        
+        try:
+            logger.info(f"🤖 Generating content for {file_path} using AI...")
+            
+            # Create context for AI generation
+            project_context = f"Creating a {project_type} project named '{project_name}'"
+            if session_state.requirements.language:
+                project_context += f" using {session_state.requirements.language}"
+            if session_state.requirements.framework:
+                project_context += f" with {session_state.requirements.framework}"
+            if session_state.requirements.database:
+                project_context += f" and {session_state.requirements.database} database"
+            
+            file_purpose = step_data.get("description", f"File for {file_path}")
+            
+            # Call AI to generate file content
+            from backend.gemini.streaming_client import GeminiStreamingClient
+            
+            ai_context = f"""
+Generate file content for: {file_path}
+
+Purpose: {file_purpose}
+Project Context: {project_context}
+
+Project Details:
+- Type: {session_state.requirements.project_type or 'general'}
+- Language: {session_state.requirements.language or 'JavaScript'}
+- Framework: {session_state.requirements.framework or 'generic'}
+- Name: {session_state.requirements.project_name or 'MyProject'}
+- Database: {session_state.requirements.database or 'none'}
+- Authentication: {session_state.requirements.authentication}
+- Testing: {session_state.requirements.testing}
+
+Generate appropriate, working file content that follows best practices.
+Return ONLY the file content, no explanations, no markdown code blocks.
+"""
+
+            messages = [{"role": "user", "content": ai_context}]
+            
+            async with GeminiStreamingClient(session_id=session_state.session_id) as client:
+                ai_result = await client.complete(messages, temperature=0.2)
+                
+            if "candidates" in ai_result and ai_result["candidates"]:
+                ai_content = ai_result["candidates"][0]["content"]["parts"][0]["text"]
+                
+                # Clean up markdown formatting
+                import re
+                if ai_content.startswith('```'):
+                    ai_content = re.sub(r'^```[a-zA-Z]*\s*', '', ai_content)
+                    ai_content = re.sub(r'\s*```$', '', ai_content)
+                
+                file_content = ai_content.strip()
+                logger.info(f"✅ AI generated {len(file_content)} characters for {file_path}")
+                
+                # Stream AI generation info to UI
+                if websocket:
+                    await websocket.send_json({
+                        "type": "ai_file_generation",
+                        "data": {
+                            "file_path": file_path,
+                            "content_length": len(file_content),
+                            "generated_by": "AI"
+                        }
+                    })
+                
+                return file_content
+            
+            logger.warning(f"AI failed to generate content for {file_path}, using placeholder")
+            return f"// Generated file: {file_path}\n// TODO: Add implementation\n"
+            
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error generating AI content for {file_path}: {e}")
+            return f"// Generated file: {file_path}\n// Error during AI generation: {str(e)}\n"
+    
+    def _prefetch_file_contents(
+        self,
+        session_state: SessionState,
+        websocket,
+        steps: List[Dict[str, Any]],
+        project_name: str,
+        project_type: Any
+    ) -> Dict[int, asyncio.Task]:
+        """
+        Start AI content generation for every content-less CREATE_FILE step.
+        
+        Generation runs concurrently (bounded by FILE_GENERATION_CONCURRENCY)
+        while the caller keeps executing steps and awaits each file's task
+        when it reaches that step.
+        
+        Returns:
+            Mapping of step index to the task producing its content
+        """
+        semaphore = asyncio.Semaphore(max(1, settings.FILE_GENERATION_CONCURRENCY))
+        
+        async def generate(step_data: Dict[str, Any]) -> str:
+            async with semaphore:
+                return await self._generate_file_content_with_ai(
+                    session_state, websocket, step_data, project_name, project_type
+                )
+        
+        tasks = {}
+        for index, step_data in enumerate(steps):
+            if step_data.get("command") != "CREATE_FILE" or not step_data.get("file_path"):
+                continue
+            
+            file_content = step_data.get("file_content", "")
+            if not file_content or file_content.strip() == "":
+                tasks[index] = asyncio.create_task(generate(step_data))
+        
+        if tasks:
+            logger.info(f"🤖 Generating content for {len(tasks)} files concurrently")
+        
+        return tasks
+    
+    def _command_steps(
+        self,
+        steps: List[Dict[str, Any]],
+        project_path: str,
+        session_state: SessionState
+    ) -> List[ExecutionStep]:
+        """
+        Describe project steps as ExecutionSteps for the dependency graph.
+        
+        A CREATE_FILE step only touches its file, so it is described as a
+        ``touch`` of that path relative to the project directory; command
+        steps keep their working directory and placeholders are filled in as
+        they will be when executed.
+        
+        Returns:
+            One ExecutionStep per step, in plan order
+        """
+        command_steps = []
+        for step_data in steps:
+            if step_data.get("command") == "CREATE_FILE":
+                # step_scopes resolves the target against the working directory
+                command = f"touch {shlex.quote(step_data.get('file_path') or '.')}"
+                work_dir = project_path
+            else:
+                command = step_data.get("command", "").replace("{project_path}", project_path)
+                command = command.replace("{project_name}", session_state.requirements.project_name or "project")
+                work_dir = step_data.get("working_directory", project_path)
+            
+            depends_on = step_data.get("depends_on") or []
+            command_steps.append(ExecutionStep(
+                command=command,
+                description=step_data.get("description", ""),
+                working_directory=work_dir,
+                depends_on=[index for index in depends_on if isinstance(index, int)]
+            ))
+        return command_steps
+    
+    def _cancel_file_content_tasks(self, tasks: Dict[int, asyncio.Task]):
+        """Cancel content generation for steps that will not be executed."""
+        for task in tasks.values():
+            if not task.done():
+                task.cancel()
+        tasks.clear()
+    
     async def _try_technology_switch(
         self,
         session_state: SessionState,
@@ -3554,79 +3814,24 @@ Return ONLY the JSON, no other text.
 
     def _validate_function_for_state(self, func_name: str, session_state) -> str:
         """Validate if function is allowed in current state. Returns error message if blocked."""
-        from backend.models.schemas import ConversationState
-        
         current_state = session_state.current_state
+        requirements_ready = _requirements_ready(session_state)
         
-        # Define state-based function restrictions
-        state_restrictions = {
-            ConversationState.INIT: {
-                "blocked_functions": [
-                    # Remove update_project_requirements from blocked list since we auto-call it
-                    # "update_project_requirements",  -- REMOVED
-                    "create_project_with_steps", 
-                    "generate_file_content",
-                    "ai_generate_project_steps",
-                    "validate_requirements_against_capabilities",
-                    "fail_technology_and_switch"
-                ],
-                "allowed_functions": [
-                    "request_permission",
-                    "detect_system_capabilities",
-                    "update_project_requirements"  # Now explicitly allowed in INIT
-                ]
-            }
-        }
+        if current_state == ConversationState.INIT and requirements_ready:
+            # Requirements are set, allow more functions
+            logger.info("✅ Requirements detected in INIT state, allowing more functions")
         
-        # Special case: if we're in INIT but have valid requirements, allow ASK_PROJECT_TYPE functions
-        if current_state == ConversationState.INIT:
-            reqs = session_state.requirements
-            if (reqs.project_type and reqs.language and reqs.project_name):
-                # Requirements are set, allow more functions
-                logger.info("✅ Requirements detected in INIT state, allowing more functions")
-                state_restrictions[ConversationState.INIT]["allowed_functions"].extend([
-                    "ai_generate_project_steps",
-                    "create_project_with_steps",
-                    "fail_technology_and_switch"
-                ])
-                # Remove from blocked list  
-                blocked = state_restrictions[ConversationState.INIT]["blocked_functions"]
-                for func in ["ai_generate_project_steps", "create_project_with_steps", "fail_technology_and_switch"]:
-                    if func in blocked:
-                        blocked.remove(func)
-        
-        # Check if current state has restrictions
-        if current_state in state_restrictions:
-            restrictions = state_restrictions[current_state]
-            
-            # Check if function is explicitly blocked
-            if func_name in restrictions.get("blocked_functions", []):
-                allowed = ", ".join(restrictions.get("allowed_functions", ["None"]))
-                return f"Function '{func_name}' is not allowed in {current_state.value} state. Allowed functions: {allowed}"
+        # Check if function is explicitly blocked
+        if func_name in self._blocked_functions(current_state, requirements_ready):
+            allowed = ", ".join(self._get_allowed_functions_for_state(session_state)) or "None"
+            return f"Function '{func_name}' is not allowed in {current_state.value} state. Allowed functions: {allowed}"
         
         # No restrictions found - allow function
         return None
 
-    def _get_allowed_functions_for_state(self, state) -> List[str]:
-        """Get list of allowed functions for a given state."""
-        from backend.models.schemas import ConversationState
-        
-        state_restrictions = {
-            ConversationState.INIT: [
-                "request_permission",
-                "detect_system_capabilities"
-            ],
-            ConversationState.ASK_PROJECT_TYPE: [
-                "update_project_requirements",
-                "detect_system_capabilities"
-            ],
-            ConversationState.PLANNING: [
-                "ai_generate_project_steps",
-                "create_project_with_steps"
-            ]
-        }
-        
-        return state_restrictions.get(state, ["All functions allowed"])
+    def _get_allowed_functions_for_state(self, session_state) -> List[str]:
+        """Get list of functions allowed in the session's current state."""
+        return [schema["name"] for schema in self.get_function_schemas_for_state(session_state)]
     
     async def _handle_missing_requirements(self, func_name: str, session_state, websocket) -> bool:
         """
@@ -3732,7 +3937,7 @@ Return ONLY valid JSON, no other text.
 
             messages = [{"role": "user", "content": ai_prompt}]
             
-            async with GeminiStreamingClient() as client:
+            async with GeminiStreamingClient(session_id=session_state.session_id) as client:
                 result = await client.complete(messages, temperature=0.1)
                 
                 if "candidates" in result and result["candidates"]:
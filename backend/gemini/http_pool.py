@@ -0,0 +1,79 @@
+"""Process-wide pooled HTTP session for Gemini API calls."""
+import aiohttp
+import asyncio
+import ssl
+from typing import Optional
+import logging
+
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class GeminiConnectionPool:
+    """Shared aiohttp session with keep-alive and DNS caching."""
+    
+    def __init__(self):
+        """Initialize connection pool."""
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.connector: Optional[aiohttp.TCPConnector] = None
+        self.timeout = aiohttp.ClientTimeout(total=300, connect=10)
+        self._lock = asyncio.Lock()
+    
+    @property
+    def is_running(self) -> bool:
+        """Whether the pool has an open session to lend out."""
+        return self.session is not None and not self.session.closed
+    
+    def _create_ssl_context(self) -> ssl.SSLContext:
+        """Create SSL context trusting the system certificates."""
+        ssl_context = ssl.create_default_context()
+        ssl_context.check_hostname = True
+        ssl_context.verify_mode = ssl.CERT_REQUIRED
+        return ssl_context
+    
+    async def start(self):
+        """Open the shared session. Safe to call more than once."""
+        async with self._lock:
+            if self.is_running:
+                return
+            
+            self.connector = aiohttp.TCPConnector(
+                ssl=self._create_ssl_context(),
+                limit=settings.GEMINI_POOL_LIMIT,
+                limit_per_host=settings.GEMINI_POOL_LIMIT_PER_HOST,
+                ttl_dns_cache=settings.GEMINI_DNS_CACHE_TTL,
+                use_dns_cache=True,
+                keepalive_timeout=settings.GEMINI_KEEPALIVE_TIMEOUT
+            )
+            self.session = aiohttp.ClientSession(
+                timeout=self.timeout,
+                connector=self.connector
+            )
+            
+            logger.info(
+                f"Gemini connection pool started "
+                f"(limit={settings.GEMINI_POOL_LIMIT}, per_host={settings.GEMINI_POOL_LIMIT_PER_HOST})"
+            )
+    
+    async def close(self):
+        """Close the shared session and release all pooled connections."""
+        async with self._lock:
+            if self.session:
+                try:
+                    await self.session.close()
+                except Exception as e:
+                    logger.warning(f"Error closing pooled aiohttp session: {e}")
+                finally:
+                    self.session = None
+                    self.connector = None
+            
+            logger.info("Gemini connection pool closed")
+    
+    def get_session(self) -> Optional[aiohttp.ClientSession]:
+        """Borrow the shared session, or None if the pool is not running."""
+        return self.session if self.is_running else None
+
+
+# Global connection pool instance
+gemini_connection_pool = GeminiConnectionPool()
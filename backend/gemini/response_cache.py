@@ -0,0 +1,265 @@
+"""Content-addressed cache for deterministic Gemini completions."""
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import aiofiles
+import logging
+
+from backend.config import settings
+from backend.models.serialization import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+
+class GeminiResponseCache:
+    """Two-tier (memory LRU + disk) cache keyed by a hash of the request."""
+    
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        ttl: Optional[int] = None,
+        max_entries: Optional[int] = None,
+        max_disk_bytes: Optional[int] = None
+    ):
+        """Initialize response cache from settings unless overridden."""
+        self.cache_dir = cache_dir or os.path.join(settings.DATA_DIR, "llm_cache")
+        self.ttl = ttl if ttl is not None else settings.GEMINI_CACHE_TTL
+        self.max_entries = max_entries if max_entries is not None else settings.GEMINI_CACHE_MAX_ENTRIES
+        self.max_disk_bytes = (
+            max_disk_bytes if max_disk_bytes is not None
+            else settings.GEMINI_CACHE_MAX_DISK_MB * 1024 * 1024
+        )
+        
+        # key -> (stored_at, encoded response). Entries are kept encoded and
+        # decoded on every hit, so a caller modifying its copy can't
+        # corrupt the entry for later hits.
+        self._memory: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        # key -> (size, stored_at) for files on disk, built lazily. Only
+        # changed on the event loop; file operations run in worker threads.
+        self._disk_index: Optional[Dict[str, Tuple[int, float]]] = None
+        self._disk_bytes = 0
+        self._index_lock = asyncio.Lock()
+        
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def _normalize_text(text: str) -> str:
+        """Ignore line endings and trailing whitespace; indentation still counts."""
+        lines = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+        return "\n".join(line.rstrip() for line in lines).rstrip()
+    
+    def make_key(
+        self,
+        model: str,
+        messages: List[Dict[str, Any]],
+        generation_config: Dict[str, Any],
+        functions: Optional[List[Dict[str, Any]]] = None
+    ) -> str:
+        """
+        Build the cache key for a request.
+        
+        Args:
+            model: Gemini model name
+            messages: Conversation messages
+            generation_config: Generation parameters (temperature, max tokens...)
+            functions: Optional function declarations
+        
+        Returns:
+            Hex SHA-256 digest
+        """
+        normalized = {
+            "model": model,
+            "messages": [
+                {
+                    "role": msg.get("role", "user"),
+                    "content": self._normalize_text(str(msg.get("content", "")))
+                }
+                for msg in messages
+            ],
+            "generation_config": generation_config,
+            "functions": functions or []
+        }
+        encoded = json.dumps(normalized, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+    
+    def _get_cache_file(self, key: str) -> str:
+        """Get cache file path, sharded by key prefix."""
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+    
+    def _is_fresh(self, stored_at: float) -> bool:
+        """Check whether an entry is within its TTL."""
+        return self.ttl <= 0 or (time.time() - stored_at) < self.ttl
+    
+    def _remember(self, key: str, stored_at: float, encoded: bytes):
+        """Insert into the memory tier, evicting least recently used entries."""
+        self._memory[key] = (stored_at, encoded)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+    
+    def _scan_disk(self) -> Tuple[Dict[str, Tuple[int, float]], int]:
+        """Scan the cache directory (runs in a worker thread)."""
+        index: Dict[str, Tuple[int, float]] = {}
+        total = 0
+        try:
+            for shard in os.scandir(self.cache_dir):
+                if not shard.is_dir():
+                    continue
+                for entry in os.scandir(shard.path):
+                    if entry.name.endswith(".json"):
+                        stat = entry.stat()
+                        index[entry.name[:-5]] = (stat.st_size, stat.st_mtime)
+                        total += stat.st_size
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Failed to scan LLM cache directory: {e}")
+        
+        return index, total
+    
+    async def _load_disk_index(self) -> Dict[str, Tuple[int, float]]:
+        """Scan the cache directory once to learn what is on disk."""
+        if self._disk_index is None:
+            async with self._index_lock:
+                if self._disk_index is None:
+                    index, total = await asyncio.to_thread(self._scan_disk)
+                    self._disk_index, self._disk_bytes = index, total
+        return self._disk_index
+    
+    def _delete_files(self, keys: List[str]):
+        """Delete cached files (runs in a worker thread)."""
+        for key in keys:
+            try:
+                os.remove(self._get_cache_file(key))
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.debug(f"Failed to remove LLM cache entry {key}: {e}")
+    
+    def _write_file(self, key: str, payload: str):
+        """Write a cache file atomically (runs in a worker thread)."""
+        cache_file = self._get_cache_file(key)
+        temp_file = f"{cache_file}.tmp"
+        try:
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            with open(temp_file, 'w') as f:
+                f.write(payload)
+            os.replace(temp_file, cache_file)
+        except Exception:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+            raise
+    
+    async def _remove_disk_entries(self, keys: List[str]):
+        """Delete cached files and update the index."""
+        index = await self._load_disk_index()
+        for key in keys:
+            size, _ = index.pop(key, (0, 0.0))
+            self._disk_bytes -= size
+        if keys:
+            await asyncio.to_thread(self._delete_files, keys)
+    
+    async def _evict_disk(self):
+        """Evict oldest disk entries until under the size limit."""
+        index = await self._load_disk_index()
+        if self._disk_bytes <= self.max_disk_bytes:
+            return
+        
+        excess = self._disk_bytes - self.max_disk_bytes
+        victims = []
+        for key, (size, _) in sorted(index.items(), key=lambda item: item[1][1]):
+            if excess <= 0:
+                break
+            victims.append(key)
+            excess -= size
+        await self._remove_disk_entries(victims)
+    
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached response.
+        
+        Args:
+            key: Cache key from make_key
+        
+        Returns:
+            Cached response (a fresh copy owned by the caller) or None
+        """
+        entry = self._memory.get(key)
+        if entry is not None:
+            stored_at, encoded = entry
+            if self._is_fresh(stored_at):
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return loads(encoded)
+            del self._memory[key]
+        
+        index = await self._load_disk_index()
+        if key in index:
+            try:
+                async with aiofiles.open(self._get_cache_file(key), 'r') as f:
+                    data = json.loads(await f.read())
+                
+                if self._is_fresh(data["stored_at"]):
+                    self._remember(key, data["stored_at"], dumps(data["response"]))
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return data["response"]
+            except Exception as e:
+                logger.debug(f"Failed to read LLM cache entry {key}: {e}")
+            
+            # Expired or unreadable
+            await self._remove_disk_entries([key])
+        
+        self.misses += 1
+        return None
+    
+    async def set(self, key: str, response: Dict[str, Any]):
+        """
+        Store a response in both tiers.
+        
+        Args:
+            key: Cache key from make_key
+            response: Gemini response to cache
+        """
+        stored_at = time.time()
+        self._remember(key, stored_at, dumps(response))
+        
+        try:
+            payload = json.dumps({"stored_at": stored_at, "response": response})
+            index = await self._load_disk_index()
+            await asyncio.to_thread(self._write_file, key, payload)
+            
+            old_size, _ = index.get(key, (0, 0.0))
+            index[key] = (len(payload), stored_at)
+            self._disk_bytes += len(payload) - old_size
+            await self._evict_disk()
+        except Exception as e:
+            logger.warning(f"Failed to write LLM cache entry {key}: {e}")
+    
+    async def clear(self):
+        """Drop all cached responses."""
+        self._memory.clear()
+        await self._remove_disk_entries(list((await self._load_disk_index()).keys()))
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache hit/miss and size statistics (disk figures once the index is loaded)."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "disk_entries": len(self._disk_index or {}),
+            "disk_bytes": self._disk_bytes
+        }
+
+
+# Global response cache instance
+gemini_response_cache = GeminiResponseCache()
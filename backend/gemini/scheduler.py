@@ -0,0 +1,294 @@
+"""Global scheduler for outgoing Gemini API requests."""
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+import logging
+
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class RequestPriority(IntEnum):
+    """Priority classes, lower values are dispatched first."""
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at a per-minute rate."""
+    
+    def __init__(self, per_minute: int):
+        """
+        Initialize token bucket.
+        
+        Args:
+            per_minute: Budget per minute, 0 disables the bucket
+        """
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+    
+    @property
+    def enabled(self) -> bool:
+        """Whether this bucket enforces a limit."""
+        return self.capacity > 0
+    
+    def _refill(self):
+        """Add tokens accrued since the last update."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+    
+    def delay_for(self, amount: float) -> float:
+        """Seconds until ``amount`` tokens are available (0 if available now)."""
+        if not self.enabled:
+            return 0.0
+        
+        self._refill()
+        # Requests larger than the whole bucket only wait for a full bucket
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+    
+    def consume(self, amount: float):
+        """Take tokens from the bucket, possibly going into debt."""
+        if not self.enabled:
+            return
+        
+        self._refill()
+        self.tokens -= amount
+
+
+class _Waiter:
+    """Queued request waiting for a slot."""
+    
+    __slots__ = ("future", "session_id", "priority", "tokens", "enqueued_at")
+    
+    def __init__(self, future: asyncio.Future, session_id: str, priority: RequestPriority, tokens: int):
+        self.future = future
+        self.session_id = session_id
+        self.priority = priority
+        self.tokens = tokens
+        self.enqueued_at = time.monotonic()
+
+
+class GeminiRequestScheduler:
+    """
+    Admission control for Gemini requests.
+    
+    Caps in-flight requests, enforces requests-per-minute and
+    tokens-per-minute budgets, dispatches interactive work ahead of
+    background work and round-robins between sessions within a priority
+    class so a single busy session cannot starve the others.
+    """
+    
+    def __init__(
+        self,
+        max_concurrent: Optional[int] = None,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None
+    ):
+        """Initialize scheduler from settings unless overridden."""
+        self.max_concurrent = max_concurrent if max_concurrent is not None else settings.GEMINI_MAX_CONCURRENT_REQUESTS
+        self.request_bucket = TokenBucket(
+            requests_per_minute if requests_per_minute is not None else settings.GEMINI_REQUESTS_PER_MINUTE
+        )
+        self.token_bucket = TokenBucket(
+            tokens_per_minute if tokens_per_minute is not None else settings.GEMINI_TOKENS_PER_MINUTE
+        )
+        
+        self.in_flight = 0
+        # priority -> session_id -> queued waiters (insertion order = round-robin order)
+        self._queues: Dict[RequestPriority, "OrderedDict[str, Deque[_Waiter]]"] = {
+            priority: OrderedDict() for priority in RequestPriority
+        }
+        self._retry_handle: Optional[asyncio.TimerHandle] = None
+        
+        # Metrics
+        self.total_requests = 0
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
+        self.wait_time_by_priority: Dict[RequestPriority, float] = {p: 0.0 for p in RequestPriority}
+        self.requests_by_priority: Dict[RequestPriority, int] = {p: 0 for p in RequestPriority}
+    
+    @staticmethod
+    def estimate_tokens(payload_chars: int, max_output_tokens: int = 0) -> int:
+        """Rough token estimate (~4 characters per token) for budgeting."""
+        return payload_chars // 4 + max_output_tokens
+    
+    def queue_depth(self) -> int:
+        """Total number of queued requests."""
+        return sum(
+            len(waiters)
+            for sessions in self._queues.values()
+            for waiters in sessions.values()
+        )
+    
+    @asynccontextmanager
+    async def slot(
+        self,
+        session_id: Optional[str] = None,
+        priority: RequestPriority = RequestPriority.BACKGROUND,
+        estimated_tokens: int = 0
+    ) -> AsyncIterator[None]:
+        """
+        Hold a request slot for the duration of the context.
+        
+        The slot must only cover the HTTP exchange itself. Holding it while
+        doing other work (function calls of a streamed turn, file
+        generation) would starve other sessions, and a Gemini request made
+        from inside a held slot would wait on a slot it may never get.
+        
+        Args:
+            session_id: Session the request belongs to (for fair queuing)
+            priority: Priority class
+            estimated_tokens: Estimated tokens for the TPM budget
+        """
+        await self._acquire(session_id or "_anonymous", priority, estimated_tokens)
+        try:
+            yield
+        finally:
+            self._release()
+    
+    def record_usage(self, estimated_tokens: int, actual_tokens: int):
+        """Correct the TPM budget once the real token usage is known."""
+        self.token_bucket.consume(actual_tokens - estimated_tokens)
+    
+    async def _acquire(self, session_id: str, priority: RequestPriority, tokens: int):
+        """Wait until the request may be sent."""
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(loop.create_future(), session_id, priority, tokens)
+        
+        self._queues[priority].setdefault(session_id, deque()).append(waiter)
+        self._dispatch()
+        
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Slot was granted just before cancellation - hand it back
+                self._release()
+            else:
+                self._remove(waiter)
+            raise
+    
+    def _release(self):
+        """Return a slot and wake queued requests."""
+        self.in_flight -= 1
+        self._dispatch()
+    
+    def _remove(self, waiter: _Waiter):
+        """Drop a cancelled waiter from its queue."""
+        sessions = self._queues[waiter.priority]
+        waiters = sessions.get(waiter.session_id)
+        if waiters is None:
+            return
+        try:
+            waiters.remove(waiter)
+        except ValueError:
+            pass
+        if not waiters:
+            del sessions[waiter.session_id]
+    
+    def _rate_delay(self, tokens: int) -> float:
+        """Seconds until both rate budgets allow one more request."""
+        return max(self.request_bucket.delay_for(1), self.token_bucket.delay_for(tokens))
+    
+    def _next_waiter(self) -> Optional[_Waiter]:
+        """Peek the next waiter: highest priority, round-robin across sessions."""
+        for priority in RequestPriority:
+            sessions = self._queues[priority]
+            if sessions:
+                session_id = next(iter(sessions))
+                return sessions[session_id][0]
+        return None
+    
+    def _pop_waiter(self, waiter: _Waiter):
+        """Remove a dispatched waiter and rotate its session to the back."""
+        sessions = self._queues[waiter.priority]
+        waiters = sessions.pop(waiter.session_id)
+        waiters.popleft()
+        if waiters:
+            sessions[waiter.session_id] = waiters
+    
+    def _admit(self, waiter: _Waiter):
+        """Charge budgets and record metrics for an admitted request."""
+        self.request_bucket.consume(1)
+        self.token_bucket.consume(waiter.tokens)
+        
+        wait_time = time.monotonic() - waiter.enqueued_at
+        self.total_requests += 1
+        self.total_wait_time += wait_time
+        self.max_wait_time = max(self.max_wait_time, wait_time)
+        self.requests_by_priority[waiter.priority] += 1
+        self.wait_time_by_priority[waiter.priority] += wait_time
+        
+        if wait_time > 1:
+            logger.info(f"Gemini request for {waiter.session_id} waited {wait_time:.2f}s in scheduler queue")
+    
+    def _dispatch(self):
+        """Grant slots to queued requests while capacity and budget allow."""
+        if self._retry_handle is not None:
+            self._retry_handle.cancel()
+            self._retry_handle = None
+        
+        while self.in_flight < self.max_concurrent:
+            waiter = self._next_waiter()
+            if waiter is None:
+                return
+            
+            if waiter.future.done():
+                # Cancelled while queued
+                self._pop_waiter(waiter)
+                continue
+            
+            delay = self._rate_delay(waiter.tokens)
+            if delay > 0:
+                # Out of budget - try again once enough tokens have accrued
+                loop = asyncio.get_running_loop()
+                self._retry_handle = loop.call_later(delay, self._dispatch)
+                return
+            
+            self._pop_waiter(waiter)
+            self._admit(waiter)
+            self.in_flight += 1
+            waiter.future.set_result(None)
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get queue depth, wait time and budget metrics."""
+        return {
+            "in_flight": self.in_flight,
+            "max_concurrent": self.max_concurrent,
+            "queue_depth": self.queue_depth(),
+            "queue_depth_by_priority": {
+                priority.name.lower(): sum(len(w) for w in self._queues[priority].values())
+                for priority in RequestPriority
+            },
+            "queued_sessions": len({
+                session_id
+                for sessions in self._queues.values()
+                for session_id in sessions
+            }),
+            "total_requests": self.total_requests,
+            "average_wait_time": self.total_wait_time / self.total_requests if self.total_requests else 0.0,
+            "max_wait_time": self.max_wait_time,
+            "average_wait_time_by_priority": {
+                priority.name.lower(): (
+                    self.wait_time_by_priority[priority] / self.requests_by_priority[priority]
+                    if self.requests_by_priority[priority] else 0.0
+                )
+                for priority in RequestPriority
+            },
+            "requests_budget_remaining": self.request_bucket.tokens if self.request_bucket.enabled else None,
+            "tokens_budget_remaining": self.token_bucket.tokens if self.token_bucket.enabled else None
+        }
+
+
+# Global request scheduler instance
+gemini_request_scheduler = GeminiRequestScheduler()
@@ -10,6 +10,9 @@ import logging
 from tenacity import retry, stop_after_attempt, wait_exponential
 
 from backend.config import settings
+from backend.gemini.http_pool import gemini_connection_pool
+from backend.gemini.scheduler import gemini_request_scheduler, RequestPriority
+from backend.gemini.response_cache import gemini_response_cache
 from backend.models.schemas import (
     GeminiMessage,
     GeminiStreamChunk,
@@ -18,19 +21,45 @@ from backend.models.schemas import (
 
 logger = logging.getLogger(__name__)
 
+# Queued after the last event of a streamed response
+_STREAM_END = object()
+
+
+def _retrieve_error(task: asyncio.Task):
+    """Mark a reader's error as seen when the stream already ended without it."""
+    if not task.cancelled():
+        task.exception()
+
 
 class GeminiStreamingClient:
     """Raw HTTP/SSE client for Gemini API."""
     
-    def __init__(self, api_key: Optional[str] = None):
-        """Initialize Gemini client."""
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        session_id: Optional[str] = None,
+        priority: RequestPriority = RequestPriority.BACKGROUND
+    ):
+        """
+        Initialize Gemini client.
+        
+        Args:
+            api_key: Optional API key, defaults to settings
+            session_id: Session the requests belong to (for fair scheduling)
+            priority: Scheduler priority class for this client's requests
+        """
         self.api_key = api_key or settings.GEMINI_API_KEY
         if not self.api_key:
             raise ValueError("Gemini API key is required")
         
+        self.session_id = session_id
+        self.priority = priority
+        self.scheduler = gemini_request_scheduler
+        self.response_cache = gemini_response_cache
         self.base_url = settings.GEMINI_API_URL
         self.model = settings.GEMINI_MODEL
         self.session = None
+        self._owns_session = False
         self.timeout = aiohttp.ClientTimeout(total=300, connect=10)
         
         # Create SSL context with certifi certificates
@@ -38,6 +67,14 @@ class GeminiStreamingClient:
         
     async def __aenter__(self):
         """Async context manager entry."""
+        # Borrow the process-wide pooled session when the app is running so
+        # warm keep-alive connections are reused across calls
+        pooled_session = gemini_connection_pool.get_session()
+        if pooled_session is not None:
+            self.session = pooled_session
+            self._owns_session = False
+            return self
+        
         # Create TCP connector with proper SSL context
         import ssl
         ssl_context = ssl.create_default_context()
@@ -47,10 +84,16 @@ class GeminiStreamingClient:
         
         self.connector = aiohttp.TCPConnector(ssl=ssl_context)
         self.session = aiohttp.ClientSession(timeout=self.timeout, connector=self.connector)
+        self._owns_session = True
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         """Async context manager exit."""
+        if not self._owns_session:
+            # Pooled session is closed by the application lifespan
+            self.session = None
+            return
+        
         if self.session:
             try:
                 await self.session.close()
@@ -123,6 +166,136 @@ class GeminiStreamingClient:
         
         return payload
     
+    def _estimate_tokens(self, payload: Dict[str, Any]) -> int:
+        """Estimate prompt tokens of a request for the scheduler's TPM budget."""
+        return self.scheduler.estimate_tokens(len(json.dumps(payload)))
+    
+    def _record_usage(self, response_data: Dict[str, Any], estimated_tokens: int):
+        """Report actual token usage back to the scheduler when Gemini includes it."""
+        usage = response_data.get("usageMetadata") if isinstance(response_data, dict) else None
+        if usage and usage.get("totalTokenCount") and "finishReason" in (response_data.get("candidates") or [{}])[0]:
+            self.scheduler.record_usage(estimated_tokens, usage["totalTokenCount"])
+    
+    async def _iter_sse_events(
+        self,
+        response: aiohttp.ClientResponse
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        Incrementally parse a server-sent event stream.
+        
+        Args:
+            response: Open streaming response
+            
+        Yields:
+            Decoded JSON payload of each ``data:`` event
+        """
+        data_lines: List[str] = []
+        buffer = b""
+        
+        # Read raw chunks rather than readline() so that large events
+        # (e.g. generated file contents) are not limited by line size
+        async for raw_chunk in response.content.iter_any():
+            buffer += raw_chunk
+            
+            while b"\n" in buffer:
+                raw_line, buffer = buffer.split(b"\n", 1)
+                line = raw_line.decode("utf-8", errors="ignore").rstrip("\r")
+                
+                # Blank line terminates the current event
+                if not line:
+                    if data_lines:
+                        event = self._decode_sse_data(data_lines)
+                        data_lines = []
+                        if event is not None:
+                            yield event
+                    continue
+                
+                # Comments / keep-alives
+                if line.startswith(":"):
+                    continue
+                
+                if line.startswith("data:"):
+                    data_lines.append(line[5:].lstrip())
+        
+        line = buffer.decode("utf-8", errors="ignore").strip()
+        if line.startswith("data:"):
+            data_lines.append(line[5:].lstrip())
+        
+        # Flush a trailing event that was not followed by a blank line
+        if data_lines:
+            event = self._decode_sse_data(data_lines)
+            if event is not None:
+                yield event
+    
+    def _decode_sse_data(self, data_lines: List[str]) -> Optional[Dict[str, Any]]:
+        """Decode the joined data lines of a single SSE event."""
+        data = "\n".join(data_lines)
+        if not data or data == "[DONE]":
+            return None
+        
+        try:
+            return json.loads(data)
+        except json.JSONDecodeError as e:
+            logger.warning(f"Skipping malformed SSE event: {e}")
+            return None
+    
+    def _parse_chunk_data(
+        self,
+        chunk_data: Dict[str, Any],
+        accumulated_content: str
+    ) -> List[GeminiStreamChunk]:
+        """
+        Convert one Gemini response object into stream chunks.
+        
+        Args:
+            chunk_data: Decoded ``GenerateContentResponse`` payload
+            accumulated_content: Text accumulated so far
+            
+        Returns:
+            Parsed chunks in arrival order
+        """
+        chunks = []
+        
+        if not chunk_data.get("candidates"):
+            return chunks
+        
+        candidate = chunk_data["candidates"][0]
+        
+        # Check for text content and function calls
+        if "content" in candidate and "parts" in candidate["content"]:
+            for part in candidate["content"]["parts"]:
+                if "text" in part:
+                    text_chunk = part["text"]
+                    accumulated_content += text_chunk
+                    
+                    chunks.append(GeminiStreamChunk(
+                        type="text",
+                        content=text_chunk,
+                        accumulated_content=accumulated_content
+                    ))
+                
+                elif "functionCall" in part:
+                    func_call = part["functionCall"]
+                    
+                    chunks.append(GeminiStreamChunk(
+                        type="function_call",
+                        function_call=GeminiFunctionCall(
+                            name=func_call.get("name"),
+                            arguments=func_call.get("args", {})
+                        ),
+                        accumulated_content=accumulated_content
+                    ))
+        
+        # Check for finish reason
+        if "finishReason" in candidate:
+            chunks.append(GeminiStreamChunk(
+                type="finish",
+                finish_reason=candidate["finishReason"],
+                accumulated_content=accumulated_content
+            ))
+        
+        return chunks
+    
     @retry(
         stop=stop_after_attempt(3),
         wait=wait_exponential(multiplier=1, min=4, max=10)
@@ -158,92 +331,55 @@ class GeminiStreamingClient:
             messages, functions, temperature, max_tokens
         )
         
-        # API endpoint with streaming
+        # API endpoint with streaming - alt=sse makes Gemini emit one
+        # server-sent event per chunk instead of a single JSON array
         url = f"{self.base_url}/models/{self.model}:streamGenerateContent"
         params = {
-            "key": self.api_key
+            "key": self.api_key,
+            "alt": "sse"
         }
         
         accumulated_content = ""
+        estimated_tokens = self._estimate_tokens(payload)
+        
+        # A separate task reads the response while holding the scheduler
+        # slot, so the slot is released as soon as the body is read. The
+        # consumer (which may run function calls between chunks) never
+        # holds it, and tasks it spawns don't run inside it.
+        events: asyncio.Queue = asyncio.Queue()
+        reader = asyncio.create_task(self._read_stream(
+            url, headers, payload, params, estimated_tokens, events
+        ))
+        reader.add_done_callback(_retrieve_error)
         
         try:
-            async with self.session.post(
-                url,
-                headers=headers,
-                json=payload,
-                params=params
-            ) as response:
-                if response.status != 200:
-                    error_text = await response.text()
-                    logger.error(f"Gemini API error: {response.status} - {error_text}")
-                    raise Exception(f"Gemini API error: {response.status}")
+            # Process events incrementally as they arrive on the wire
+            finished = False
+            while True:
+                chunk_data = await events.get()
+                if chunk_data is _STREAM_END:
+                    break
                 
-                # Process streaming response - Gemini returns list of chunks
-                response_data = await response.json()
+                for chunk in self._parse_chunk_data(chunk_data, accumulated_content):
+                    accumulated_content = chunk.accumulated_content
+                    yield chunk
+                    
+                    if chunk.type == "finish":
+                        finished = True
                 
-                if isinstance(response_data, list):
-                    # Process each chunk in the response
-                    for chunk_data in response_data:
-                        if "candidates" in chunk_data and chunk_data["candidates"]:
-                            candidate = chunk_data["candidates"][0]
-                            
-                            # Check for text content
-                            if "content" in candidate and "parts" in candidate["content"]:
-                                for part in candidate["content"]["parts"]:
-                                    if "text" in part:
-                                        text_chunk = part["text"]
-                                        accumulated_content += text_chunk
-                                        
-                                        yield GeminiStreamChunk(
-                                            type="text",
-                                            content=text_chunk,
-                                            accumulated_content=accumulated_content
-                                        )
-                                    
-                                    elif "functionCall" in part:
-                                        func_call = part["functionCall"]
-                                        
-                                        yield GeminiStreamChunk(
-                                            type="function_call",
-                                            function_call=GeminiFunctionCall(
-                                                name=func_call.get("name"),
-                                                arguments=func_call.get("args", {})
-                                            ),
-                                            accumulated_content=accumulated_content
-                                        )
-                            
-                            # Check for finish reason
-                            if "finishReason" in candidate:
-                                yield GeminiStreamChunk(
-                                    type="finish",
-                                    finish_reason=candidate["finishReason"],
-                                    accumulated_content=accumulated_content
-                                )
-                                return
-                else:
-                    # Handle single response (fallback)
-                    if "candidates" in response_data and response_data["candidates"]:
-                        candidate = response_data["candidates"][0]
-                        
-                        if "content" in candidate and "parts" in candidate["content"]:
-                            for part in candidate["content"]["parts"]:
-                                if "text" in part:
-                                    text = part["text"]
-                                    accumulated_content += text
-                                    
-                                    yield GeminiStreamChunk(
-                                        type="text",
-                                        content=text,
-                                        accumulated_content=accumulated_content
-                                    )
+                if finished:
+                    return
+            
+            # Re-raise errors from the reader
+            await reader
+            
+            # Stream closed without an explicit finish reason
+            yield GeminiStreamChunk(
+                type="finish",
+                finish_reason="STOP",
+                accumulated_content=accumulated_content
+            )
                         
-                        finish_reason = candidate.get("finishReason", "stop")
-                        yield GeminiStreamChunk(
-                            type="finish",
-                            finish_reason=finish_reason,
-                            accumulated_content=accumulated_content
-                        )
-                            
         except asyncio.TimeoutError:
             logger.error("Request to Gemini API timed out")
             raise
@@ -253,22 +389,73 @@ class GeminiStreamingClient:
         except Exception as e:
             logger.error(f"Unexpected error in stream_completion: {e}")
             raise
+        finally:
+            # Stops reading (and frees the slot) if the consumer stopped early
+            reader.cancel()
+    
+    async def _read_stream(
+        self,
+        url: str,
+        headers: Dict[str, str],
+        payload: Dict[str, Any],
+        params: Dict[str, str],
+        estimated_tokens: int,
+        events: asyncio.Queue
+    ):
+        """
+        Read a streamed response into a queue while holding a scheduler slot.
+        
+        Args:
+            url: Streaming endpoint
+            headers: Request headers
+            payload: Request payload
+            params: Query parameters
+            estimated_tokens: Estimated tokens for the TPM budget
+            events: Queue receiving decoded events, then ``_STREAM_END``
+        """
+        try:
+            async with self.scheduler.slot(
+                session_id=self.session_id,
+                priority=self.priority,
+                estimated_tokens=estimated_tokens
+            ), self.session.post(
+                url,
+                headers=headers,
+                json=payload,
+                params=params
+            ) as response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    logger.error(f"Gemini API error: {response.status} - {error_text}")
+                    raise Exception(f"Gemini API error: {response.status}")
+                
+                async for chunk_data in self._iter_sse_events(response):
+                    self._record_usage(chunk_data, estimated_tokens)
+                    events.put_nowait(chunk_data)
+        finally:
+            events.put_nowait(_STREAM_END)
     
     async def complete(
         self,
         messages: List[Dict[str, Any]],
         functions: Optional[List[Dict[str, Any]]] = None,
         temperature: float = 0.7,
-        max_tokens: int = 8192
+        max_tokens: int = 8192,
+        use_cache: bool = True
     ) -> Dict[str, Any]:
         """
         Get non-streaming completion from Gemini.
         
+        Low-temperature completions are served from the response cache when an
+        identical request (model, normalized messages, generation config) was
+        answered before.
+        
         Args:
             messages: Conversation history
             functions: Optional function declarations
             temperature: Sampling temperature
             max_tokens: Maximum output tokens
+            use_cache: Set to False to always call the API
             
         Returns:
             Complete response as dictionary
@@ -285,12 +472,32 @@ class GeminiStreamingClient:
             messages, functions, temperature, max_tokens
         )
         
+        cache_key = None
+        if (
+            use_cache
+            and settings.GEMINI_CACHE_ENABLED
+            and temperature <= settings.GEMINI_CACHE_MAX_TEMPERATURE
+        ):
+            cache_key = self.response_cache.make_key(
+                self.model, messages, payload["generationConfig"], functions
+            )
+            cached = await self.response_cache.get(cache_key)
+            if cached is not None:
+                logger.debug(f"Gemini response cache hit: {cache_key[:12]}")
+                return cached
+        
         # API endpoint without streaming
         url = f"{self.base_url}/models/{self.model}:generateContent"
         params = {"key": self.api_key}
         
+        estimated_tokens = self._estimate_tokens(payload)
+        
         try:
-            async with self.session.post(
+            async with self.scheduler.slot(
+                session_id=self.session_id,
+                priority=self.priority,
+                estimated_tokens=estimated_tokens
+            ), self.session.post(
                 url,
                 headers=headers,
                 json=payload,
@@ -301,7 +508,14 @@ class GeminiStreamingClient:
                     logger.error(f"Gemini API error: {response.status} - {error_text}")
                     raise Exception(f"Gemini API error: {response.status}")
                 
-                return await response.json()
+                response_data = await response.json()
+                self._record_usage(response_data, estimated_tokens)
+                
+                # Only cache usable answers
+                if cache_key and response_data.get("candidates"):
+                    await self.response_cache.set(cache_key, response_data)
+                
+                return response_data
                 
         except Exception as e:
             logger.error(f"Error in complete: {e}")
@@ -316,6 +530,7 @@ class GeminiChunkParser:
         self.partial_content = ""
         self.partial_function_call = {}
         self.current_function_args = ""
+        self.chunk_seq = 0
         
     async def process_chunk(
         self,
@@ -343,18 +558,22 @@ class GeminiChunkParser:
         
         # Handle text chunks
         if chunk.type == "text":
+            offset = len(self.partial_content)
             self.partial_content += chunk.content
             result["content"] = chunk.content
             
-            # Stream to UI immediately
+            # Stream the delta to UI immediately; seq/offset let the client
+            # detect gaps without resending the accumulated text
             if websocket:
                 await websocket.send_json({
                     "type": "ai_message_chunk",
                     "data": {
                         "chunk": chunk.content,
-                        "accumulated": self.partial_content
+                        "seq": self.chunk_seq,
+                        "offset": offset
                     }
                 })
+            self.chunk_seq += 1
             
             # Update session state incrementally
             session_state["partial_response"] = self.partial_content
@@ -389,5 +608,6 @@ class GeminiChunkParser:
             # Reset parser state
             self.partial_content = ""
             self.partial_function_call = {}
+            self.chunk_seq = 0
         
         return result
\ No newline at end of file
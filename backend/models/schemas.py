@@ -1,5 +1,5 @@
 """Pydantic models and schemas."""
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, Field, PrivateAttr, field_validator
 from typing import Dict, List, Optional, Any, Union
 from enum import Enum
 from datetime import datetime
@@ -43,7 +43,23 @@ class Permission(BaseModel):
     revoked: Optional[datetime] = None
 
 
-class ProjectRequirements(BaseModel):
+class VersionedModel(BaseModel):
+    """Model counting field assignments, so text derived from it can be cached."""
+    _version: int = PrivateAttr(default=0)
+    
+    def __setattr__(self, name: str, value: Any):
+        """Set a field and bump the version."""
+        super().__setattr__(name, value)
+        if not name.startswith("_"):
+            self._version += 1
+    
+    @property
+    def version(self) -> int:
+        """Number of field assignments since the model was created."""
+        return self._version
+
+
+class ProjectRequirements(VersionedModel):
     """Project requirements collected from user."""
     project_type: Optional[ProjectType] = None
     language: Optional[str] = None
@@ -124,7 +140,7 @@ class ProjectRequirements(BaseModel):
         return v
 
 
-class SystemCapability(BaseModel):
+class SystemCapability(VersionedModel):
     """System capability detection result."""
     os: str = Field(..., description="Operating system")
     shell: str = Field(..., description="Shell type")
@@ -149,6 +165,7 @@ class ExecutionStep(BaseModel):
     timeout: int = Field(default=30, description="Timeout in seconds")
     retry_count: int = Field(default=0)
     requires_permission: bool = Field(default=False)
+    depends_on: List[int] = Field(default_factory=list, description="Indices of earlier steps that must finish first")
 
 
 class ExecutionPlan(BaseModel):
@@ -188,6 +205,8 @@ class SessionState(BaseModel):
     execution_plan: Optional[ExecutionPlan] = None
     execution_results: List[ExecutionResult] = Field(default_factory=list)
     conversation_history: List[Dict[str, Any]] = Field(default_factory=list)
+    conversation_summary: List[str] = Field(default_factory=list)
+    summarized_message_count: int = 0
     pending_question: Optional[Dict[str, Any]] = None
     waiting_for_user: bool = False
     completion_percentage: float = 0.0
@@ -0,0 +1,110 @@
+"""Fast serialization for session persistence and the WebSocket wire."""
+from typing import Any, Dict, Union
+import logging
+
+import orjson
+from pydantic_core import to_jsonable_python
+
+from backend.config import settings
+from backend.models.schemas import SessionState
+
+try:
+    import msgpack
+except ImportError:  # Optional, only needed for SESSION_CODEC=msgpack
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+# Raised for malformed JSON (a subclass of json.JSONDecodeError)
+DecodeError = orjson.JSONDecodeError
+
+# SessionState lists of plain dicts that only this app writes. They are
+# attached as decoded instead of being validated item by item.
+TRUSTED_LIST_FIELDS = ("conversation_history", "function_results", "state_history")
+
+_JSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def dumps(value: Any) -> bytes:
+    """Serialize a value to compact JSON bytes, handling pydantic models."""
+    return orjson.dumps(value, default=to_jsonable_python, option=_JSON_OPTIONS)
+
+
+def dumps_text(value: Any) -> str:
+    """Serialize a value to a compact JSON string."""
+    return dumps(value).decode("utf-8")
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """Parse JSON bytes or text."""
+    return orjson.loads(data)
+
+
+def _document_codec() -> str:
+    """Codec for whole documents on disk, per SESSION_CODEC."""
+    if settings.SESSION_CODEC == "msgpack":
+        if msgpack is not None:
+            return "msgpack"
+        logger.warning("SESSION_CODEC=msgpack but msgpack is not installed, using JSON")
+    return "json"
+
+
+def dump_document(value: Any) -> bytes:
+    """
+    Serialize a whole document (session snapshot, checkpoint) for disk.
+    
+    Args:
+        value: JSON-compatible value
+    
+    Returns:
+        JSON bytes, or MessagePack bytes if SESSION_CODEC is msgpack
+    """
+    if _document_codec() == "msgpack":
+        return msgpack.packb(value, default=to_jsonable_python, use_bin_type=True)
+    return dumps(value)
+
+
+def load_document(data: bytes) -> Any:
+    """
+    Parse a document written by dump_document with either codec.
+    
+    JSON documents are objects and start with ``{``, which is never the
+    first byte of a MessagePack map, so switching SESSION_CODEC keeps
+    existing files readable.
+    
+    Raises:
+        DecodeError: If a JSON document is malformed
+        RuntimeError: If the document is MessagePack but msgpack isn't installed
+    """
+    if data.lstrip()[:1] == b"{":
+        return loads(data)
+    if msgpack is None:
+        raise RuntimeError("Document is MessagePack encoded but msgpack is not installed")
+    return msgpack.unpackb(data, raw=False)
+
+
+def hydrate_session(data: Dict[str, Any]) -> SessionState:
+    """
+    Build a SessionState from stored data.
+    
+    Only the small, structured fields go through full validation. The
+    long message/result lists are attached as they were decoded, so
+    validation cost no longer grows with conversation length.
+    
+    Args:
+        data: Decoded session data
+    
+    Returns:
+        Session state
+    """
+    data = dict(data)
+    trusted = {}
+    for field in TRUSTED_LIST_FIELDS:
+        items = data.get(field)
+        if isinstance(items, list) and all(isinstance(item, dict) for item in items):
+            trusted[field] = data.pop(field)
+    
+    session_state = SessionState.model_validate(data)
+    for field, items in trusted.items():
+        setattr(session_state, field, items)
+    return session_state
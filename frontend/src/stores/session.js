@@ -28,6 +28,10 @@ export const useSessionStore = defineStore('session', () => {
   const completionPercentage = ref(0)
   const errorMessage = ref(null)
   const isLoading = ref(false)
+  const stateVersion = ref(null)
+
+  // Full session state as last synced, which server patches apply to
+  let stateSnapshot = null
 
   // Computed
   const isSessionActive = computed(() => !!currentSession.value)
@@ -80,9 +84,12 @@ export const useSessionStore = defineStore('session', () => {
     }
   }
 
-  function updateFromSessionState(sessionState) {
+  function updateFromSessionState(sessionState, version = null) {
     if (!sessionState) return
 
+    stateSnapshot = sessionState
+    stateVersion.value = version ?? sessionState.state_version ?? null
+
     currentState.value = sessionState.current_state
     requirements.value = { ...requirements.value, ...sessionState.requirements }
     systemCapabilities.value = sessionState.capabilities
@@ -100,6 +107,59 @@ export const useSessionStore = defineStore('session', () => {
     }
   }
 
+  // Apply a JSON-patch-style delta; returns false if it doesn't follow the held version
+  function applyStatePatch(baseVersion, version, patch) {
+    if (!stateSnapshot || stateVersion.value !== baseVersion) {
+      return false
+    }
+
+    // Copy each container on a patched path once, so changed fields get new identities
+    const copied = new WeakSet()
+    const copy = (value) => {
+      const clone = Array.isArray(value) ? [...value] : { ...value }
+      copied.add(clone)
+      return clone
+    }
+    const root = copy(stateSnapshot)
+
+    for (const operation of patch) {
+      const tokens = operation.path
+        .split('/')
+        .slice(1)
+        .map(token => token.replace(/~1/g, '/').replace(/~0/g, '~'))
+      const key = tokens.pop()
+
+      let parent = root
+      for (const token of tokens) {
+        if (!copied.has(parent[token])) {
+          parent[token] = copy(parent[token])
+        }
+        parent = parent[token]
+      }
+
+      if (Array.isArray(parent)) {
+        if (operation.op === 'add') {
+          if (key === '-') {
+            parent.push(operation.value)
+          } else {
+            parent.splice(Number(key), 0, operation.value)
+          }
+        } else if (operation.op === 'remove') {
+          parent.splice(Number(key), 1)
+        } else {
+          parent[Number(key)] = operation.value
+        }
+      } else if (operation.op === 'remove') {
+        delete parent[key]
+      } else {
+        parent[key] = operation.value
+      }
+    }
+
+    updateFromSessionState(root, version)
+    return true
+  }
+
   function addMessage(role, content, metadata = {}) {
     const message = {
       role,
@@ -251,6 +311,8 @@ export const useSessionStore = defineStore('session', () => {
     completionPercentage.value = 0
     errorMessage.value = null
     isLoading.value = false
+    stateVersion.value = null
+    stateSnapshot = null
   }
 
   // Save session state to backend
@@ -285,6 +347,7 @@ export const useSessionStore = defineStore('session', () => {
     completionPercentage,
     errorMessage,
     isLoading,
+    stateVersion,
 
     // Computed
     isSessionActive,
@@ -296,6 +359,7 @@ export const useSessionStore = defineStore('session', () => {
     initializeSession,
     loadSessionData,
     updateFromSessionState,
+    applyStatePatch,
     addMessage,
     updateRequirement,
     updateState,
@@ -87,9 +87,11 @@ export const useWebSocketStore = defineStore('websocket', () => {
     })
   }
 
-  function requestSessionState() {
+  function requestSessionState(full = false) {
+    const sessionStore = useSessionStore()
     sendMessage({
-      type: 'get_session_state'
+      type: 'get_session_state',
+      data: { state_version: sessionStore.stateVersion, full }
     })
   }
 
@@ -149,12 +151,18 @@ export const useWebSocketStore = defineStore('websocket', () => {
   function handleMessage(event) {
     try {
       const message = JSON.parse(event.data)
-      lastMessage.value = message
       
-      console.log('📨 WebSocket Received message:', message.type, message.data)
+      // The server batches bursts of frames (streamed text, command output)
+      const messages = message.type === 'batch' ? message.data.messages : [message]
       
-      // Handle different message types
-      processMessage(message)
+      for (const item of messages) {
+        lastMessage.value = item
+        
+        console.log('📨 WebSocket Received message:', item.type, item.data)
+        
+        // Handle different message types
+        processMessage(item)
+      }
       
     } catch (error) {
       console.error('Failed to parse WebSocket message:', error)
@@ -241,8 +249,13 @@ export const useWebSocketStore = defineStore('websocket', () => {
         break
         
       case 'state_update':
-        if (message.data.session_state) {
-          sessionStore.updateFromSessionState(message.data.session_state)
+        if (message.data.patch) {
+          if (!sessionStore.applyStatePatch(message.data.base_version, message.data.state_version, message.data.patch)) {
+            // Missed an update: start over from a full snapshot
+            requestSessionState(true)
+          }
+        } else if (message.data.session_state) {
+          sessionStore.updateFromSessionState(message.data.session_state, message.data.state_version)
         }
         if (message.data.updates) {
           processStateUpdates(message.data.updates)
@@ -0,0 +1,13 @@
+"""Shared test setup: isolated data directories and a dummy API key."""
+import os
+import tempfile
+
+# Settings are read when backend.config is first imported
+_DATA_DIR = tempfile.mkdtemp(prefix="bootstrapper-tests-")
+os.environ.setdefault("GEMINI_API_KEY", "test-key")
+os.environ["DATA_DIR"] = _DATA_DIR
+os.environ["SESSION_DIR"] = os.path.join(_DATA_DIR, "sessions")
+os.environ["SESSION_DB_PATH"] = os.path.join(_DATA_DIR, "sessions.db")
+os.environ["LOG_DIR"] = os.path.join(_DATA_DIR, "logs")
+os.environ["LOG_FILE"] = os.path.join(_DATA_DIR, "logs", "app.log")
+os.environ["PROJECT_BASE_DIR"] = os.path.join(_DATA_DIR, "apps")
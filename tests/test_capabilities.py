@@ -0,0 +1,126 @@
+"""Capability detection: PATH-scan fast path, concurrent probes and cold-start time.
+
+Timings are printed for comparison only; assertions never depend on machine load.
+"""
+import os
+import stat
+import threading
+import time
+
+from backend.capabilities import detector
+from backend.capabilities.detector import CapabilityDetector
+
+PROBE_SECONDS = 0.3
+
+
+def _install(bin_dir, log_file, name, output, seconds=PROBE_SECONDS):
+    """Fake executable that logs its start and end, takes a while and prints a version."""
+    script = bin_dir / name
+    script.write_text(
+        "#!/bin/sh\n"
+        f"echo start {name} >> {log_file}\n"
+        f"/bin/sleep {seconds}\n"
+        f"echo end {name} >> {log_file}\n"
+        f"echo '{output}'\n"
+    )
+    script.chmod(script.stat().st_mode | stat.S_IXUSR)
+
+
+def _install_toolchain(bin_dir, log_file, seconds=PROBE_SECONDS):
+    _install(bin_dir, log_file, "python", "Python 3.12.1", seconds)
+    _install(bin_dir, log_file, "node", "v20.1.0", seconds)
+    _install(bin_dir, log_file, "npm", "10.2.0", seconds)
+    _install(bin_dir, log_file, "git", "git version 2.43.0", seconds)
+    _install(bin_dir, log_file, "go", "go version go1.22.0 linux/amd64", seconds)
+    _install(bin_dir, log_file, "ruby", "ruby 3.3.0", seconds)
+
+
+def _peak_running(log_lines):
+    """Most probes that had started and not yet finished at any point."""
+    running = peak = 0
+    for line in log_lines:
+        running += 1 if line.startswith("start ") else -1
+        peak = max(peak, running)
+    return peak
+
+
+async def test_probes_run_concurrently_and_skip_missing_tools(tmp_path, monkeypatch):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    log_file = tmp_path / "spawned.log"
+    log_file.touch()
+    
+    _install_toolchain(bin_dir, log_file)
+    # A hung tool only costs its own timeout
+    (bin_dir / "flutter").write_text(f"#!/bin/sh\necho hung flutter >> {log_file}\nexec /bin/sleep 30\n")
+    (bin_dir / "flutter").chmod(0o755)
+    
+    monkeypatch.setenv("PATH", str(bin_dir))
+    monkeypatch.setitem(detector.PROBE_TIMEOUTS, "flutter", 0.5)
+    
+    capabilities = await CapabilityDetector()._detect()
+    
+    assert capabilities.python_version == "3.12.1"
+    assert capabilities.node_version == "20.1.0"
+    assert capabilities.npm_version == "10.2.0"
+    assert capabilities.git_installed
+    assert not capabilities.docker_installed
+    assert capabilities.available_runtimes == {
+        "python": "3.12.1", "node": "20.1.0", "go": "1.22.0", "ruby": "3.3.0"
+    }
+    assert "npm" in capabilities.available_package_managers
+    
+    log_lines = log_file.read_text().splitlines()
+    probes = [line for line in log_lines if not line.startswith("hung ")]
+    
+    # Only tools found by the PATH scan were spawned
+    spawned = sorted(line.split()[1] for line in log_lines if not line.startswith("end "))
+    assert spawned == ["flutter", "git", "go", "node", "node", "npm", "python", "python", "ruby"]
+    
+    # Probes overlapped instead of running one after another
+    assert _peak_running(probes) > 1
+
+
+async def test_cold_detection_benchmark(tmp_path, monkeypatch):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    log_file = tmp_path / "spawned.log"
+    _install_toolchain(bin_dir, log_file, seconds=0.05)
+    
+    monkeypatch.setenv("PATH", str(bin_dir))
+    monkeypatch.setattr(detector.settings, "DATA_DIR", str(tmp_path))
+    capability_detector = CapabilityDetector()
+    
+    started = time.monotonic()
+    capabilities = await capability_detector.detect_all_capabilities()
+    cold = time.monotonic() - started
+    
+    started = time.monotonic()
+    assert await capability_detector.detect_all_capabilities() is capabilities
+    cached = time.monotonic() - started
+    
+    print(
+        f"\ncold capability detection {cold * 1000:.0f}ms "
+        f"({len(capabilities.available_runtimes)} runtimes), cached {cached * 1000:.2f}ms"
+    )
+    assert os.path.exists(capability_detector.cache_file)
+
+
+async def test_fingerprint_check_runs_off_the_event_loop(tmp_path, monkeypatch):
+    monkeypatch.setattr(detector.settings, "DATA_DIR", str(tmp_path))
+    capability_detector = CapabilityDetector()
+    capabilities = await capability_detector.detect_all_capabilities()
+    
+    event_loop_thread = threading.get_ident()
+    checked_in = []
+    
+    def compute_fingerprint():
+        checked_in.append(threading.get_ident())
+        return capability_detector._cached_fingerprint
+    
+    monkeypatch.setattr(capability_detector, "_compute_fingerprint", compute_fingerprint)
+    capability_detector._fingerprint_checked_at -= detector.FINGERPRINT_CHECK_INTERVAL
+    
+    assert await capability_detector.detect_all_capabilities() is capabilities
+    assert len(checked_in) == 1
+    assert checked_in[0] != event_loop_thread
@@ -0,0 +1,209 @@
+"""Project-creation shell steps must not block the event loop."""
+import asyncio
+import os
+import time
+
+import pytest
+
+from backend.api import heartbeat
+from backend.api.heartbeat import HeartbeatScheduler
+from backend.core.turn_queue import SessionTurnQueue
+from backend.execution.engine import execution_engine
+from backend.gemini.function_registry import function_registry
+from backend.models.schemas import ExecutionStep, SessionState
+
+COMMAND_SECONDS = 1.0
+
+
+class _Channel:
+    """Records when each heartbeat reached the other session's socket."""
+    
+    def __init__(self):
+        self.closed = False
+        self.received = []
+    
+    async def send_json(self, message):
+        self.received.append((time.monotonic(), message["type"]))
+
+
+class _Connection:
+    def __init__(self, connection_id):
+        self.connection_id = connection_id
+        self.channel = _Channel()
+        self.last_seen = time.monotonic()
+
+
+def _is_running(pid):
+    """Whether ``pid`` is alive; killed orphans may linger as zombies until init reaps them."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    try:
+        with open(f"/proc/{pid}/stat") as stat:
+            return stat.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+async def _reap(connection):
+    raise AssertionError(f"{connection.connection_id} should stay alive")
+
+
+async def test_other_session_keeps_receiving_heartbeats_during_long_command(tmp_path, monkeypatch):
+    monkeypatch.setattr(heartbeat, "HEARTBEAT_TICK", 0.05)
+    scheduler = HeartbeatScheduler(_reap, interval=0.1, timeout=30, jitter=0)
+    other_session = _Connection("other-session")
+    scheduler.add(other_session)
+    
+    session_state = SessionState(session_id="long-command")
+    session_state.requirements.project_name = "slow"
+    session_state.requirements.folder_path = str(tmp_path / "slow")
+    steps = [{"command": f"sleep {COMMAND_SECONDS}", "description": "Long install"}]
+    
+    try:
+        started = time.monotonic()
+        result = await function_registry.functions["create_project_with_steps"](session_state, None, steps=steps)
+        finished = time.monotonic()
+    finally:
+        await scheduler.close()
+    
+    assert result["status"] == "execution_completed"
+    assert finished - started >= COMMAND_SECONDS
+    
+    beats = [at for at, kind in other_session.channel.received if kind == "heartbeat" and started <= at <= finished]
+    assert len(beats) >= 5
+    
+    # No stall anywhere near the length of the command
+    gaps = [later - earlier for earlier, later in zip([started] + beats, beats + [finished])]
+    assert max(gaps) < COMMAND_SECONDS / 2
+
+
+async def _started_child(pid_file):
+    for _ in range(100):
+        if pid_file.exists() and pid_file.read_text().strip():
+            return int(pid_file.read_text())
+        await asyncio.sleep(0.02)
+    raise AssertionError("command never started")
+
+
+def _hanging_steps(pid_file):
+    # The shell's child keeps running unless its whole process group is killed
+    return [{"command": f"sleep 30 & echo $! > {pid_file}; wait; true", "description": "Hanging install"}]
+
+
+async def test_cancelling_project_creation_kills_running_command(tmp_path):
+    session_state = SessionState(session_id="cancelled")
+    session_state.requirements.project_name = "cancelled"
+    session_state.requirements.folder_path = str(tmp_path / "cancelled")
+    pid_file = tmp_path / "command.pid"
+    
+    task = asyncio.create_task(
+        function_registry.functions["create_project_with_steps"](session_state, None, steps=_hanging_steps(pid_file))
+    )
+    pid = await _started_child(pid_file)
+    
+    task.cancel()
+    started = time.monotonic()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    
+    assert time.monotonic() - started < 2
+    assert not _is_running(pid)
+
+
+async def test_superseding_turn_is_not_stuck_behind_running_command(tmp_path):
+    session_state = SessionState(session_id="superseded")
+    session_state.requirements.project_name = "superseded"
+    session_state.requirements.folder_path = str(tmp_path / "superseded")
+    pid_file = tmp_path / "command.pid"
+    latest_started = asyncio.Event()
+    
+    async def create_project():
+        await function_registry.functions["create_project_with_steps"](
+            session_state, None, steps=_hanging_steps(pid_file)
+        )
+    
+    async def latest_message():
+        latest_started.set()
+    
+    queue = SessionTurnQueue()
+    try:
+        queue.submit("superseded", create_project)
+        pid = await _started_child(pid_file)
+        
+        queue.submit("superseded", latest_message, supersede=True)
+        await asyncio.wait_for(latest_started.wait(), timeout=2)
+    finally:
+        await queue.close()
+    
+    assert queue.get_stats()["turns_cancelled"] == 1
+    assert not _is_running(pid)
+
+
+async def test_timeout_kills_compound_shell_command(tmp_path):
+    pid_file = tmp_path / "sleep.pid"
+    step = ExecutionStep(
+        command=f"sleep 30 & echo $! > {pid_file}; wait; true",
+        description="Hung install",
+        working_directory=str(tmp_path),
+        timeout=1
+    )
+    
+    started = time.monotonic()
+    result = await execution_engine.execute_step(step, 0, shell=True)
+    elapsed = time.monotonic() - started
+    
+    assert not result.success
+    assert "timed out" in result.stderr
+    assert elapsed < 5
+    
+    # The shell's child went down with it
+    assert not _is_running(int(pid_file.read_text()))
+
+
+async def test_output_line_longer_than_stream_limit(tmp_path):
+    step = ExecutionStep(
+        command="head -c 200000 /dev/zero | tr '\\0' a; echo; echo done",
+        description="Minified bundle",
+        working_directory=str(tmp_path),
+        timeout=10
+    )
+    
+    result = await execution_engine.execute_step(step, 0, shell=True)
+    
+    assert result.success, result.stderr
+    assert result.stdout.split("\n") == ["a" * 200000, "done"]
+
+
+def _timed(name):
+    """Shell command recording when it started and finished in its working directory."""
+    stamp = "python3 -c 'import time; print(time.time())'"
+    return f"{stamp} > {name}.start; sleep 0.3; {stamp} > {name}.end"
+
+
+async def test_independent_command_steps_run_concurrently(tmp_path):
+    project = tmp_path / "fullstack"
+    session_state = SessionState(session_id="fullstack")
+    session_state.requirements.project_name = "fullstack"
+    session_state.requirements.folder_path = str(project)
+    steps = [
+        {"command": _timed("install"), "description": "Install frontend", "working_directory": str(project / "frontend")},
+        {"command": _timed("install"), "description": "Install backend", "working_directory": str(project / "backend")},
+        {"command": _timed("build"), "description": "Build everything", "working_directory": str(project)},
+    ]
+    
+    result = await function_registry.functions["create_project_with_steps"](session_state, None, steps=steps)
+    assert result["status"] == "execution_completed"
+    assert result["successful_steps"] == 3
+    
+    def interval(directory, name):
+        return float((directory / f"{name}.start").read_text()), float((directory / f"{name}.end").read_text())
+    
+    frontend = interval(project / "frontend", "install")
+    backend = interval(project / "backend", "install")
+    build = interval(project, "build")
+    
+    # The installs overlapped; the step covering both directories waited for them
+    assert frontend[0] < backend[1] and backend[0] < frontend[1]
+    assert build[0] >= max(frontend[1], backend[1])
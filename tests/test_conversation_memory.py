@@ -0,0 +1,141 @@
+"""Token-budgeted prompt history and the rolling conversation summary."""
+import pytest
+
+from backend.core.conversation_memory import SUMMARY_HEADER, ConversationMemory
+from backend.core.retention import RetentionPolicy, SessionArchive
+from backend.models.schemas import SessionState
+
+
+@pytest.fixture
+def memory():
+    conversation_memory = ConversationMemory()
+    conversation_memory.history_token_budget = 100
+    conversation_memory.summary_token_budget = 60
+    conversation_memory.max_recent_messages = 6
+    return conversation_memory
+
+
+def _session(messages):
+    session_state = SessionState(session_id="memory")
+    for role, content in messages:
+        session_state.add_message(role, content)
+    return session_state
+
+
+def _turns(count, chars=40):
+    """Alternating user/assistant messages of ``chars`` characters (10 tokens)."""
+    return [
+        ("user" if index % 2 == 0 else "assistant", f"{index:02d}".ljust(chars, "x"))
+        for index in range(count)
+    ]
+
+
+def test_window_fits_the_token_budget(memory):
+    history = _session(_turns(12)).conversation_history
+    memory.max_recent_messages = 50
+    
+    # 10 messages of 10 tokens fill the 100 token budget
+    assert memory._window_start(history, 0) == 2
+
+
+def test_window_is_capped_by_message_count(memory):
+    history = _session(_turns(12, chars=4)).conversation_history
+    
+    assert memory._window_start(history, 0) == 6
+
+
+def test_window_never_reaches_into_summarized_messages(memory):
+    history = _session(_turns(12, chars=4)).conversation_history
+    
+    assert memory._window_start(history, 9) == 9
+
+
+def test_window_keeps_latest_user_turn_behind_a_long_reply(memory):
+    history = _session([
+        ("user", "short question"),
+        ("user", "build me a todo app"),
+        ("assistant", "y" * 2000),
+    ]).conversation_history
+    
+    assert memory._window_start(history, 0) == 1
+
+
+def test_window_keeps_an_oversized_newest_message(memory):
+    history = _session([("assistant", "earlier"), ("user", "z" * 2000)]).conversation_history
+    
+    assert memory._window_start(history, 0) == 1
+
+
+def test_fold_only_summarizes_new_messages(memory):
+    session_state = _session([("user", "I want a **FastAPI** app"), ("assistant", "Sure.")])
+    
+    memory.fold(session_state, 1)
+    assert session_state.conversation_summary == ["User: I want a FastAPI app"]
+    assert session_state.summarized_message_count == 1
+    
+    # Folding up to the same point again adds nothing
+    memory.fold(session_state, 1)
+    memory.fold(session_state, 0)
+    assert session_state.conversation_summary == ["User: I want a FastAPI app"]
+    
+    memory.fold(session_state, 2)
+    assert session_state.conversation_summary == ["User: I want a FastAPI app", "Assistant: Sure."]
+    assert session_state.summarized_message_count == 2
+
+
+def test_trim_summary_drops_assistant_lines_first(memory):
+    summary = [
+        "User: " + "a" * 100,
+        "Assistant: " + "b" * 100,
+        "User: " + "c" * 100,
+        "Assistant: " + "d" * 100,
+    ]
+    
+    memory._trim_summary(summary)
+    
+    assert summary == ["User: " + "a" * 100, "User: " + "c" * 100]
+
+
+def test_trim_summary_drops_oldest_user_lines_when_only_those_remain(memory):
+    summary = ["User: " + "a" * 100, "User: " + "b" * 100, "User: " + "c" * 100]
+    
+    memory._trim_summary(summary)
+    
+    assert summary == ["User: " + "b" * 100, "User: " + "c" * 100]
+
+
+def test_build_messages_sends_summary_then_recent_messages(memory):
+    session_state = _session(_turns(12, chars=4))
+    
+    messages = memory.build_messages(session_state)
+    
+    assert messages[0]["role"] == "system"
+    assert messages[0]["content"].startswith(SUMMARY_HEADER)
+    assert [message["content"] for message in messages[1:]] == [
+        content for _, content in _turns(12, chars=4)[6:]
+    ]
+    assert session_state.summarized_message_count == 6
+
+
+async def test_summary_position_survives_retention_trimming_history(memory, tmp_path):
+    memory.max_recent_messages = 2
+    session_state = _session(_turns(12, chars=4))
+    memory.build_messages(session_state)
+    summary = list(session_state.conversation_summary)
+    assert session_state.summarized_message_count == 10
+    
+    hot_limits = {"conversation_history": 4, "function_results": 10, "state_history": 50}
+    policy = RetentionPolicy(SessionArchive(str(tmp_path)), hot_limits=hot_limits)
+    assert await policy.apply("memory", session_state)
+    
+    # Eight summarized messages were archived from the front
+    assert len(session_state.conversation_history) == 4
+    assert session_state.summarized_message_count == 2
+    
+    session_state.add_message("user", "one more thing")
+    messages = memory.build_messages(session_state)
+    
+    # Only the message pushed out of the window is added to the summary
+    assert session_state.conversation_summary == summary + ["User: 10xx"]
+    assert session_state.summarized_message_count == 3
+    assert [message["content"] for message in messages[1:]] == ["11xx", "one more thing"]
@@ -0,0 +1,168 @@
+"""Execution step dependency graph and concurrent scheduling."""
+import asyncio
+
+import pytest
+
+from backend.execution.dag import GLOBAL_SCOPE, build_step_graph, run_step_graph, step_scopes
+from backend.gemini.function_registry import function_registry
+from backend.models.schemas import ExecutionStep, SessionState
+
+
+def _step(command, working_directory=None, depends_on=()):
+    return ExecutionStep(
+        command=command,
+        description=command,
+        working_directory=working_directory,
+        depends_on=list(depends_on)
+    )
+
+
+def test_sibling_mkdirs_are_independent(tmp_path):
+    steps = [_step("mkdir -p api"), _step("mkdir -p web"), _step("touch README.md")]
+    
+    assert build_step_graph(steps, str(tmp_path)) == [set(), set(), set()]
+
+
+def test_parent_runs_before_child(tmp_path):
+    steps = [
+        _step("mkdir -p app"),
+        _step("touch app/main.py"),
+        _step("npm install", working_directory="app"),
+        _step("mkdir -p docs")
+    ]
+    
+    assert build_step_graph(steps, str(tmp_path)) == [set(), {0}, {0, 1}, set()]
+
+
+def test_explicit_depends_on_is_kept_and_invalid_entries_ignored(tmp_path):
+    steps = [_step("mkdir -p a"), _step("mkdir -p b", depends_on=[0]), _step("mkdir -p c", depends_on=[2, 5])]
+    
+    assert build_step_graph(steps, str(tmp_path)) == [set(), {0}, set()]
+
+
+@pytest.mark.parametrize("command", [
+    "pip install requests",
+    "python3 -m pip install -r requirements.txt",
+    "sudo apt-get install -y nodejs",
+    "brew install go",
+    "npm install -g typescript",
+    "yarn global add serve",
+    "git config --global user.name dev",
+    "cd app && pip install flask",
+    "PIP_NO_CACHE_DIR=1 pip install flask",
+    "cargo install ripgrep"
+])
+def test_installers_without_local_target_share_the_global_scope(command, tmp_path):
+    assert GLOBAL_SCOPE in step_scopes(_step(command), str(tmp_path))
+
+
+@pytest.mark.parametrize("command", [
+    "npm install",
+    "venv/bin/pip install flask",
+    "pip install --target vendor flask",
+    "pip freeze",
+    "git config user.name dev",
+    "yarn add react"
+])
+def test_project_local_commands_stay_local(command, tmp_path):
+    assert GLOBAL_SCOPE not in step_scopes(_step(command), str(tmp_path))
+
+
+def test_global_installs_in_different_directories_are_serialized(tmp_path):
+    steps = [
+        _step("pip install flask", working_directory="api"),
+        _step("npm install -g typescript", working_directory="web"),
+        _step("npm install", working_directory="web2")
+    ]
+    
+    assert build_step_graph(steps, str(tmp_path)) == [set(), {0}, set()]
+
+
+class _Recorder:
+    """run_step stand-in recording order and concurrency."""
+    
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.started = []
+        self.finished = []
+        self.running = 0
+        self.peak = 0
+    
+    async def __call__(self, index):
+        self.started.append(index)
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            await asyncio.sleep(0.02)
+        finally:
+            self.running -= 1
+        self.finished.append(index)
+        return index not in self.failing
+
+
+async def test_independent_steps_run_in_parallel():
+    recorder = _Recorder()
+    
+    succeeded = await run_step_graph([set(), set(), set(), set()], recorder, max_workers=4)
+    
+    assert succeeded == {0, 1, 2, 3}
+    assert recorder.peak == 4
+
+
+async def test_dependencies_finish_before_dependents_start():
+    recorder = _Recorder()
+    dependencies = [set(), {0}, {0}, {1, 2}]
+    
+    await run_step_graph(dependencies, recorder, max_workers=4)
+    
+    for index, depends_on in enumerate(dependencies):
+        for dependency in depends_on:
+            assert recorder.finished.index(dependency) < recorder.started.index(index)
+    assert recorder.peak == 2
+
+
+async def test_worker_limit_is_respected():
+    recorder = _Recorder()
+    
+    await run_step_graph([set()] * 10, recorder, max_workers=3)
+    
+    assert recorder.peak == 3
+    assert recorder.started == list(range(10))
+
+
+async def test_failure_stops_further_steps():
+    recorder = _Recorder(failing={0})
+    dependencies = [set(), set(), {1}, set()]
+    
+    succeeded = await run_step_graph(dependencies, recorder, max_workers=2)
+    
+    # Step 1 was already running and finishes; nothing new starts
+    assert recorder.started == [0, 1]
+    assert succeeded == {1}
+
+
+async def test_failure_can_be_ignored():
+    recorder = _Recorder(failing={0})
+    
+    succeeded = await run_step_graph([set(), {0}, set()], recorder, max_workers=1, stop_on_failure=False)
+    
+    # The dependent of the failed step still never runs
+    assert succeeded == {2}
+    assert 1 not in recorder.started
+
+
+def test_project_installer_waits_for_the_file_it_reads(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    session_state = SessionState(session_id="relative")
+    session_state.requirements.project_name = "myapp"
+    steps = [
+        {"command": "CREATE_FILE", "file_path": "frontend/package.json", "description": "Frontend manifest"},
+        {"command": "CREATE_FILE", "file_path": "backend/package.json", "description": "Backend manifest"},
+        {"command": "npm install", "working_directory": "./myapp/frontend", "description": "Install frontend"},
+        {"command": "npm install", "working_directory": "./myapp/backend", "description": "Install backend"},
+    ]
+    
+    command_steps = function_registry._command_steps(steps, "./myapp", session_state)
+    
+    assert step_scopes(command_steps[0]) == {str(tmp_path / "myapp" / "frontend" / "package.json")}
+    assert build_step_graph(command_steps) == [set(), set(), {0}, {1}]
@@ -0,0 +1,141 @@
+"""Deterministic fast path: which turns skip Gemini and how far it advances."""
+import pytest
+
+from backend.config import settings
+from backend.core.fast_path import DeterministicFastPath
+from backend.core.state_machine import ConversationStateMachine
+from backend.models.schemas import ConversationState, SessionState, SystemCapability
+
+
+class _Registry:
+    """Runs the state actions without touching the system."""
+    
+    def __init__(self, ask_during_validation=False):
+        self.ask_during_validation = ask_during_validation
+        self.calls = []
+    
+    async def execute(self, function_call, session_state, websocket=None):
+        name = function_call["name"]
+        self.calls.append(name)
+        if name == "detect_system_capabilities":
+            session_state.capabilities = SystemCapability(os="Linux", shell="bash", detection_completed=True)
+            return {"status": "capabilities_detected", "capabilities": {"os": "Linux"}}
+        
+        session_state.validation_completed = True
+        if self.ask_during_validation:
+            session_state.pending_question = {"type": "choice", "field": "database", "options": ["sqlite", "postgres"]}
+        return {"status": "validation_complete", "corrections_made": []}
+
+
+class _WebSocket:
+    def __init__(self):
+        self.sent = []
+    
+    async def send_json(self, message):
+        self.sent.append(message)
+
+
+def _fast_path(registry=None):
+    return DeterministicFastPath(registry or _Registry(), ConversationStateMachine())
+
+
+def _session(state, **fields):
+    session_state = SessionState(session_id="fast", current_state=state, **fields)
+    session_state.requirements.project_name = "demo"
+    session_state.requirements.folder_path = "/tmp/demo"
+    return session_state
+
+
+@pytest.mark.parametrize("reply, skipped", [
+    ("pyton", True),
+    ("  webap  ", True),
+    ("which one is faster?", False),
+    ("what's the difference", False),
+    ("?", False),
+    ("I'd rather use something with good async support", False),
+    ("", False),
+    ("a" * 40, False),
+])
+def test_only_attempted_choices_skip_the_reask(reply, skipped):
+    fast_path = _fast_path()
+    session_state = _session(ConversationState.ASK_PROJECT_TYPE, pending_question={"type": "choice"})
+    
+    assert fast_path.skip_reask(reply, session_state) is skipped
+    assert fast_path.llm_calls_avoided == int(skipped)
+
+
+def test_skip_reask_needs_a_pending_question():
+    assert not _fast_path().skip_reask("pyton", _session(ConversationState.ASK_PROJECT_TYPE))
+
+
+@pytest.mark.parametrize("reply, confirmed", [
+    ("yes", True),
+    ("Looks good!", True),
+    ("yes, but use postgres", False),
+    ("no", False),
+])
+async def test_confirm_accepts_only_a_plain_yes(reply, confirmed):
+    fast_path = _fast_path()
+    session_state = _session(ConversationState.SUMMARY_CONFIRMATION)
+    websocket = _WebSocket()
+    
+    assert await fast_path.confirm(reply, session_state, websocket) is confirmed
+    
+    expected_state = ConversationState.PLANNING if confirmed else ConversationState.SUMMARY_CONFIRMATION
+    assert session_state.current_state == expected_state
+    assert [message["type"] for message in websocket.sent] == (["project_confirmed"] if confirmed else [])
+
+
+async def test_confirm_ignores_other_states():
+    session_state = _session(ConversationState.VALIDATE_INFO)
+    
+    assert not await _fast_path().confirm("yes", session_state)
+
+
+async def test_advance_runs_state_actions_until_a_decision_is_needed():
+    registry = _Registry()
+    fast_path = _fast_path(registry)
+    session_state = _session(ConversationState.ASK_PROJECT_NAME_FOLDER)
+    fast_path.begin_turn(session_state.session_id)
+    
+    assert await fast_path.advance(session_state)
+    
+    # Confirming the summary is the user's decision, so Gemini takes over there
+    assert session_state.current_state == ConversationState.SUMMARY_CONFIRMATION
+    assert registry.calls == ["detect_system_capabilities", "validate_requirements_against_capabilities"]
+    assert fast_path.end_turn(session_state.session_id)["rules"] == [
+        "state_advanced", "state_action", "state_advanced", "state_action", "state_advanced"
+    ]
+
+
+async def test_advance_stops_at_a_pending_question():
+    fast_path = _fast_path(_Registry(ask_during_validation=True))
+    session_state = _session(ConversationState.ASK_PROJECT_NAME_FOLDER)
+    
+    assert not await fast_path.advance(session_state)
+    
+    assert session_state.current_state == ConversationState.VALIDATE_INFO
+    assert session_state.pending_question["field"] == "database"
+
+
+async def test_advance_respects_the_step_limit(monkeypatch):
+    monkeypatch.setattr(settings, "FAST_PATH_MAX_STEPS", 2)
+    registry = _Registry()
+    fast_path = _fast_path(registry)
+    session_state = _session(ConversationState.ASK_PROJECT_NAME_FOLDER)
+    
+    assert await fast_path.advance(session_state)
+    
+    assert session_state.current_state == ConversationState.CHECK_SYSTEM_CAPABILITIES
+    assert registry.calls == ["detect_system_capabilities"]
+    assert fast_path.llm_calls_avoided == 2
+
+
+async def test_disabled_fast_path_defers_to_gemini(monkeypatch):
+    monkeypatch.setattr(settings, "FAST_PATH_ENABLED", False)
+    fast_path = _fast_path()
+    session_state = _session(ConversationState.ASK_PROJECT_NAME_FOLDER, pending_question={"type": "choice"})
+    
+    assert not fast_path.skip_reask("pyton", session_state)
+    assert await fast_path.advance(session_state)
+    assert session_state.current_state == ConversationState.ASK_PROJECT_NAME_FOLDER
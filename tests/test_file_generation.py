@@ -0,0 +1,110 @@
+"""Concurrent file-content generation during plan execution, against a fake Gemini server."""
+import asyncio
+import os
+import time
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from backend.config import settings
+from backend.gemini import streaming_client
+from backend.gemini.function_registry import function_registry
+from backend.gemini.scheduler import GeminiRequestScheduler
+from backend.models.schemas import SessionState
+
+GENERATION_DELAY = 0.2
+FILE_COUNT = 8
+
+
+@pytest.fixture
+async def gemini_server(monkeypatch):
+    """Fake Gemini server answering file-content requests after a delay."""
+    state = {"in_flight": 0, "peak": 0, "requests": 0}
+    
+    async def generate(request):
+        state["requests"] += 1
+        state["in_flight"] += 1
+        state["peak"] = max(state["peak"], state["in_flight"])
+        try:
+            await asyncio.sleep(GENERATION_DELAY)
+        finally:
+            state["in_flight"] -= 1
+        return web.json_response({
+            "candidates": [{"content": {"parts": [{"text": "print('generated')"}]}, "finishReason": "STOP"}]
+        })
+    
+    app = web.Application()
+    app.router.add_post("/models/{model}:generateContent", generate)
+    server = TestServer(app)
+    await server.start_server()
+    server.state = state
+    
+    monkeypatch.setattr(settings, "GEMINI_API_URL", str(server.make_url("")).rstrip("/"))
+    monkeypatch.setattr(settings, "GEMINI_CACHE_ENABLED", False)
+    yield server
+    await server.close()
+
+
+def _use_scheduler(monkeypatch, max_concurrent):
+    scheduler = GeminiRequestScheduler(max_concurrent=max_concurrent, requests_per_minute=0, tokens_per_minute=0)
+    monkeypatch.setattr(streaming_client, "gemini_request_scheduler", scheduler)
+    return scheduler
+
+
+def _plan(tmp_path, name):
+    session_state = SessionState(session_id=f"plan-{name}")
+    session_state.requirements.project_name = name
+    session_state.requirements.folder_path = str(tmp_path / name)
+    session_state.requirements.language = "Python"
+    
+    steps = [
+        {"command": "CREATE_FILE", "file_path": f"module_{index}.py", "file_content": "", "description": f"Module {index}"}
+        for index in range(FILE_COUNT)
+    ]
+    steps.insert(FILE_COUNT // 2, {"command": "echo building", "description": "Build step"})
+    return session_state, steps
+
+
+async def _run_plan(tmp_path, name):
+    session_state, steps = _plan(tmp_path, name)
+    started = time.monotonic()
+    result = await function_registry.functions["create_project_with_steps"](session_state, None, steps=steps)
+    elapsed = time.monotonic() - started
+    
+    assert result["status"] == "execution_completed"
+    assert result["successful_steps"] == len(steps)
+    assert len(os.listdir(tmp_path / name)) == FILE_COUNT
+    return elapsed
+
+
+async def test_prefetched_generation_respects_scheduler_cap(gemini_server, tmp_path, monkeypatch):
+    # More generation tasks allowed than scheduler slots
+    monkeypatch.setattr(settings, "FILE_GENERATION_CONCURRENCY", 4)
+    scheduler = _use_scheduler(monkeypatch, max_concurrent=2)
+    
+    await _run_plan(tmp_path, "capped")
+    
+    assert gemini_server.state["requests"] == FILE_COUNT
+    assert gemini_server.state["peak"] == 2
+    assert scheduler.in_flight == 0
+
+
+async def test_plan_execution_benchmark(gemini_server, tmp_path, monkeypatch):
+    _use_scheduler(monkeypatch, max_concurrent=8)
+    
+    monkeypatch.setattr(settings, "FILE_GENERATION_CONCURRENCY", 1)
+    sequential = await _run_plan(tmp_path, "sequential")
+    sequential_peak = gemini_server.state["peak"]
+    
+    gemini_server.state["peak"] = 0
+    monkeypatch.setattr(settings, "FILE_GENERATION_CONCURRENCY", 4)
+    concurrent = await _run_plan(tmp_path, "concurrent")
+    concurrent_peak = gemini_server.state["peak"]
+    
+    print(
+        f"\nplan with {FILE_COUNT} generated files at {GENERATION_DELAY}s each: "
+        f"sequential {sequential:.2f}s, concurrent {concurrent:.2f}s"
+    )
+    assert sequential_peak == 1
+    assert 1 < concurrent_peak <= 4
@@ -0,0 +1,123 @@
+"""Function schemas offered to Gemini per conversation state."""
+import pytest
+
+from backend.gemini.function_registry import (
+    INIT_FUNCTIONS_WITH_REQUIREMENTS,
+    STATE_BLOCKED_FUNCTIONS,
+    FunctionRegistry,
+)
+from backend.models.schemas import ConversationState, SessionState
+
+
+@pytest.fixture(scope="module")
+def registry():
+    return FunctionRegistry()
+
+
+def _session(state, requirements_ready=False):
+    session_state = SessionState(session_id="schemas", current_state=state)
+    if requirements_ready:
+        session_state.requirements.project_type = "web_app"
+        session_state.requirements.language = "Python"
+        session_state.requirements.project_name = "shop"
+    return session_state
+
+
+def _names(schemas):
+    return [schema["name"] for schema in schemas]
+
+
+def _without_descriptions(schema):
+    """Schema as it should look once minimal mode has dropped descriptions."""
+    if isinstance(schema, list):
+        return [_without_descriptions(item) for item in schema]
+    if not isinstance(schema, dict):
+        return schema
+    return {
+        key: (
+            {name: _without_descriptions(prop) for name, prop in value.items()}
+            if key == "properties" else _without_descriptions(value)
+        )
+        for key, value in schema.items() if key != "description"
+    }
+
+
+@pytest.mark.parametrize("state", [state for state in ConversationState if state != ConversationState.INIT])
+def test_unrestricted_states_offer_every_function(registry, state):
+    offered = _names(registry.get_function_schemas_for_state(_session(state), minimal=False))
+    
+    assert offered == _names(registry.schemas)
+
+
+@pytest.mark.parametrize("state", list(ConversationState))
+@pytest.mark.parametrize("requirements_ready", [False, True])
+def test_offered_functions_are_the_callable_ones(registry, state, requirements_ready):
+    session_state = _session(state, requirements_ready)
+    offered = set(_names(registry.get_function_schemas_for_state(session_state, minimal=False)))
+    
+    for name in registry.functions:
+        allowed = registry._validate_function_for_state(name, session_state) is None
+        assert allowed == (name in offered), name
+
+
+def test_init_hides_project_functions_until_requirements_are_ready(registry):
+    blocked = STATE_BLOCKED_FUNCTIONS[ConversationState.INIT]
+    
+    offered = _names(registry.get_function_schemas_for_state(_session(ConversationState.INIT), minimal=False))
+    assert not set(blocked) & set(offered)
+    assert "update_project_requirements" in offered
+    assert "detect_system_capabilities" in offered
+    
+    ready = _names(registry.get_function_schemas_for_state(_session(ConversationState.INIT, True), minimal=False))
+    assert set(INIT_FUNCTIONS_WITH_REQUIREMENTS) <= set(ready)
+    assert not (set(blocked) - set(INIT_FUNCTIONS_WITH_REQUIREMENTS)) & set(ready)
+    assert set(ready) - set(offered) == set(INIT_FUNCTIONS_WITH_REQUIREMENTS)
+
+
+def test_minimal_schemas_keep_parameter_structure(registry):
+    session_state = _session(ConversationState.PLANNING)
+    full = registry.get_function_schemas_for_state(session_state, minimal=False)
+    minimal = registry.get_function_schemas_for_state(session_state, minimal=True)
+    
+    assert _names(minimal) == _names(full)
+    for short, schema in zip(minimal, full):
+        assert short["parameters"] == _without_descriptions(schema["parameters"])
+        assert short["description"]
+        assert len(short["description"]) <= len(schema["description"])
+        assert ". " not in short["description"] and "\n" not in short["description"]
+
+
+def test_minimal_schema_keeps_property_names_types_and_required(registry):
+    schema = next(
+        schema for schema in registry.get_function_schemas_for_state(_session(ConversationState.PLANNING), minimal=True)
+        if schema["name"] == "create_project_with_steps"
+    )
+    parameters = schema["parameters"]
+    
+    assert parameters["required"] == ["steps"]
+    steps = parameters["properties"]["steps"]
+    assert steps["type"] == "array"
+    assert "command" in steps["items"]["properties"]
+    assert "description" in steps["items"]["properties"]
+    assert steps["items"]["properties"]["description"] == {"type": "string"}
+
+
+def test_subsets_are_cached_per_state_readiness_and_mode(registry):
+    first = registry.get_function_schemas_for_state(_session(ConversationState.INIT), minimal=True)
+    
+    assert registry.get_function_schemas_for_state(_session(ConversationState.INIT), minimal=True) is first
+    assert registry.get_function_schemas_for_state(_session(ConversationState.INIT), minimal=False) is not first
+    assert registry.get_function_schemas_for_state(_session(ConversationState.INIT, True), minimal=True) is not first
+
+
+def test_registering_a_function_invalidates_cached_subsets():
+    registry = FunctionRegistry()
+    before = registry.get_function_schemas_for_state(_session(ConversationState.PLANNING), minimal=False)
+    
+    @registry.register(name="extra_function", description="Extra.", parameters={"type": "object", "properties": {}})
+    async def extra_function(session_state, websocket):
+        return {"status": "completed"}
+    
+    after = registry.get_function_schemas_for_state(_session(ConversationState.PLANNING), minimal=False)
+    assert after is not before
+    assert _names(after) == _names(before) + ["extra_function"]
@@ -0,0 +1,63 @@
+"""Heartbeat scheduler: rescheduling after a batch."""
+import asyncio
+import time
+
+from backend.api.heartbeat import HeartbeatScheduler
+
+
+class _Channel:
+    def __init__(self, on_send=None):
+        self.closed = False
+        self.on_send = on_send
+        self.sent = 0
+    
+    async def send_json(self, message):
+        await asyncio.sleep(0)
+        if self.on_send:
+            self.on_send()
+        self.sent += 1
+
+
+class _Connection:
+    def __init__(self, connection_id, on_send=None):
+        self.connection_id = connection_id
+        self.channel = _Channel(on_send)
+        self.last_seen = time.monotonic()
+
+
+def _scheduler(reaped):
+    async def reap(connection):
+        reaped.append(connection.connection_id)
+    return HeartbeatScheduler(reap, interval=5, timeout=30, jitter=0)
+
+
+async def test_connections_removed_or_closed_during_batch_are_not_rescheduled():
+    reaped = []
+    scheduler = _scheduler(reaped)
+    
+    steady = _Connection("steady")
+    removed = _Connection("removed", on_send=lambda: scheduler.remove("removed"))
+    closed = _Connection("closed")
+    closed.channel.on_send = lambda: setattr(closed.channel, "closed", True)
+    
+    await scheduler._beat([steady, removed, closed])
+    
+    assert scheduler._due.keys() == {"steady"}
+    assert scheduler.get_stats()["heartbeats_sent"] == 3
+    # A channel that closed mid-batch is reaped; a removed connection is already gone
+    assert reaped == ["closed"]
+    assert scheduler.get_stats()["connections_reaped"] == 1
+
+
+async def test_connection_readded_during_batch_is_scheduled_once():
+    scheduler = _scheduler([])
+    connection = _Connection("readded")
+    connection.channel.on_send = lambda: scheduler.add(connection)
+    
+    try:
+        await scheduler._beat([connection])
+        
+        assert list(scheduler._due) == ["readded"]
+        assert sum("readded" in slot for slot in scheduler._slots) == 1
+    finally:
+        await scheduler.close()
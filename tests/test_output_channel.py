@@ -0,0 +1,159 @@
+"""WebSocket output channel: queue bound, ordering and slow consumers."""
+import asyncio
+import json
+
+import pytest
+
+from backend.api.output_channel import WebSocketOutputChannel
+
+
+class _WebSocket:
+    """Consumer whose writes block until released."""
+    
+    def __init__(self):
+        self.sent = []
+        self.release = asyncio.Event()
+        self.closed = False
+    
+    async def send_text(self, payload):
+        await self.release.wait()
+        self.sent.append(payload)
+    
+    async def close(self, code=1000):
+        self.closed = True
+    
+    def messages(self):
+        messages = []
+        for payload in self.sent:
+            message = json.loads(payload)
+            messages.extend(message["data"]["messages"] if message["type"] == "batch" else [message])
+        return messages
+
+
+@pytest.fixture
+async def websocket():
+    return _WebSocket()
+
+
+def _channel(websocket, **options):
+    options.setdefault("max_queue", 2)
+    return WebSocketOutputChannel(websocket, flush_interval=0.01, send_timeout=5, **options)
+
+
+async def _stall(channel):
+    """Get the writer stuck sending a first frame."""
+    await channel.send_json({"type": "session_started", "data": {}})
+    for _ in range(10):
+        await asyncio.sleep(0)
+    assert not channel._queue
+
+
+def _output(line):
+    return {"type": "command_output", "data": {"step_index": 0, "stream": "stdout", "line": line}}
+
+
+async def test_queue_never_grows_past_its_bound(websocket):
+    channel = _channel(websocket)
+    await _stall(channel)
+    
+    await channel.send_json({"type": "function_result", "data": {"n": 1}})
+    await channel.send_text('{"type":"broadcast","data":{}}')
+    assert channel.get_stats()["queue_depth"] == 2
+    
+    # Neither path may queue a third frame that has to be delivered
+    await channel.send_text('{"type":"broadcast","data":{}}')
+    
+    assert channel.closed
+    assert channel.close_reason == "slow consumer"
+    assert channel.get_stats()["max_queue_depth"] == 2
+    await asyncio.sleep(0)
+    assert websocket.closed
+    
+    await channel.send_json({"type": "function_result", "data": {"n": 2}})
+    assert channel.get_stats()["queue_depth"] == 0
+
+
+async def test_stream_frames_are_not_merged_across_other_frames(websocket):
+    channel = _channel(websocket, max_queue=8)
+    await _stall(channel)
+    
+    await channel.send_json(_output("a"))
+    await channel.send_json({"type": "command_complete", "data": {"step_index": 0}})
+    await channel.send_json(_output("b"))
+    await channel.send_json(_output("c"))
+    websocket.release.set()
+    await channel.flush()
+    
+    delivered = [(message["type"], message["data"].get("line")) for message in websocket.messages()]
+    assert delivered == [
+        ("session_started", None),
+        ("command_output", "a"),
+        ("command_complete", None),
+        ("command_output", "b\nc")
+    ]
+    channel.detach()
+
+
+async def test_full_queue_disconnects_instead_of_reordering(websocket):
+    channel = _channel(websocket)
+    await _stall(channel)
+    
+    await channel.send_json(_output("a"))
+    await channel.send_json({"type": "command_complete", "data": {"step_index": 0}})
+    await channel.send_json(_output("b"))
+    
+    assert channel.close_reason == "slow consumer"
+
+
+async def test_full_queue_drops_command_output_under_drop_policy(websocket):
+    channel = _channel(websocket, overflow_policy="drop")
+    await _stall(channel)
+    
+    await channel.send_json(_output("a"))
+    await channel.send_json({"type": "command_complete", "data": {"step_index": 0}})
+    await channel.send_json(_output("b"))
+    
+    assert not channel.closed
+    assert channel.get_stats()["frames_dropped"] == 1
+    channel.detach()
+
+
+async def test_progress_is_coalesced_when_no_result_follows(websocket):
+    channel = _channel(websocket)
+    await _stall(channel)
+    
+    await channel.send_json({"type": "function_result", "data": {}})
+    await channel.send_json({"type": "progress_update", "data": {"percent": 10}})
+    # The queued status is behind the result, so it can take the newer value
+    await channel.send_json({"type": "progress_update", "data": {"percent": 20}})
+    await channel.send_json({"type": "workflow_waiting", "data": {}})
+    
+    assert not channel.closed
+    stats = channel.get_stats()
+    assert (stats["frames_coalesced"], stats["frames_dropped"]) == (1, 1)
+    
+    websocket.release.set()
+    await channel.flush()
+    delivered = [message["type"] for message in websocket.messages()]
+    assert delivered == ["session_started", "function_result", "progress_update"]
+    assert websocket.messages()[-1]["data"]["percent"] == 20
+    channel.detach()
+
+
+async def test_progress_is_not_moved_ahead_of_a_result(websocket):
+    channel = _channel(websocket)
+    await _stall(channel)
+    
+    await channel.send_json({"type": "progress_update", "data": {"percent": 10}})
+    await channel.send_json({"type": "function_result", "data": {}})
+    await channel.send_json({"type": "progress_update", "data": {"percent": 20}})
+    
+    assert not channel.closed
+    assert channel.get_stats()["frames_dropped"] == 1
+    
+    websocket.release.set()
+    await channel.flush()
+    assert [message["type"] for message in websocket.messages()] == [
+        "session_started", "progress_update", "function_result"
+    ]
+    channel.detach()
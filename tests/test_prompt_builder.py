@@ -0,0 +1,104 @@
+"""Segmented system prompt: cache invalidation and an assembly micro-benchmark."""
+import json
+import time
+
+from backend.core.prompt_builder import PROMPT_INTRO, STATIC_GUIDELINES, SystemPromptBuilder
+from backend.core.state_machine import conversation_state_machine
+from backend.gemini.function_registry import function_registry
+from backend.models.schemas import ConversationState, SessionState, SystemCapability
+
+TURNS = 2000
+
+
+def _session():
+    session_state = SessionState(session_id="prompt")
+    session_state.current_state = ConversationState.ASK_PROJECT_TYPE
+    session_state.requirements.project_name = "demo"
+    session_state.requirements.language = "Python"
+    session_state.capabilities = SystemCapability(
+        os="Linux",
+        shell="bash",
+        python_version="3.11.7",
+        node_version="20.1.0",
+        available_package_managers=["pip", "npm", "apt"],
+        available_runtimes={"python": "3.11.7", "node": "20.1.0", "go": "1.22.0"},
+        environment_variables={"HOME": "/home/dev", "SHELL": "/bin/bash"}
+    )
+    return session_state
+
+
+def _builder():
+    return SystemPromptBuilder(function_registry, conversation_state_machine)
+
+
+def _unsegmented_prompt(session_state):
+    """The prompt as it used to be built, rendering everything every turn."""
+    current_state = session_state.current_state
+    capabilities = session_state.capabilities.model_dump() if session_state.capabilities else {}
+    progress = conversation_state_machine.get_state_progress(session_state)["progress_percentage"]
+    names = [func["name"] for func in function_registry.get_function_schemas()]
+    return (
+        f"{PROMPT_INTRO}\n\n"
+        "CURRENT SESSION INFO:\n"
+        f"- Session ID: {session_state.session_id}\n"
+        f"- Current State: {current_state.value}\n"
+        f"- Iteration: {session_state.iteration_count}\n"
+        f"- Progress: {progress}%\n"
+        f"- Completion: {session_state.completion_percentage}%\n\n"
+        f"COLLECTED REQUIREMENTS:\n{json.dumps(session_state.requirements.model_dump(), indent=2)}\n\n"
+        f"SYSTEM CAPABILITIES:\n{json.dumps(capabilities, indent=2)}\n\n"
+        f"CURRENT STATE INSTRUCTIONS:\n{conversation_state_machine.get_state_instructions(current_state)}\n\n"
+        f"AVAILABLE FUNCTIONS:\n{json.dumps(names, indent=2)}\n\n"
+        f"{STATIC_GUIDELINES}\n\n"
+        f"Remember: This is iteration {session_state.iteration_count}. Build upon the conversation history."
+    )
+
+
+def test_prompt_matches_unsegmented_build():
+    session_state = _session()
+    
+    assert _builder().build(session_state) == _unsegmented_prompt(session_state)
+
+
+def test_session_segment_reused_until_requirements_or_capabilities_change():
+    builder = _builder()
+    session_state = _session()
+    
+    first = builder.build(session_state)
+    segment = builder._session_segments["prompt"][4]
+    session_state.iteration_count += 1
+    builder.build(session_state)
+    assert builder._session_segments["prompt"][4] is segment
+    
+    session_state.requirements.framework = "FastAPI"
+    assert '"framework": "FastAPI"' in builder.build(session_state)
+    
+    session_state.capabilities.docker_installed = True
+    assert '"docker_installed": true' in builder.build(session_state)
+    
+    # Replacing a model invalidates too, even with an equal version count
+    session_state.capabilities = SystemCapability(os="Darwin", shell="zsh")
+    assert '"os": "Darwin"' in builder.build(session_state)
+    
+    assert builder.build(session_state) == _unsegmented_prompt(session_state)
+    assert first != builder.build(session_state)
+
+
+def test_prompt_assembly_benchmark():
+    builder = _builder()
+    session_state = _session()
+    
+    started = time.perf_counter()
+    for turn in range(TURNS):
+        session_state.iteration_count = turn
+        _unsegmented_prompt(session_state)
+    unsegmented = (time.perf_counter() - started) / TURNS * 1e6
+    
+    started = time.perf_counter()
+    for turn in range(TURNS):
+        session_state.iteration_count = turn
+        builder.build(session_state)
+    segmented = (time.perf_counter() - started) / TURNS * 1e6
+    
+    print(f"\nsystem prompt assembly per turn: unsegmented {unsegmented:.1f}us, segmented {segmented:.1f}us")
+    assert segmented < unsegmented / 2
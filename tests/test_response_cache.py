@@ -0,0 +1,113 @@
+"""Gemini response cache tiers."""
+import asyncio
+import os
+import threading
+
+from backend.gemini.response_cache import GeminiResponseCache
+
+
+def _response(text):
+    return {"candidates": [{"content": {"parts": [{"text": text}]}}]}
+
+
+async def test_memory_hits_are_independent_copies(tmp_path):
+    cache = GeminiResponseCache(cache_dir=str(tmp_path), ttl=0, max_entries=8, max_disk_bytes=1 << 20)
+    key = cache.make_key("model", [{"role": "user", "content": "readme"}], {"temperature": 0.1})
+    
+    stored = _response("# Project")
+    await cache.set(key, stored)
+    # The caller keeps using the dict it stored
+    stored["candidates"][0]["content"]["parts"][0]["text"] = "changed by caller"
+    
+    first = await cache.get(key)
+    first["candidates"][0]["content"]["parts"].append({"functionCall": {"name": "x", "args": {}}})
+    second = await cache.get(key)
+    
+    assert second == _response("# Project")
+    assert second is not first
+    assert cache.get_stats()["hits"] == 2
+
+
+async def test_disk_tier_survives_a_new_instance(tmp_path):
+    cache = GeminiResponseCache(cache_dir=str(tmp_path), ttl=0, max_entries=8, max_disk_bytes=1 << 20)
+    key = cache.make_key("model", [{"role": "user", "content": "main.py"}], {"temperature": 0.2})
+    await cache.set(key, _response("print('hi')"))
+    
+    reloaded = GeminiResponseCache(cache_dir=str(tmp_path), ttl=0, max_entries=8, max_disk_bytes=1 << 20)
+    hit = await reloaded.get(key)
+    hit["candidates"].clear()
+    
+    assert await reloaded.get(key) == _response("print('hi')")
+    assert reloaded.get_stats()["disk_hits"] == 1
+
+
+def _cache(tmp_path, **options):
+    options.setdefault("max_disk_bytes", 1 << 20)
+    return GeminiResponseCache(cache_dir=str(tmp_path), ttl=0, max_entries=8, **options)
+
+
+def _key(cache, content):
+    return cache.make_key("m", [{"role": "user", "content": content}], {})
+
+
+def test_line_endings_and_trailing_whitespace_share_a_key(tmp_path):
+    cache = _cache(tmp_path)
+    
+    assert _key(cache, "def f():\r\n    return 1  \r\n") == _key(cache, "def f():\n    return 1")
+
+
+def test_indentation_changes_the_key(tmp_path):
+    cache = _cache(tmp_path)
+    
+    assert _key(cache, "if x:\n    y()\nz()") != _key(cache, "if x:\n    y()\n    z()")
+    assert _key(cache, "a:\n  b: 1") != _key(cache, "a:\nb: 1")
+    assert _key(cache, "a  b") != _key(cache, "a b")
+
+
+async def test_disk_work_runs_off_the_event_loop(tmp_path, monkeypatch):
+    cache = _cache(tmp_path)
+    key = _key(cache, "main.py")
+    event_loop_thread = threading.get_ident()
+    calls = []
+    
+    for name in ("_scan_disk", "_write_file", "_delete_files"):
+        def recording(*args, _original=getattr(cache, name), _name=name):
+            calls.append((_name, threading.get_ident()))
+            return _original(*args)
+        monkeypatch.setattr(cache, name, recording)
+    
+    assert await cache.get(key) is None
+    await cache.set(key, _response("print('hi')"))
+    await cache.clear()
+    
+    assert [name for name, _ in calls] == ["_scan_disk", "_write_file", "_delete_files"]
+    assert all(thread != event_loop_thread for _, thread in calls)
+    assert not os.path.exists(cache._get_cache_file(key))
+    assert cache.get_stats()["disk_entries"] == 0
+
+
+async def test_concurrent_first_lookups_scan_once(tmp_path, monkeypatch):
+    cache = _cache(tmp_path)
+    scans = []
+    original = cache._scan_disk
+    
+    def scan():
+        scans.append(1)
+        return original()
+    
+    monkeypatch.setattr(cache, "_scan_disk", scan)
+    await asyncio.gather(*(cache.get(_key(cache, str(index))) for index in range(5)))
+    
+    assert len(scans) == 1
+
+
+async def test_oldest_disk_entries_are_evicted_over_the_limit(tmp_path):
+    cache = _cache(tmp_path, max_disk_bytes=300)
+    keys = [_key(cache, f"file {index}") for index in range(4)]
+    for key in keys:
+        await cache.set(key, _response("x" * 100))
+    
+    on_disk = [key for key in keys if os.path.exists(cache._get_cache_file(key))]
+    assert on_disk == keys[-len(on_disk):]
+    assert 0 < len(on_disk) < len(keys)
+    assert cache.get_stats()["disk_bytes"] <= 300
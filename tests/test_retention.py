@@ -0,0 +1,86 @@
+"""Session retention: payload digests and archiving while the session keeps changing."""
+import asyncio
+
+from backend.core.retention import RetentionPolicy, SessionArchive
+from backend.models.schemas import SessionState
+
+PAYLOAD_MAX_CHARS = 100
+
+
+class _SlowArchive(SessionArchive):
+    """Archive whose append yields to other tasks before writing."""
+    
+    def __init__(self, session_dir):
+        super().__init__(session_dir)
+        self.appending = asyncio.Event()
+        self.release = asyncio.Event()
+    
+    async def append(self, session_id, evicted, payloads):
+        self.appending.set()
+        await self.release.wait()
+        await super().append(session_id, evicted, payloads)
+
+
+def _policy(archive, function_results=10):
+    hot_limits = {"conversation_history": 100, "function_results": function_results, "state_history": 100}
+    return RetentionPolicy(archive, hot_limits=hot_limits, payload_max_chars=PAYLOAD_MAX_CHARS)
+
+
+async def test_oversized_payloads_are_digested_and_fetchable(tmp_path):
+    archive = SessionArchive(str(tmp_path))
+    session_state = SessionState(session_id="digest")
+    output = "x" * 1000
+    session_state.function_results.append({"name": "build", "output": output})
+    
+    assert await _policy(archive).apply("digest", session_state)
+    
+    preview = session_state.function_results[0]["output"]
+    assert len(preview) < len(output)
+    digest = preview.rsplit("digest ", 1)[1].rstrip("]")
+    assert await archive.fetch_payload("digest", digest) == output
+
+
+async def test_results_appended_while_archiving_are_kept(tmp_path):
+    archive = _SlowArchive(str(tmp_path))
+    session_state = SessionState(session_id="busy")
+    session_state.function_results.extend(
+        {"name": f"step_{index}", "output": "y" * 1000 if index == 12 else "ok"}
+        for index in range(14)
+    )
+    
+    applying = asyncio.create_task(_policy(archive).apply("busy", session_state))
+    await archive.appending.wait()
+    session_state.function_results.append({"name": "late", "output": "z" * 1000})
+    archive.release.set()
+    assert await applying
+    
+    names = [result["name"] for result in session_state.function_results]
+    assert names == [f"step_{index}" for index in range(4, 14)] + ["late"]
+    assert session_state.function_results[8]["output"].endswith("]")
+    # Digested on the next pass, not lost
+    assert session_state.function_results[-1]["output"] == "z" * 1000
+
+
+async def test_results_without_oversized_payloads_are_left_alone(tmp_path):
+    session_state = SessionState(session_id="small")
+    small = {"name": "build", "output": "ok", "files": ["a.py", "b.py"]}
+    mixed = {"name": "install", "output": "w" * 1000, "meta": {"exit_code": 0}}
+    session_state.function_results.extend([small, mixed])
+    
+    assert await _policy(SessionArchive(str(tmp_path))).apply("small", session_state)
+    
+    # Only the entry with a digested string was replaced, and only along that path
+    assert session_state.function_results[0] is small
+    digested = session_state.function_results[1]
+    assert digested is not mixed
+    assert digested["meta"] is mixed["meta"]
+    assert mixed["output"] == "w" * 1000
+
+
+async def test_nothing_to_digest_changes_nothing(tmp_path):
+    session_state = SessionState(session_id="unchanged")
+    results = [{"name": f"step_{index}", "output": "ok"} for index in range(3)]
+    session_state.function_results.extend(results)
+    
+    assert not await _policy(SessionArchive(str(tmp_path))).apply("unchanged", session_state)
+    assert all(current is original for current, original in zip(session_state.function_results, results))
@@ -0,0 +1,131 @@
+"""Gemini request scheduler: slot lifetime and concurrency cap."""
+import asyncio
+import json
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from backend.gemini.scheduler import GeminiRequestScheduler, RequestPriority
+from backend.gemini.streaming_client import GeminiStreamingClient
+
+
+def _answer(text):
+    return {"candidates": [{"content": {"parts": [{"text": text}]}, "finishReason": "STOP"}]}
+
+
+@pytest.fixture
+async def gemini_server():
+    """Fake Gemini server recording how many requests are in flight."""
+    state = {"in_flight": 0, "peak": 0, "requests": 0}
+    
+    async def track(handler_delay):
+        state["requests"] += 1
+        state["in_flight"] += 1
+        state["peak"] = max(state["peak"], state["in_flight"])
+        try:
+            await asyncio.sleep(handler_delay)
+        finally:
+            state["in_flight"] -= 1
+    
+    async def stream(request):
+        await track(0.05)
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for text, finish in (("a", None), ("b", None), ("c", "STOP")):
+            candidate = {"content": {"parts": [{"text": text}]}}
+            if finish:
+                candidate["finishReason"] = finish
+            await response.write(("data: " + json.dumps({"candidates": [candidate]}) + "\n\n").encode())
+        await response.write_eof()
+        return response
+    
+    async def generate(request):
+        await track(0.1)
+        return web.json_response(_answer("done"))
+    
+    app = web.Application()
+    app.router.add_post("/models/{model}:streamGenerateContent", stream)
+    app.router.add_post("/models/{model}:generateContent", generate)
+    server = TestServer(app)
+    await server.start_server()
+    server.state = state
+    yield server
+    await server.close()
+
+
+def _client(server, scheduler, priority=RequestPriority.BACKGROUND, session_id=None):
+    client = GeminiStreamingClient(api_key="test-key", session_id=session_id, priority=priority)
+    client.base_url = str(server.make_url("")).rstrip("/")
+    client.scheduler = scheduler
+    return client
+
+
+async def test_stream_slot_released_before_consumer_finishes(gemini_server):
+    scheduler = GeminiRequestScheduler(max_concurrent=1, requests_per_minute=0, tokens_per_minute=0)
+    
+    async with _client(gemini_server, scheduler, RequestPriority.INTERACTIVE) as client:
+        stream = client.stream_completion([{"role": "user", "content": "hi"}])
+        first = await stream.__anext__()
+        assert first.content == "a"
+        
+        # The body is read in the background; the paused consumer holds no slot
+        for _ in range(50):
+            if scheduler.in_flight == 0:
+                break
+            await asyncio.sleep(0.01)
+        assert scheduler.in_flight == 0
+        
+        # A request made mid-stream (as function calls do) gets the only slot
+        async with _client(gemini_server, scheduler) as nested:
+            result = await asyncio.wait_for(
+                nested.complete([{"role": "user", "content": "file"}], use_cache=False),
+                timeout=2
+            )
+        assert result["candidates"]
+        
+        rest = [chunk.content async for chunk in stream if chunk.type == "text"]
+        assert rest == ["b", "c"]
+    
+    assert scheduler.in_flight == 0
+    assert gemini_server.state["peak"] == 1
+
+
+async def test_tasks_spawned_mid_stream_respect_the_cap(gemini_server):
+    scheduler = GeminiRequestScheduler(max_concurrent=2, requests_per_minute=0, tokens_per_minute=0)
+    
+    async def generate_file(index):
+        async with _client(gemini_server, scheduler, session_id="s1") as client:
+            return await client.complete([{"role": "user", "content": f"file {index}"}], use_cache=False)
+    
+    async with _client(gemini_server, scheduler, RequestPriority.INTERACTIVE, session_id="s1") as client:
+        tasks = []
+        async for chunk in client.stream_completion([{"role": "user", "content": "hi"}]):
+            if chunk.type == "text" and not tasks:
+                # Like the file-content prefetch started from a function call
+                tasks = [asyncio.create_task(generate_file(index)) for index in range(6)]
+        results = await asyncio.gather(*tasks)
+    
+    assert len(results) == 6
+    assert gemini_server.state["peak"] <= 2
+    assert scheduler.get_metrics()["total_requests"] == 7
+    assert scheduler.in_flight == 0
+
+
+async def test_interactive_requests_dispatch_before_background(gemini_server):
+    scheduler = GeminiRequestScheduler(max_concurrent=1, requests_per_minute=0, tokens_per_minute=0)
+    order = []
+    
+    async def request(name, priority):
+        async with _client(gemini_server, scheduler, priority, session_id=name) as client:
+            await client.complete([{"role": "user", "content": name}], use_cache=False)
+            order.append(name)
+    
+    blocker = asyncio.create_task(request("first", RequestPriority.BACKGROUND))
+    await asyncio.sleep(0.02)
+    background = asyncio.create_task(request("background", RequestPriority.BACKGROUND))
+    await asyncio.sleep(0.01)
+    interactive = asyncio.create_task(request("interactive", RequestPriority.INTERACTIVE))
+    await asyncio.gather(blocker, background, interactive)
+    
+    assert order == ["first", "interactive", "background"]
@@ -0,0 +1,158 @@
+"""Session serialization: round trips and a load/save micro-benchmark."""
+import json
+import time
+from datetime import datetime
+
+import pytest
+
+from backend.config import settings
+from backend.core.event_log import SessionEventLog
+from backend.models.schemas import SessionState
+from backend.models.serialization import dump_document, hydrate_session, load_document
+
+SIZES = (10, 100, 1000)
+REPEATS = 5
+
+
+def _session(messages):
+    session_state = SessionState(session_id=f"bench-{messages}")
+    session_state.requirements.project_name = "demo"
+    session_state.requirements.language = "Python"
+    for index in range(messages):
+        session_state.conversation_history.append({
+            "role": "user" if index % 2 else "assistant",
+            "content": f"Message {index}: " + "lorem ipsum dolor sit amet " * 8,
+            "timestamp": datetime.now().isoformat()
+        })
+        if index % 10 == 0:
+            session_state.function_results.append({
+                "function": "create_file",
+                "args": {"path": f"src/module_{index}.py"},
+                "result": {"status": "ok", "bytes": index * 17}
+            })
+    return session_state
+
+
+def _best(fn):
+    """Fastest of a few runs, in milliseconds."""
+    timings = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000, result
+
+
+def _baseline_save(session_state):
+    return session_state.model_dump_json(indent=2).encode("utf-8")
+
+
+def _baseline_load(data):
+    return SessionState(**json.loads(data))
+
+
+def _save(session_state):
+    return dump_document(session_state.model_dump(mode="json"))
+
+
+def _load(data):
+    return hydrate_session(load_document(data))
+
+
+@pytest.mark.parametrize("codec", ["json", "msgpack"])
+def test_documents_round_trip(codec, monkeypatch):
+    if codec == "msgpack":
+        pytest.importorskip("msgpack")
+    monkeypatch.setattr(settings, "SESSION_CODEC", codec)
+    session_state = _session(25)
+    
+    restored = _load(_save(session_state))
+    
+    assert restored.model_dump(mode="json") == session_state.model_dump(mode="json")
+
+
+def test_json_documents_stay_readable_after_switching_codec(monkeypatch):
+    monkeypatch.setattr(settings, "SESSION_CODEC", "json")
+    data = _save(_session(3))
+    
+    monkeypatch.setattr(settings, "SESSION_CODEC", "msgpack")
+    
+    assert _load(data).session_id == "bench-3"
+
+
+async def test_event_log_appends_and_keeps_in_place_edits(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "SESSION_CODEC", "json")
+    event_log = SessionEventLog(str(tmp_path), snapshot_interval=1000)
+    session_state = _session(5)
+    session_id = session_state.session_id
+    await event_log.write_snapshot(session_id, session_state)
+    
+    # Trim plus append goes to the log
+    del session_state.conversation_history[:2]
+    session_state.add_message("user", "appended")
+    await event_log.write(session_id, session_state)
+    assert event_log._positions[session_id].events_since_snapshot == 3
+    
+    # Editing an earlier item in place can't be expressed as events
+    session_state.conversation_history[0]["content"] = "edited"
+    session_state.add_message("assistant", "after the edit")
+    await event_log.write(session_id, session_state)
+    assert event_log._positions[session_id].events_since_snapshot == 0
+    
+    restored = await SessionEventLog(str(tmp_path), snapshot_interval=1000).read(session_id)
+    assert restored["conversation_history"] == session_state.conversation_history
+
+
+async def _turn_save_ms(event_log, session_state):
+    """Best time to persist one new message on top of a stored session."""
+    await event_log.write_snapshot(session_state.session_id, session_state)
+    await event_log.read(session_state.session_id)
+    timings = []
+    for index in range(REPEATS):
+        session_state.conversation_history.append({"role": "user", "content": f"turn {index}"})
+        started = time.perf_counter()
+        await event_log.write(session_state.session_id, session_state)
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000
+
+
+def _baseline_turn_save_ms(path, session_state):
+    """Best time to rewrite the whole file, as every save used to."""
+    def save():
+        with open(path, "wb") as f:
+            f.write(_baseline_save(session_state))
+    return _best(save)[0]
+
+
+async def test_serialization_benchmark(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "SESSION_CODEC", "json")
+    event_log = SessionEventLog(str(tmp_path), snapshot_interval=1000)
+    rows = []
+    for messages in SIZES:
+        session_state = _session(messages)
+        
+        baseline_save_ms, baseline_data = _best(lambda: _baseline_save(session_state))
+        baseline_load_ms, _ = _best(lambda: _baseline_load(baseline_data))
+        save_ms, data = _best(lambda: _save(session_state))
+        load_ms, restored = _best(lambda: _load(data))
+        
+        assert restored.conversation_history == session_state.conversation_history
+        assert len(data) < len(baseline_data)
+        
+        baseline_turn_ms = _baseline_turn_save_ms(tmp_path / "baseline.json", session_state)
+        turn_ms = await _turn_save_ms(event_log, session_state)
+        rows.append((
+            messages, baseline_save_ms, save_ms, baseline_turn_ms, turn_ms,
+            baseline_load_ms, load_ms, len(baseline_data), len(data)
+        ))
+    
+    print("\nmessages  snapshot save ms   turn save ms      load ms           bytes on disk (before/after)")
+    for messages, *timings, baseline_bytes, size in rows:
+        pairs = "  ".join(f"{before:>7.2f} / {after:<7.2f}" for before, after in zip(timings[::2], timings[1::2]))
+        print(f"{messages:>8}  {pairs}  {baseline_bytes:>7} / {size}")
+    
+    # Per-turn saves append instead of rewriting, and loads skip validating
+    # every message, so both gaps grow with session length
+    _, _, _, baseline_turn_ms, turn_ms, baseline_load_ms, load_ms, _, _ = rows[-1]
+    assert turn_ms < baseline_turn_ms
+    assert load_ms < baseline_load_ms
@@ -0,0 +1,216 @@
+"""Session manager locking around deletes and the expiry sweeper."""
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend.config import settings
+from backend.core.session_manager import SessionManager
+from backend.models.schemas import SessionState
+
+
+@pytest.fixture
+async def manager(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "SESSION_DIR", str(tmp_path / "sessions"))
+    monkeypatch.setattr(settings, "SESSION_STORAGE", "file")
+    monkeypatch.setattr(settings, "SESSION_DURABILITY", "write_through")
+    session_manager = SessionManager()
+    yield session_manager
+    await session_manager.close()
+
+
+async def _queue_behind_lock(manager, session_id, *coroutines):
+    """Start tasks while the session lock is held so they queue in order."""
+    async with manager._session_lock(session_id):
+        tasks = []
+        for coroutine in coroutines:
+            tasks.append(asyncio.create_task(coroutine))
+            await asyncio.sleep(0)
+    return await asyncio.gather(*tasks)
+
+
+async def test_delete_drops_its_lock(manager):
+    await manager.create_session("gone")
+    
+    assert await manager.delete_session("gone")
+    
+    assert "gone" not in manager._locks
+
+
+async def test_save_queued_behind_delete_does_not_resurrect_session(manager):
+    session_state = await manager.create_session("stale")
+    
+    deleted, _ = await _queue_behind_lock(
+        manager, "stale",
+        manager.delete_session("stale"),
+        manager.save_state("stale", session_state)
+    )
+    
+    assert deleted
+    assert "stale" not in manager._cache
+    assert await manager.storage.read("stale") is None
+    # The waiting save kept the lock alive, then the last user dropped it
+    assert "stale" not in manager._locks
+
+
+async def test_lock_is_kept_while_others_wait_and_replaced_for_new_callers(manager):
+    await manager.create_session("busy")
+    old_lock = manager._get_lock("busy")
+    holders = []
+    
+    async def write_after_delete():
+        async with manager._session_lock("busy") as lock:
+            holders.append(lock)
+            await asyncio.sleep(0.05)
+    
+    async def create_again():
+        # Arrives after the delete, while the writer still holds the old lock
+        await asyncio.sleep(0.01)
+        async with manager._session_lock("busy") as lock:
+            holders.append(lock)
+    
+    await _queue_behind_lock(
+        manager, "busy",
+        manager.delete_session("busy"),
+        write_after_delete(),
+        create_again()
+    )
+    
+    assert holders[0] is old_lock and old_lock.deleted
+    assert holders[1] is not old_lock and not holders[1].deleted
+    assert manager._locks["busy"] is holders[1]
+
+
+async def test_second_delete_waits_then_reports_missing(manager):
+    await manager.create_session("twice")
+    
+    results = await _queue_behind_lock(
+        manager, "twice",
+        manager.delete_session("twice"),
+        manager.delete_session("twice")
+    )
+    
+    assert results == [True, False]
+    assert "twice" not in manager._locks
+
+
+async def test_failed_eviction_write_keeps_session_for_the_next_flush(manager, monkeypatch):
+    manager.write_through = False
+    manager.cache_size = 1
+    first = await manager.create_session("first")
+    first.requirements.project_name = "unsaved"
+    await manager.save_state("first", first)
+    
+    write = manager.storage.write
+    
+    async def failing_write(session_id, session_state):
+        if session_id == "first":
+            raise OSError("disk full")
+        await write(session_id, session_state)
+    
+    monkeypatch.setattr(manager.storage, "write", failing_write)
+    
+    # Evicting "first" fails, but the other session's save still succeeds
+    second = SessionState(session_id="second")
+    await manager.save_state("second", second)
+    assert "first" in manager._cache and "first" in manager._dirty
+    
+    monkeypatch.setattr(manager.storage, "write", write)
+    await manager.flush()
+    
+    assert not manager._dirty
+    manager._cache.clear()
+    assert (await manager.load_state("first")).requirements.project_name == "unsaved"
+
+
+class _Clock:
+    """Stands in for ``time.time`` in the session manager."""
+    
+    def __init__(self):
+        self.now = time.time()
+    
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = _Clock()
+    # backend.core re-exports the manager instance under the module's name
+    monkeypatch.setattr(sys.modules[SessionManager.__module__], "time", fake)
+    return fake
+
+
+async def test_superseded_deadline_is_skipped(manager, clock):
+    manager.session_timeout = 60
+    session_state = await manager.create_session("busy")
+    first_deadline = manager._expiry_deadlines["busy"]
+    
+    await asyncio.sleep(0.01)
+    await manager.save_state("busy", session_state)
+    second_deadline = manager._expiry_deadlines["busy"]
+    assert second_deadline > first_deadline
+    
+    # Only the stale entry is due
+    clock.now = (first_deadline + second_deadline) / 2
+    assert await manager._sweep_expired() == 0
+    assert "busy" in manager._cache
+    assert manager._expiry_heap == [(second_deadline, "busy")]
+    
+    clock.now = second_deadline
+    assert await manager._sweep_expired() == 1
+    assert "busy" not in manager._cache
+
+
+async def test_expired_session_is_removed_everywhere(manager, clock):
+    manager.session_timeout = 60
+    await manager.create_session("kept")
+    await manager.add_message("old", "user", "hello")
+    await manager.add_message("old", "assistant", "hi there")
+    
+    def old_files():
+        return [name for name in os.listdir(manager.session_dir) if name.startswith("old.")]
+    
+    assert len(old_files()) > 1, "expected a snapshot and an event log"
+    
+    manager._schedule_expiry("old", datetime.now() - timedelta(seconds=120))
+    assert await manager._sweep_expired() == 1
+    
+    assert "old" not in manager._cache
+    assert "old" not in manager._locks
+    assert "old" not in manager._expiry_deadlines
+    assert old_files() == []
+    assert "kept" in manager._cache
+    assert await manager.storage.read("kept") is not None
+
+
+async def test_sweeper_deletes_sessions_once_due(manager):
+    manager.session_timeout = 0.2
+    await manager.start_expiry_sweeper()
+    await manager.create_session("short-lived")
+    
+    for _ in range(250):
+        if "short-lived" not in manager._cache:
+            break
+        await asyncio.sleep(0.02)
+    
+    assert "short-lived" not in manager._cache
+    assert await manager.storage.read("short-lived") is None
+
+
+@pytest.mark.parametrize("pending_deadline", [False, True])
+async def test_close_stops_the_sweeper(manager, pending_deadline):
+    if pending_deadline:
+        await manager.create_session("waiting")
+    await manager.start_expiry_sweeper()
+    sweeper = manager._sweeper_task
+    await asyncio.sleep(0.01)
+    assert not sweeper.done()
+    
+    await manager.close()
+    
+    assert sweeper.cancelled()
+    assert manager._sweeper_task is None
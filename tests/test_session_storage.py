@@ -0,0 +1,115 @@
+"""Session storage backends and their interface."""
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend.core.session_storage import FileSessionStorage, SessionStorage, SQLiteSessionStorage
+from backend.models.schemas import SessionState
+from backend.models.serialization import loads
+
+
+def test_incomplete_backend_fails_at_instantiation():
+    class ReadOnlyStorage(SessionStorage):
+        async def read(self, session_id):
+            return None
+    
+    with pytest.raises(TypeError, match="abstract"):
+        ReadOnlyStorage()
+
+
+def test_only_required_methods_are_abstract():
+    abstract = SessionStorage.__abstractmethods__
+    
+    assert abstract == {"read", "write", "delete", "list_sessions", "list_expired", "count_sessions"}
+
+
+@pytest.fixture(params=["file", "sqlite"])
+async def storage(request, tmp_path):
+    if request.param == "file":
+        backend = FileSessionStorage(str(tmp_path / "sessions"), snapshot_interval=5)
+    else:
+        backend = SQLiteSessionStorage(str(tmp_path / "sessions.db"))
+    yield backend
+    await backend.close()
+
+
+async def test_backends_round_trip_sessions(storage):
+    session_state = SessionState(session_id="stored")
+    session_state.requirements.project_name = "demo"
+    
+    await storage.write("stored", session_state)
+    
+    data = await storage.read("stored")
+    assert data["session_id"] == "stored"
+    assert data["requirements"]["project_name"] == "demo"
+    assert [session["session_id"] for session in await storage.list_sessions()] == ["stored"]
+    assert await storage.list_expired(datetime.now() + timedelta(minutes=1)) == ["stored"]
+    assert await storage.count_sessions(datetime.now() - timedelta(minutes=1)) == {"total": 1, "active": 1}
+    
+    assert await storage.delete("stored")
+    assert await storage.read("stored") is None
+    assert not await storage.delete("stored")
+
+
+async def _message_rows(storage, session_id):
+    def query(conn):
+        return conn.execute(
+            "SELECT rowid, seq, message FROM messages WHERE session_id = ? ORDER BY seq", (session_id,)
+        ).fetchall()
+    return await storage._run(query)
+
+
+@pytest.mark.parametrize("reopen", [False, True])
+async def test_sqlite_keeps_rows_when_retention_trims_history(tmp_path, reopen):
+    db_path = str(tmp_path / "sessions.db")
+    storage = SQLiteSessionStorage(db_path)
+    session_state = SessionState(session_id="trimmed")
+    for index in range(10):
+        session_state.add_message("user", f"message {index}")
+    await storage.write("trimmed", session_state)
+    before = {message: rowid for rowid, _, message in await _message_rows(storage, "trimmed")}
+    
+    if reopen:
+        # Positions come from reading the rows back instead of the last write
+        await storage.close()
+        storage = SQLiteSessionStorage(db_path)
+        await storage.read("trimmed")
+    
+    # Retention archives the oldest messages, then the session carries on
+    del session_state.conversation_history[:4]
+    session_state.add_message("user", "message 10")
+    session_state.add_message("user", "message 11")
+    await storage.write("trimmed", session_state)
+    
+    rows = await _message_rows(storage, "trimmed")
+    kept = rows[:6]
+    assert [rowid for rowid, _, _ in kept] == [before[message] for _, _, message in kept]
+    assert [seq for _, seq, _ in rows] == list(range(4, 12))
+    
+    data = await storage.read("trimmed")
+    assert [message["content"] for message in data["conversation_history"]] == [
+        f"message {index}" for index in range(4, 12)
+    ]
+    
+    # Trimming again after a read continues from the stored positions
+    del session_state.conversation_history[:2]
+    await storage.write("trimmed", session_state)
+    assert [seq for _, seq, _ in await _message_rows(storage, "trimmed")] == list(range(6, 12))
+    await storage.close()
+
+
+async def test_sqlite_rewrites_messages_when_history_is_replaced(tmp_path):
+    storage = SQLiteSessionStorage(str(tmp_path / "sessions.db"))
+    session_state = SessionState(session_id="replaced")
+    session_state.add_message("user", "first")
+    session_state.add_message("user", "second")
+    await storage.write("replaced", session_state)
+    
+    session_state.conversation_history = []
+    session_state.add_message("user", "fresh start")
+    await storage.write("replaced", session_state)
+    
+    assert [(seq, loads(message)["content"]) for _, seq, message in await _message_rows(storage, "replaced")] == [
+        (0, "fresh start")
+    ]
+    await storage.close()
@@ -0,0 +1,167 @@
+"""Versioned state deltas: diff round trips and snapshot/delta selection."""
+import copy
+import random
+
+import pytest
+
+from backend.api.state_sync import StateSync, diff_state
+from backend.models.schemas import ConversationState, SessionState
+
+
+def _apply(document, patch):
+    """Apply a patch the way the frontend session store does."""
+    root = copy.deepcopy(document)
+    for operation in patch:
+        tokens = [token.replace("~1", "/").replace("~0", "~") for token in operation["path"].split("/")[1:]]
+        key = tokens.pop()
+        parent = root
+        for token in tokens:
+            parent = parent[int(token)] if isinstance(parent, list) else parent[token]
+        
+        if isinstance(parent, list):
+            if operation["op"] == "add":
+                if key == "-":
+                    parent.append(operation["value"])
+                else:
+                    parent.insert(int(key), operation["value"])
+            elif operation["op"] == "remove":
+                del parent[int(key)]
+            else:
+                parent[int(key)] = operation["value"]
+        elif operation["op"] == "remove":
+            del parent[key]
+        else:
+            parent[key] = operation["value"]
+    return root
+
+
+def _message(index):
+    return {"role": "user" if index % 2 else "assistant", "content": f"message {index}"}
+
+
+@pytest.mark.parametrize("old, new", [
+    # Appended message
+    ({"history": [_message(0), _message(1)]}, {"history": [_message(0), _message(1), _message(2)]}),
+    # Retention trimmed the front and a message was appended
+    ({"history": [_message(i) for i in range(5)]}, {"history": [_message(i) for i in range(2, 7)]}),
+    # Trimmed front only
+    ({"history": [_message(i) for i in range(5)]}, {"history": [_message(i) for i in range(3, 5)]}),
+    # Trimmed front with a repeated item further on
+    ({"items": ["a", "b", "a", "c"]}, {"items": ["b", "a", "c", "d"]}),
+    # Truncated from the end
+    ({"items": [1, 2, 3, 4]}, {"items": [1, 2]}),
+    # Everything replaced
+    ({"items": [1, 2]}, {"items": [3, 4, 5]}),
+    # Nested changes, removed and added keys, keys needing escapes
+    (
+        {"requirements": {"name": "a", "tags": ["x"]}, "a/b": 1, "c~d": 2, "gone": True},
+        {"requirements": {"name": "b", "tags": ["x", "y"]}, "a/b": 3, "c~d": 2, "new": None}
+    ),
+    # Type change
+    ({"value": {"nested": 1}}, {"value": [1, 2]}),
+])
+def test_patch_round_trips(old, new):
+    assert _apply(old, diff_state(old, new)) == new
+
+
+def test_front_trim_is_removes_not_rewrites():
+    old = {"history": [_message(i) for i in range(200)]}
+    new = {"history": [_message(i) for i in range(50, 201)]}
+    
+    patch = diff_state(old, new)
+    
+    assert patch.count({"op": "remove", "path": "/history/0"}) == 50
+    assert patch[-1] == {"op": "add", "path": "/history/-", "value": _message(200)}
+    assert len(patch) == 51
+    assert _apply(old, patch) == new
+
+
+def test_random_list_edits_round_trip():
+    rng = random.Random(25)
+    for _ in range(300):
+        old = {"history": [_message(rng.randrange(20)) for _ in range(rng.randrange(12))]}
+        history = list(old["history"])
+        del history[:rng.randrange(len(history) + 1)]
+        history += [_message(rng.randrange(20)) for _ in range(rng.randrange(4))]
+        if history and rng.random() < 0.3:
+            history[rng.randrange(len(history))] = {"role": "system", "content": "edited"}
+        new = {"history": history, "count": len(history)}
+        
+        assert _apply(old, diff_state(old, new)) == new
+
+
+class _Connection:
+    def __init__(self):
+        self.state_version = None
+        self.state_snapshot = None
+
+
+def _client_apply(held, update):
+    """Client side of StateSync: returns the new (version, state), or None on a gap."""
+    if "session_state" in update:
+        return update["state_version"], update["session_state"]
+    version, state = held
+    if update["base_version"] != version:
+        return None
+    return update["state_version"], _apply(state, update["patch"])
+
+
+def test_state_sync_sends_snapshot_then_deltas():
+    sync = StateSync(enabled=True)
+    connection = _Connection()
+    session_state = SessionState(session_id="sync")
+    
+    first = sync.build_update(session_state, connection)
+    assert "session_state" in first
+    held = _client_apply(None, first)
+    
+    for index in range(30):
+        session_state.conversation_history = session_state.conversation_history[-10:] + [_message(index)]
+        session_state.current_state = ConversationState.ASK_PROJECT_TYPE
+        session_state.state_version += 1
+        
+        update = sync.build_update(session_state, connection, known_version=held[0])
+        assert "patch" in update
+        held = _client_apply(held, update)
+        assert held == (session_state.state_version, session_state.model_dump(mode="json"))
+    
+    assert sync.get_stats()["snapshots_sent"] == 1
+    assert sync.get_stats()["deltas_sent"] == 30
+
+
+def test_state_sync_recovers_from_a_gap_with_a_snapshot():
+    sync = StateSync(enabled=True)
+    connection = _Connection()
+    session_state = SessionState(session_id="gap")
+    held = _client_apply(None, sync.build_update(session_state, connection))
+    
+    # The client misses an update
+    session_state.conversation_history.append(_message(1))
+    session_state.state_version += 1
+    missed = sync.build_update(session_state, connection, known_version=held[0])
+    assert "patch" in missed
+    
+    session_state.conversation_history.append(_message(2))
+    session_state.state_version += 1
+    # The next pushed delta is against a version the client never got
+    pushed = sync.build_update(session_state, connection)
+    assert _client_apply(held, pushed) is None
+    
+    # Reporting the version it actually holds gets a full snapshot
+    update = sync.build_update(session_state, connection, known_version=held[0])
+    assert "session_state" in update
+    held = _client_apply(held, update)
+    assert held == (session_state.state_version, session_state.model_dump(mode="json"))
+    
+    # An explicit request for a full snapshot is honoured too
+    assert "session_state" in sync.build_update(session_state, connection, known_version=held[0], full=True)
+
+
+def test_state_sync_disabled_always_sends_snapshots():
+    sync = StateSync(enabled=False)
+    connection = _Connection()
+    session_state = SessionState(session_id="off")
+    
+    for _ in range(3):
+        session_state.state_version += 1
+        assert "session_state" in sync.build_update(session_state, connection, known_version=connection.state_version)
@@ -0,0 +1,190 @@
+"""Incremental SSE parsing and streaming against a local fake Gemini server."""
+import asyncio
+import json
+import time
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from backend.core.agent import ConversationAgent
+from backend.gemini.streaming_client import GeminiStreamingClient
+from backend.models.schemas import GeminiStreamChunk, SessionState
+
+
+def _text_event(text, finish=None):
+    candidate = {"content": {"role": "model", "parts": [{"text": text}]}}
+    if finish:
+        candidate["finishReason"] = finish
+    return {"candidates": [candidate]}
+
+
+class _FakeContent:
+    """Stands in for ``response.content``, yielding raw chunks as given."""
+    
+    def __init__(self, chunks):
+        self.chunks = chunks
+    
+    async def iter_any(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
+class _FakeResponse:
+    def __init__(self, chunks):
+        self.content = _FakeContent(chunks)
+
+
+async def _collect_events(chunks):
+    client = GeminiStreamingClient(api_key="test-key")
+    return [event async for event in client._iter_sse_events(_FakeResponse(chunks))]
+
+
+async def test_sse_frames_split_across_reads():
+    payload = ("data: " + json.dumps(_text_event("Hello")) + "\n\n").encode()
+    # Split inside the prefix, inside the JSON and between the two newlines
+    chunks = [payload[:3], payload[3:20], payload[20:-1], payload[-1:]]
+    
+    events = await _collect_events(chunks)
+    
+    assert events == [_text_event("Hello")]
+
+
+async def test_sse_multiline_data_comments_and_crlf():
+    body = json.dumps(_text_event("multi"), indent=1).split("\n")
+    frame = "".join(f"data: {line}\r\n" for line in body) + "\r\n"
+    chunks = [b": keep-alive\n\n", frame.encode()]
+    
+    events = await _collect_events(chunks)
+    
+    assert events == [_text_event("multi")]
+
+
+async def test_sse_done_marker_and_trailing_event():
+    chunks = [
+        ("data: " + json.dumps(_text_event("a")) + "\n\n").encode(),
+        b"data: [DONE]\n\n",
+        # No terminating blank line
+        ("data: " + json.dumps(_text_event("b", "STOP"))).encode()
+    ]
+    
+    events = await _collect_events(chunks)
+    
+    assert events == [_text_event("a"), _text_event("b", "STOP")]
+
+
+async def test_sse_malformed_event_is_skipped():
+    chunks = [b"data: {not json\n\n", ("data: " + json.dumps(_text_event("ok")) + "\n\n").encode()]
+    
+    events = await _collect_events(chunks)
+    
+    assert events == [_text_event("ok")]
+
+
+@pytest.fixture
+async def fake_gemini():
+    """Fake Gemini server streaming three events 0.2s apart."""
+    requests = []
+    
+    async def stream(request):
+        requests.append(request.query.get("alt"))
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        
+        events = [
+            _text_event("Hel"),
+            {"candidates": [{"content": {"parts": [{"functionCall": {"name": "ask_question", "args": {"q": 1}}}]}}]},
+            _text_event("lo", "STOP")
+        ]
+        for index, event in enumerate(events):
+            if index:
+                await asyncio.sleep(0.2)
+            frame = ("data: " + json.dumps(event) + "\n\n").encode()
+            # Deliver each frame in two writes to exercise reassembly
+            await response.write(frame[:7])
+            await response.write(frame[7:])
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+    
+    app = web.Application()
+    app.router.add_post("/models/{model}:streamGenerateContent", stream)
+    server = TestServer(app)
+    await server.start_server()
+    server.requests = requests
+    yield server
+    await server.close()
+
+
+async def test_stream_completion_yields_chunks_as_they_arrive(fake_gemini):
+    client = GeminiStreamingClient(api_key="test-key")
+    client.base_url = str(fake_gemini.make_url("")).rstrip("/")
+    
+    received = []
+    async with client:
+        started = time.monotonic()
+        async for chunk in client.stream_completion([{"role": "user", "content": "hi"}]):
+            received.append((time.monotonic() - started, chunk))
+    
+    assert fake_gemini.requests == ["sse"]
+    assert [chunk.type for _, chunk in received] == ["text", "function_call", "text", "finish"]
+    assert received[1][1].function_call.name == "ask_question"
+    assert received[-1][1].accumulated_content == "Hello"
+    
+    # First chunk arrives before the rest of the response is generated
+    first_chunk_latency = received[0][0]
+    total_time = received[-1][0]
+    assert first_chunk_latency < 0.15
+    assert total_time >= 0.4
+
+
+class _PartialReplyClient:
+    """Streams a few text chunks and stops without a finish chunk, like a turn that broke off."""
+    
+    def __init__(self, words):
+        self.words = words
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        return False
+    
+    async def stream_completion(self, **kwargs):
+        for word in self.words:
+            await asyncio.sleep(0)
+            yield GeminiStreamChunk(type="text", content=word)
+
+
+class _ChunkRecorder:
+    def __init__(self):
+        self.chunks = []
+    
+    async def send_json(self, message):
+        if message["type"] == "ai_message_chunk":
+            self.chunks.append(message["data"])
+
+
+async def test_concurrent_streams_number_their_own_chunks(monkeypatch):
+    agent = ConversationAgent()
+    replies = {"a": ["one ", "two ", "three"], "b": ["alpha ", "beta"]}
+    
+    async def get_client(session_id=None):
+        return _PartialReplyClient(replies[session_id])
+    
+    monkeypatch.setattr(agent, "_get_gemini_client", get_client)
+    
+    for _ in range(2):
+        sockets = {session_id: _ChunkRecorder() for session_id in replies}
+        await asyncio.gather(*(
+            agent._process_with_gemini(SessionState(session_id=session_id), sockets[session_id])
+            for session_id in replies
+        ))
+        
+        # Every stream starts at seq 0 with offsets into its own text only
+        for session_id, words in replies.items():
+            offsets = [sum(map(len, words[:index])) for index in range(len(words))]
+            assert sockets[session_id].chunks == [
+                {"chunk": word, "seq": index, "offset": offset}
+                for index, (word, offset) in enumerate(zip(words, offsets))
+            ]
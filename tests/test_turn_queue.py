@@ -0,0 +1,148 @@
+"""Per-session turn queue: ordering, superseding and cancellation."""
+import asyncio
+
+import pytest
+
+from backend.core.turn_queue import SessionTurnQueue
+
+
+@pytest.fixture
+async def queue():
+    turn_queue = SessionTurnQueue()
+    yield turn_queue
+    await turn_queue.close()
+
+
+class _Turns:
+    """Records which turns started, finished or were cancelled."""
+    
+    def __init__(self):
+        self.started = []
+        self.finished = []
+        self.cancelled = []
+        self.release = asyncio.Event()
+    
+    def turn(self, name, wait=False):
+        async def run():
+            self.started.append(name)
+            try:
+                if wait:
+                    await self.release.wait()
+                await asyncio.sleep(0)
+            except asyncio.CancelledError:
+                self.cancelled.append(name)
+                raise
+            self.finished.append(name)
+        return run
+
+
+async def _until_started(turns, name):
+    for _ in range(100):
+        if name in turns.started:
+            return
+        await asyncio.sleep(0)
+    raise AssertionError(f"{name} never started")
+
+
+async def _until_idle(queue, session_id):
+    worker = queue._workers.get(session_id)
+    if worker:
+        await worker
+
+
+async def test_turns_of_a_session_run_in_order(queue):
+    turns = _Turns()
+    for index in range(5):
+        queue.submit("s", turns.turn(index))
+    
+    await _until_idle(queue, "s")
+    
+    assert turns.finished == [0, 1, 2, 3, 4]
+    assert queue.get_stats()["turns_completed"] == 5
+
+
+async def test_sessions_run_independently(queue):
+    turns = _Turns()
+    queue.submit("blocked", turns.turn("blocked", wait=True))
+    queue.submit("other", turns.turn("other"))
+    
+    await _until_idle(queue, "other")
+    
+    assert turns.finished == ["other"]
+    assert queue.is_busy("blocked")
+    turns.release.set()
+
+
+async def test_supersede_cancels_running_and_drops_queued_turns(queue):
+    turns = _Turns()
+    queue.submit("s", turns.turn("running", wait=True))
+    queue.submit("s", turns.turn("queued"))
+    await _until_started(turns, "running")
+    
+    queue.submit("s", turns.turn("latest"), supersede=True)
+    await _until_idle(queue, "s")
+    
+    assert turns.cancelled == ["running"]
+    assert turns.started == ["running", "latest"]
+    assert turns.finished == ["latest"]
+    stats = queue.get_stats()
+    assert (stats["turns_cancelled"], stats["turns_dropped"], stats["turns_completed"]) == (1, 1, 1)
+
+
+async def test_non_cancellable_turns_survive_cancel(queue):
+    turns = _Turns()
+    queue.submit("s", turns.turn("start", wait=True), cancellable=False)
+    queue.submit("s", turns.turn("resume"), cancellable=False)
+    queue.submit("s", turns.turn("message"))
+    await _until_started(turns, "start")
+    
+    assert queue.cancel("s") == 1
+    
+    turns.release.set()
+    await _until_idle(queue, "s")
+    assert turns.finished == ["start", "resume"]
+    assert turns.cancelled == []
+
+
+async def test_failed_turn_does_not_stop_the_queue(queue):
+    turns = _Turns()
+    
+    async def fail():
+        raise RuntimeError("boom")
+    
+    queue.submit("s", fail)
+    queue.submit("s", turns.turn("next"))
+    await _until_idle(queue, "s")
+    
+    assert turns.finished == ["next"]
+    assert queue.get_stats()["turns_failed"] == 1
+
+
+async def test_worker_is_cleaned_up_when_idle(queue):
+    turns = _Turns()
+    queue.submit("s", turns.turn("only"))
+    assert queue.is_busy("s")
+    
+    await _until_idle(queue, "s")
+    
+    assert not queue.is_busy("s")
+    assert "s" not in queue._pending
+    assert "s" not in queue._current
+    
+    # A later turn starts a fresh worker
+    queue.submit("s", turns.turn("again"))
+    await _until_idle(queue, "s")
+    assert turns.finished == ["only", "again"]
+
+
+async def test_close_cancels_running_turns_and_workers(queue):
+    turns = _Turns()
+    queue.submit("s", turns.turn("running", wait=True), cancellable=False)
+    queue.submit("s", turns.turn("queued"))
+    await _until_started(turns, "running")
+    
+    await queue.close()
+    
+    assert turns.cancelled == ["running"]
+    assert turns.started == ["running"]
+    assert not queue.is_busy("s")
@@ -0,0 +1,105 @@
+"""WebSocket connection registry: indexes, the connection limit and disconnect cost."""
+import time
+
+import pytest
+
+from backend.api.websockets import CLOSE_TRY_AGAIN_LATER, Connection, WebSocketManager
+
+
+class _FakeWebSocket:
+    def __init__(self):
+        self.accepted = False
+        self.close_code = None
+        self.sent = []
+    
+    async def accept(self):
+        self.accepted = True
+    
+    async def close(self, code=1000):
+        self.close_code = code
+    
+    async def send_text(self, text):
+        self.sent.append(text)
+
+
+class _Channel:
+    """Bare channel for registering many connections without writer tasks."""
+    
+    closed = False
+    
+    def detach(self):
+        self.closed = True
+
+
+@pytest.fixture
+async def manager():
+    websocket_manager = WebSocketManager(max_connections=3)
+    yield websocket_manager
+    await websocket_manager.disconnect_all()
+
+
+async def test_connections_are_indexed_by_id_session_and_channel(manager):
+    first = await manager.connect(_FakeWebSocket(), "team_a")
+    second = await manager.connect(_FakeWebSocket(), "team_a")
+    # Session IDs that share a prefix up to an underscore stay separate
+    other = await manager.connect(_FakeWebSocket(), "team_a_1")
+    
+    assert manager.get_connection_count() == 3
+    assert manager.get_session_count() == 2
+    assert set(manager.get_connections_for_session("team_a")) == {first, second}
+    assert manager.get_connections_for_session("team_a_1") == [other]
+    assert manager.get_connection(other).session_id == "team_a_1"
+    
+    manager.disconnect("team_a", first)
+    assert manager.get_connections_for_session("team_a") == [second]
+    assert manager.get_connection(first) is None
+    
+    manager.disconnect("team_a")
+    assert manager.get_connections_for_session("team_a") == []
+    assert manager.get_connections_for_session("team_a_1") == [other]
+    assert manager.get_session_count() == 1
+    assert manager.get_heartbeat_stats()["scheduled"] == 1
+
+
+async def test_connection_past_the_limit_is_closed_with_try_again_later(manager):
+    channels = [await manager.connect(_FakeWebSocket(), f"session_{index}") for index in range(3)]
+    
+    refused = _FakeWebSocket()
+    assert await manager.connect(refused, "session_3") is None
+    assert refused.close_code == CLOSE_TRY_AGAIN_LATER == 1013
+    assert not refused.accepted
+    assert manager.get_output_stats()["connections_rejected"] == 1
+    
+    # A slot frees up once a connection leaves
+    manager.disconnect("session_0", channels[0])
+    retried = _FakeWebSocket()
+    assert await manager.connect(retried, "session_3") is not None
+    assert retried.accepted
+    assert manager.get_output_stats()["peak_connections"] == 3
+
+
+def _disconnect_cost(open_connections, measured=200):
+    """Seconds per disconnect with ``open_connections`` registered."""
+    websocket_manager = WebSocketManager(max_connections=open_connections)
+    connections = []
+    for index in range(open_connections):
+        connection = Connection(f"conn_{index}", f"session_{index % 50}", _FakeWebSocket(), _Channel())
+        websocket_manager._register(connection)
+        connections.append(connection)
+    
+    started = time.perf_counter()
+    for connection in connections[-measured:]:
+        websocket_manager.disconnect(connection.session_id, connection.channel)
+    elapsed = time.perf_counter() - started
+    
+    assert websocket_manager.get_connection_count() == open_connections - measured
+    return elapsed / measured
+
+
+def test_disconnect_cost_does_not_grow_with_open_connections():
+    small = min(_disconnect_cost(200) for _ in range(3))
+    large = min(_disconnect_cost(10_000) for _ in range(3))
+    
+    print(f"\ndisconnect with 200 open: {small * 1e6:.1f}us, with 10k open: {large * 1e6:.1f}us")
+    # A scan over all connections would be ~50x slower at 10k
+    assert large < small * 5